@@ -0,0 +1,357 @@
+#!/usr/bin/env python3
+
+import argparse
+import contextlib
+import fnmatch
+import io
+import itertools
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional
+
+ROOT = Path(__file__).resolve().parent.parent
+SCRIPT = ROOT / "src" / "nvidia_stability.py"
+RESULTS_DIR = ROOT / "benchmarks" / "results"
+
+sys.path.insert(0, str(ROOT / "src"))
+sys.path.insert(0, str(ROOT))
+
+import nvidia_stability  # noqa: E402
+from nvidia_stability import (  # noqa: E402
+    DISTRO_FAMILIES,
+    CPUFreqController,
+    GPU_POWER_LIMITS,
+    DistroDetector,
+    GPUDetector,
+    GPUProfileIndex,
+    NvidiaConfigurator,
+    NvidiaSMIBackend,
+    NVMLBackend,
+    Planner,
+)
+from tests.fake_nvml import FakeNVML  # noqa: E402
+
+SCHEMA_VERSION = 1
+
+LSPCI_LINES = [
+    "01:00.0 VGA compatible controller [0300]: NVIDIA Corporation AD102 [GeForce RTX 4090] [10de:2684] (rev a1)",
+    "01:00.0 VGA compatible controller [0300]: NVIDIA Corporation GA102 [GeForce RTX 3080 Lite Hash Rate] [10de:2216]",
+    "02:00.0 3D controller [0302]: NVIDIA Corporation TU116 [GeForce GTX 1660 SUPER] [10de:21c4] (rev a1)",
+    "0a:00.0 VGA compatible controller [0300]: NVIDIA Corporation AD104 [GeForce RTX 4070 Ti SUPER] [10de:2705]",
+    "41:00.0 VGA compatible controller [0300]: NVIDIA Corporation GP102 [TITAN Xp] [10de:1b02] (rev a1)",
+    "01:00.0 VGA compatible controller [0300]: NVIDIA Corporation GA102GL [RTX A6000] [10de:2230] (rev a1)",
+    "65:00.0 VGA compatible controller [0300]: NVIDIA Corporation Device [10de:2b85] (rev a1)",
+    "00:02.0 VGA compatible controller [0300]: Intel Corporation Raptor Lake-S GT1 [UHD Graphics 770] [8086:a780]",
+]
+
+PROFILE_QUERIES = {
+    "exact": list(GPU_POWER_LIMITS),
+    "marketing": [f"NVIDIA GeForce {name}" for name in GPU_POWER_LIMITS],
+    "partial": [
+        "GA102 [GeForce RTX 3080 Lite Hash Rate]",
+        "TU116 [GeForce GTX 1660 SUPER]",
+        "AD104 [GeForce RTX 4070 Ti SUPER]",
+        "GP102 [TITAN Xp]",
+    ],
+    "device_id": ["10de:2684", "10de:2206", "10de:1b06", "10de:1e02"],
+    "miss": ["Unknown GPU Model", "RTX A6000", "Quadro P4000"],
+}
+
+FAKE_GPUS = [
+    ("0000:01:00.0", "0x2684", "NVIDIA Corporation AD102 [GeForce RTX 4090] [10de:2684]"),
+    ("0000:02:00.0", "0x2204", "NVIDIA Corporation GA102 [GeForce RTX 3090] [10de:2204]"),
+]
+
+FAKE_CPUS = 128
+
+FAKE_BINARIES = {
+    "sudo": 'exec "$@"\n',
+    "apt": "exit 0\n",
+    "apt-get": "exit 0\n",
+    "dpkg-query": "exit 1\n",
+    "nvidia-smi": "exit 0\n",
+    "lspci": "".join(
+        f'echo "{bus[5:]} VGA compatible controller [0300]: {line}"\n' for bus, _, line in FAKE_GPUS
+    ),
+}
+
+
+def write_fake_bin(bin_dir: Path, name: str, script: str):
+    path = bin_dir / name
+    path.write_text("#!/bin/sh\n" + script)
+    path.chmod(0o755)
+
+
+def build_fake_root(path: Path, with_sysfs: bool = True) -> Path:
+    (path / "etc").mkdir(parents=True)
+    (path / "etc" / "os-release").write_text('NAME="Debian GNU/Linux"\nID=debian\nVERSION_ID="12"\n')
+    (path / "home").mkdir()
+    (path / "bin").mkdir()
+    devices = path / "sys" / "bus" / "pci" / "devices"
+    devices.mkdir(parents=True)
+    (path / "sys" / "module" / "nvidia").mkdir(parents=True)
+    (path / "sys" / "module" / "nvidia" / "version").write_text("550.78\n")
+    for cpu in range(FAKE_CPUS):
+        cpufreq = path / "sys" / "devices" / "system" / "cpu" / f"cpu{cpu}" / "cpufreq"
+        cpufreq.mkdir(parents=True)
+        (cpufreq / "scaling_governor").write_text("powersave\n")
+        (cpufreq / "energy_performance_preference").write_text("balance_performance\n")
+
+    if with_sysfs:
+        for bus_id, device_id, _ in FAKE_GPUS:
+            device = devices / bus_id
+            device.mkdir()
+            (device / "vendor").write_text("0x10de\n")
+            (device / "device").write_text(f"{device_id}\n")
+            (device / "class").write_text("0x030000\n")
+
+    for name, script in FAKE_BINARIES.items():
+        write_fake_bin(path / "bin", name, script)
+    return path
+
+
+@contextlib.contextmanager
+def fake_environment(root: Path) -> Iterator[Dict[str, str]]:
+    env = {
+        "HOME": str(root / "home"),
+        "PATH": str(root / "bin"),
+        "NVIDIA_STABILITY_ROOT": str(root),
+        "NVIDIA_STABILITY_CACHE_DIR": str(root / "var" / "cache"),
+        "NVIDIA_STABILITY_STATE_DIR": str(root / "var" / "lib"),
+    }
+    saved_env = {key: os.environ.get(key) for key in env}
+    saved_nvml = NVMLBackend.LIBRARY
+    os.environ.update(env)
+    NVMLBackend.LIBRARY = str(root / "lib" / "libnvidia-ml.so.1")
+    try:
+        yield dict(os.environ)
+    finally:
+        NVMLBackend.LIBRARY = saved_nvml
+        for key, value in saved_env.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
+
+
+def reset_state(root: Path):
+    for name in ("var", "etc/X11"):
+        shutil.rmtree(root / name, ignore_errors=True)
+    (root / "home" / ".profile").unlink(missing_ok=True)
+    for cpufreq in (root / "sys" / "devices" / "system" / "cpu").glob("cpu*/cpufreq"):
+        (cpufreq / "scaling_governor").write_text("powersave\n")
+
+
+def quiet(func: Callable[[], object]) -> Callable[[], object]:
+    def wrapper():
+        with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+            return func()
+    return wrapper
+
+
+def run_main(argv: List[str]) -> int:
+    try:
+        quiet(lambda: nvidia_stability.main(argv))()
+    except SystemExit as exc:
+        return exc.code or 0
+    return 0
+
+
+def run_script(argv: List[str], env: Dict[str, str]) -> int:
+    return subprocess.run([sys.executable, str(SCRIPT)] + argv, env=env, capture_output=True).returncode
+
+
+class Suite:
+    def __init__(self, rounds: int, pattern: str = "*"):
+        self.rounds = rounds
+        self.pattern = pattern
+        self.results: Dict[str, Dict] = {}
+
+    def measure(
+        self,
+        name: str,
+        func: Callable[[], object],
+        ops: int = 1,
+        rounds: Optional[int] = None,
+        setup: Optional[Callable[[], object]] = None,
+    ):
+        if not fnmatch.fnmatch(name, self.pattern):
+            return
+
+        samples = []
+        for _ in range(rounds or self.rounds):
+            if setup:
+                setup()
+            start = time.perf_counter()
+            func()
+            samples.append((time.perf_counter() - start) / ops)
+
+        self.results[name] = {
+            "unit": "s/op",
+            "ops": ops,
+            "rounds": len(samples),
+            "min": min(samples),
+            "median": statistics.median(samples),
+            "mean": statistics.fmean(samples),
+            "stdev": statistics.stdev(samples) if len(samples) > 1 else 0.0,
+        }
+        print(f"{name:<28} {self.results[name]['median'] * 1e6:12.1f} us/op  (min {min(samples) * 1e6:.1f})")
+
+
+def run_micro(suite: Suite, root: Path):
+    skus = list(GPU_POWER_LIMITS)
+    suite.measure("profile.sku", lambda: [GPUDetector._get_gpu_info(name) for name in skus], ops=len(skus))
+    suite.measure(
+        "profile.lspci",
+        lambda: [GPUDetector._get_gpu_info(line) for line in LSPCI_LINES],
+        ops=len(LSPCI_LINES),
+    )
+    suite.measure("profile.index.build", lambda: GPUProfileIndex(GPU_POWER_LIMITS, {}))
+    index = GPUProfileIndex.default()
+    for label, queries in PROFILE_QUERIES.items():
+        suite.measure(
+            f"profile.lookup.{label}", lambda queries=queries: [index.lookup(q) for q in queries], ops=len(queries),
+        )
+    suite.measure(
+        "extract_gpu_name",
+        lambda: [GPUDetector._extract_gpu_name(line) for line in LSPCI_LINES],
+        ops=len(LSPCI_LINES),
+    )
+
+    distro_ids = [distro_id for ids in DISTRO_FAMILIES.values() for distro_id in ids] + ["plan9", ""]
+    suite.measure("get_family", lambda: [DistroDetector.get_family(d) for d in distro_ids], ops=len(distro_ids))
+
+    os_release = str(root / "etc" / "os-release")
+    suite.measure("detect.distro", lambda: DistroDetector.detect(os_release))
+    suite.measure("detect.sysfs", lambda: GPUDetector.detect_all(str(root / "sys")))
+
+    controller = CPUFreqController(str(root / "sys"))
+    governors = itertools.cycle(["performance", "powersave"])
+    suite.measure("cpufreq.apply", lambda: controller.apply(next(governors), None), ops=FAKE_CPUS)
+
+    distro = {"id": "debian", "name": "Debian GNU/Linux", "version": "12", "family": "debian"}
+    gpus = GPUDetector.detect_all(str(root / "sys"))
+    suite.measure("planner.build", lambda: Planner.build(distro, gpus))
+
+
+def run_pipeline(suite: Suite, root: Path, lspci_root: Path):
+    with fake_environment(root) as env:
+        suite.measure("startup.version", lambda: run_script(["--version"], env), rounds=max(3, suite.rounds // 10))
+        suite.measure(
+            "startup.plan", lambda: run_script(["plan"], env),
+            rounds=max(3, suite.rounds // 10), setup=lambda: reset_state(root),
+        )
+
+        suite.measure("e2e.plan.cold", lambda: run_main(["plan"]), setup=lambda: reset_state(root))
+        suite.measure("e2e.plan.warm", lambda: run_main(["plan"]))
+        suite.measure("e2e.apply.cold", lambda: run_main(["apply"]), setup=lambda: reset_state(root))
+        suite.measure("e2e.apply.warm", lambda: run_main(["apply"]))
+
+        reset_state(root)
+        state = {}
+        suite.measure("step.detect", lambda: state.update(system=nvidia_stability.detect_system()))
+        suite.measure("step.build", lambda: state.update(plan=Planner.build(*state["system"])))
+        suite.measure(
+            "step.execute", quiet(lambda: nvidia_stability.run_plan(state["plan"], force=True)),
+            setup=lambda: reset_state(root),
+        )
+        suite.measure("step.reapply", lambda: run_main(["reapply"]))
+
+        gpus = GPUDetector.detect_all(str(root / "sys"))
+        groups = [(gpu["bus_id"], NvidiaConfigurator(gpu).get_settings()) for gpu in gpus]
+        ops = sum(len(settings) for _, settings in groups)
+        suite.measure("gpu.nvidia-smi", lambda: NvidiaSMIBackend().apply_groups(groups), ops=ops)
+
+        def apply_nvml():
+            backend = NVMLBackend(FakeNVML(gpus))
+            backend.open()
+            backend.apply_groups(groups)
+            backend.close()
+
+        suite.measure("gpu.nvml-fake", apply_nvml, ops=ops)
+
+    with fake_environment(lspci_root):
+        suite.measure("detect.lspci", lambda: GPUDetector.detect_all(str(lspci_root / "sys")))
+
+
+def git_revision() -> Dict:
+    def git(*args: str) -> str:
+        result = subprocess.run(["git", *args], cwd=ROOT, capture_output=True, text=True)
+        return result.stdout.strip() if result.returncode == 0 else ""
+
+    return {"commit": git("rev-parse", "--short", "HEAD") or "unknown", "dirty": bool(git("status", "--porcelain"))}
+
+
+def run_suite(rounds: int = 50, pattern: str = "*") -> Dict:
+    suite = Suite(rounds, pattern)
+    scratch = "/dev/shm" if os.path.isdir("/dev/shm") and os.access("/dev/shm", os.W_OK) else None
+    with tempfile.TemporaryDirectory(prefix="nvidia-stability-bench-", dir=scratch) as tmp:
+        root = build_fake_root(Path(tmp) / "sysfs")
+        lspci_root = build_fake_root(Path(tmp) / "lspci", with_sysfs=False)
+        run_micro(suite, root)
+        run_pipeline(suite, root, lspci_root)
+
+    return {
+        "schema": SCHEMA_VERSION,
+        "meta": dict(
+            git_revision(),
+            timestamp=time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            tool_version=nvidia_stability.__version__,
+            python=platform.python_version(),
+            platform=platform.platform(),
+            rounds=rounds,
+        ),
+        "benchmarks": suite.results,
+    }
+
+
+def compare(current: Dict, baseline: Dict, threshold: float) -> List[str]:
+    regressions = []
+    print(f"\n{'benchmark':<28} {'baseline':>12} {'current':>12} {'change':>8}")
+    for name, result in current["benchmarks"].items():
+        base = baseline.get("benchmarks", {}).get(name)
+        if not base or not base["median"]:
+            continue
+        change = result["median"] / base["median"] - 1
+        flag = " !" if change > threshold else ""
+        print(f"{name:<28} {base['median'] * 1e6:10.1f}us {result['median'] * 1e6:10.1f}us {change:+8.1%}{flag}")
+        if change > threshold:
+            regressions.append(name)
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark detection, profile matching and the dry-run pipeline")
+    parser.add_argument("--rounds", type=int, default=50, help="Rounds per benchmark")
+    parser.add_argument("-k", "--filter", default="*", help="Only run benchmarks matching this glob")
+    parser.add_argument("-o", "--output", help="Result file (default: benchmarks/results/<commit>.json)")
+    parser.add_argument("--compare", help="Baseline result file to compare medians against")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Allowed slowdown before failing a comparison")
+    args = parser.parse_args(argv)
+
+    results = run_suite(args.rounds, args.filter)
+
+    output = Path(args.output) if args.output else RESULTS_DIR / f"{results['meta']['commit']}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(results, indent=2) + "\n")
+    print(f"\nResults written to {output}")
+
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text())
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"\nRegressions over {args.threshold:.0%}: {', '.join(regressions)}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -4,6 +4,8 @@ set -e
 
 SCRIPT_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd)"
 PROJECT_ROOT="$(dirname "$SCRIPT_DIR")"
+GPU_SPECS_FILE="${GPU_SPECS_FILE:-$PROJECT_ROOT/data/gpu_specs.tsv}"
+DISTRO_FAMILIES_FILE="${DISTRO_FAMILIES_FILE:-$PROJECT_ROOT/data/distro_families.tsv}"
 
 RED='\033[0;31m'
 GREEN='\033[0;32m'
@@ -59,48 +61,27 @@ detect_distro() {
 
     distro_id=$(echo "$distro_id" | tr '[:upper:]' '[:lower:]')
 
-    case "$distro_id" in
-        debian|ubuntu|linuxmint|pop|elementary|zorin|kali|parrot|mx|deepin|peppermint|bodhi|sparky|devuan|trisquel|pureos)
-            distro_family="debian"
-            ;;
-        fedora|centos|rhel|rocky|alma|oracle|scientific|clearos)
-            distro_family="rhel"
-            ;;
-        arch|manjaro|endeavouros|arcolinux|garuda|artix|parabola|blackarch)
-            distro_family="arch"
-            ;;
-        opensuse*|suse|gecko)
-            distro_family="suse"
-            ;;
-        gentoo|funtoo|calculate|sabayon)
-            distro_family="gentoo"
-            ;;
-        void)
-            distro_family="void"
-            ;;
-        alpine)
-            distro_family="alpine"
-            ;;
-        slackware|salix|porteus|zenwalk)
-            distro_family="slackware"
-            ;;
-        nixos)
-            distro_family="nixos"
-            ;;
-        solus)
-            distro_family="solus"
-            ;;
-        clear-linux-os)
-            distro_family="clear"
-            ;;
-        *)
-            distro_family="unknown"
-            ;;
-    esac
+    distro_family=$(get_distro_family "$distro_id")
 
     echo "$distro_id|$distro_name|$distro_version|$distro_family"
 }
 
+get_distro_family() {
+    local distro_id="$1"
+    local family=""
+
+    if [[ -r "$DISTRO_FAMILIES_FILE" ]]; then
+        family=$(awk -F'\t' -v id="$distro_id" '
+            /^#/ { next }
+            $1 == id { print $2; found = 1; exit }
+            !glob && $1 ~ /\*$/ && index(id, substr($1, 1, length($1) - 1)) == 1 { glob = $2 }
+            END { if (!found && glob) print glob }
+        ' "$DISTRO_FAMILIES_FILE")
+    fi
+
+    echo "${family:-unknown}"
+}
+
 detect_gpu() {
     local gpu_info=""
 
@@ -118,88 +99,17 @@ detect_gpu() {
 
 get_gpu_specs() {
     local gpu_name="$1"
-    local tdp=150
-    local mem_clock=1000
-    local graphics_clock=1500
-
-    case "$gpu_name" in
-        *"4090"*)
-            tdp=450; mem_clock=1313; graphics_clock=2520 ;;
-        *"4080 SUPER"*|*"4080 Super"*)
-            tdp=320; mem_clock=1438; graphics_clock=2550 ;;
-        *"4080"*)
-            tdp=320; mem_clock=1400; graphics_clock=2505 ;;
-        *"4070 Ti SUPER"*|*"4070 Ti Super"*)
-            tdp=285; mem_clock=1313; graphics_clock=2610 ;;
-        *"4070 Ti"*)
-            tdp=285; mem_clock=1313; graphics_clock=2610 ;;
-        *"4070 SUPER"*|*"4070 Super"*)
-            tdp=220; mem_clock=1313; graphics_clock=2475 ;;
-        *"4070"*)
-            tdp=200; mem_clock=1313; graphics_clock=2475 ;;
-        *"4060 Ti"*)
-            tdp=160; mem_clock=1125; graphics_clock=2535 ;;
-        *"4060"*)
-            tdp=115; mem_clock=1125; graphics_clock=2460 ;;
-        *"3090 Ti"*)
-            tdp=450; mem_clock=1313; graphics_clock=1860 ;;
-        *"3090"*)
-            tdp=350; mem_clock=1219; graphics_clock=1695 ;;
-        *"3080 Ti"*)
-            tdp=350; mem_clock=1188; graphics_clock=1665 ;;
-        *"3080"*)
-            tdp=320; mem_clock=1188; graphics_clock=1710 ;;
-        *"3070 Ti"*)
-            tdp=290; mem_clock=1188; graphics_clock=1770 ;;
-        *"3070"*)
-            tdp=220; mem_clock=1188; graphics_clock=1725 ;;
-        *"3060 Ti"*)
-            tdp=200; mem_clock=1188; graphics_clock=1670 ;;
-        *"3060"*)
-            tdp=170; mem_clock=1875; graphics_clock=1777 ;;
-        *"3050"*)
-            tdp=130; mem_clock=1750; graphics_clock=1777 ;;
-        *"2080 Ti"*)
-            tdp=250; mem_clock=1750; graphics_clock=1545 ;;
-        *"2080 SUPER"*|*"2080 Super"*)
-            tdp=250; mem_clock=1937; graphics_clock=1815 ;;
-        *"2080"*)
-            tdp=215; mem_clock=1750; graphics_clock=1710 ;;
-        *"2070 SUPER"*|*"2070 Super"*)
-            tdp=215; mem_clock=1750; graphics_clock=1770 ;;
-        *"2070"*)
-            tdp=175; mem_clock=1750; graphics_clock=1620 ;;
-        *"2060 SUPER"*|*"2060 Super"*)
-            tdp=175; mem_clock=1750; graphics_clock=1650 ;;
-        *"2060"*)
-            tdp=160; mem_clock=1750; graphics_clock=1680 ;;
-        *"1080 Ti"*)
-            tdp=250; mem_clock=1376; graphics_clock=1582 ;;
-        *"1080"*)
-            tdp=180; mem_clock=1251; graphics_clock=1733 ;;
-        *"1070 Ti"*)
-            tdp=180; mem_clock=1001; graphics_clock=1683 ;;
-        *"1070"*)
-            tdp=150; mem_clock=1001; graphics_clock=1683 ;;
-        *"1060"*)
-            tdp=120; mem_clock=1002; graphics_clock=1708 ;;
-        *"1050 Ti"*)
-            tdp=75; mem_clock=875; graphics_clock=1392 ;;
-        *"1050"*)
-            tdp=75; mem_clock=875; graphics_clock=1455 ;;
-        *"1660 Ti"*)
-            tdp=120; mem_clock=1500; graphics_clock=1770 ;;
-        *"1660 SUPER"*|*"1660 Super"*)
-            tdp=125; mem_clock=1750; graphics_clock=1785 ;;
-        *"1660"*)
-            tdp=120; mem_clock=1000; graphics_clock=1785 ;;
-        *"1650 SUPER"*|*"1650 Super"*)
-            tdp=100; mem_clock=1500; graphics_clock=1725 ;;
-        *"1650"*)
-            tdp=75; mem_clock=1000; graphics_clock=1590 ;;
-    esac
+    local specs=""
+
+    if [[ -r "$GPU_SPECS_FILE" ]]; then
+        specs=$(awk -F'\t' -v name="$gpu_name" '
+            BEGIN { name = toupper(name) }
+            /^#/ { next }
+            $1 == "*" || index(name, $1) { print $2 "|" $3 "|" $4; exit }
+        ' "$GPU_SPECS_FILE")
+    fi
 
-    echo "$tdp|$mem_clock|$graphics_clock"
+    echo "${specs:-150|1000|1500}"
 }
 
 install_drivers_debian() {
@@ -421,9 +331,13 @@ EOF
 set_cpu_governor() {
     local family="$1"
 
+    local governors=(/sys/devices/system/cpu/cpu[0-9]*/cpufreq/scaling_governor)
+
     log_info "Setting CPU governor to performance..."
 
-    if [[ "$family" == "arch" ]]; then
+    if [[ -e "${governors[0]}" ]]; then
+        echo performance | sudo tee "${governors[@]}" > /dev/null || log_warn "Could not set CPU governor"
+    elif [[ "$family" == "arch" ]]; then
         sudo cpupower frequency-set -g performance 2>/dev/null || log_warn "Could not set CPU governor"
     else
         sudo cpufreq-set -g performance 2>/dev/null || log_warn "Could not set CPU governor"
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+
+import json
+import os
+import sys
+
+DATA_DIR = os.path.dirname(os.path.abspath(__file__))
+SERIES_PREFIXES = ("RTX ", "GTX ")
+
+
+def build_gpu_specs(data: dict) -> str:
+    lines = [f"# Generated from nvidia_stability.json version {data['version']} by build_tables.py. Do not edit."]
+    id_rows = []
+    name_rows = []
+
+    for name, specs in data["gpus"].items():
+        values = f"{specs['tdp']}\t{specs['mem_clock']}\t{specs['graphics_clock']}"
+        for device_id in specs.get("pci_ids", []):
+            id_rows.append(f"10DE:{device_id.upper()}\t{values}")
+
+        pattern = name.upper()
+        for prefix in SERIES_PREFIXES:
+            if pattern.startswith(prefix):
+                pattern = pattern[len(prefix):]
+        name_rows.append((pattern, f"{pattern}\t{values}"))
+
+    name_rows.sort(key=lambda row: -len(row[0]))
+    default_gpu = data["default_gpu"]
+
+    lines.extend(id_rows)
+    lines.extend(row for _, row in name_rows)
+    lines.append(f"*\t{default_gpu['tdp']}\t{default_gpu['mem_clock']}\t{default_gpu['graphics_clock']}")
+    return "\n".join(lines) + "\n"
+
+
+def build_distro_families(data: dict) -> str:
+    lines = [f"# Generated from nvidia_stability.json version {data['version']} by build_tables.py. Do not edit."]
+    for family, distros in data["distro_families"].items():
+        lines.extend(f"{distro}\t{family}" for distro in distros)
+    return "\n".join(lines) + "\n"
+
+
+def build_tables(data_dir: str = DATA_DIR) -> dict:
+    with open(os.path.join(data_dir, "nvidia_stability.json"), "r") as f:
+        data = json.load(f)
+
+    return {
+        "gpu_specs.tsv": build_gpu_specs(data),
+        "distro_families.tsv": build_distro_families(data),
+    }
+
+
+def main() -> int:
+    data_dir = sys.argv[1] if len(sys.argv) > 1 else DATA_DIR
+    for filename, content in build_tables(data_dir).items():
+        with open(os.path.join(data_dir, filename), "w") as f:
+            f.write(content)
+        print(f"Wrote {os.path.join(data_dir, filename)}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,87 +1,216 @@
 #!/usr/bin/env python3
 
+import argparse
+import fcntl
+import fnmatch
+import hashlib
+import io
+import json
+import platform
 import subprocess
 import sys
+import tempfile
 import os
 import re
+import shlex
+import shutil
+import signal
+import threading
+import time
+from abc import ABC, abstractmethod
+from array import array
+from contextlib import contextmanager
 from pathlib import Path
-from typing import Optional, Dict, Tuple, List
-
-
-GPU_POWER_LIMITS = {
-    "RTX 4090": {"tdp": 450, "mem_clock": 1313, "graphics_clock": 2520},
-    "RTX 4080 SUPER": {"tdp": 320, "mem_clock": 1438, "graphics_clock": 2550},
-    "RTX 4080": {"tdp": 320, "mem_clock": 1400, "graphics_clock": 2505},
-    "RTX 4070 Ti SUPER": {"tdp": 285, "mem_clock": 1313, "graphics_clock": 2610},
-    "RTX 4070 Ti": {"tdp": 285, "mem_clock": 1313, "graphics_clock": 2610},
-    "RTX 4070 SUPER": {"tdp": 220, "mem_clock": 1313, "graphics_clock": 2475},
-    "RTX 4070": {"tdp": 200, "mem_clock": 1313, "graphics_clock": 2475},
-    "RTX 4060 Ti": {"tdp": 160, "mem_clock": 1125, "graphics_clock": 2535},
-    "RTX 4060": {"tdp": 115, "mem_clock": 1125, "graphics_clock": 2460},
-    "RTX 3090 Ti": {"tdp": 450, "mem_clock": 1313, "graphics_clock": 1860},
-    "RTX 3090": {"tdp": 350, "mem_clock": 1219, "graphics_clock": 1695},
-    "RTX 3080 Ti": {"tdp": 350, "mem_clock": 1188, "graphics_clock": 1665},
-    "RTX 3080": {"tdp": 320, "mem_clock": 1188, "graphics_clock": 1710},
-    "RTX 3070 Ti": {"tdp": 290, "mem_clock": 1188, "graphics_clock": 1770},
-    "RTX 3070": {"tdp": 220, "mem_clock": 1188, "graphics_clock": 1725},
-    "RTX 3060 Ti": {"tdp": 200, "mem_clock": 1188, "graphics_clock": 1670},
-    "RTX 3060": {"tdp": 170, "mem_clock": 1875, "graphics_clock": 1777},
-    "RTX 3050": {"tdp": 130, "mem_clock": 1750, "graphics_clock": 1777},
-    "RTX 2080 Ti": {"tdp": 250, "mem_clock": 1750, "graphics_clock": 1545},
-    "RTX 2080 SUPER": {"tdp": 250, "mem_clock": 1937, "graphics_clock": 1815},
-    "RTX 2080": {"tdp": 215, "mem_clock": 1750, "graphics_clock": 1710},
-    "RTX 2070 SUPER": {"tdp": 215, "mem_clock": 1750, "graphics_clock": 1770},
-    "RTX 2070": {"tdp": 175, "mem_clock": 1750, "graphics_clock": 1620},
-    "RTX 2060 SUPER": {"tdp": 175, "mem_clock": 1750, "graphics_clock": 1650},
-    "RTX 2060": {"tdp": 160, "mem_clock": 1750, "graphics_clock": 1680},
-    "GTX 1080 Ti": {"tdp": 250, "mem_clock": 1376, "graphics_clock": 1582},
-    "GTX 1080": {"tdp": 180, "mem_clock": 1251, "graphics_clock": 1733},
-    "GTX 1070 Ti": {"tdp": 180, "mem_clock": 1001, "graphics_clock": 1683},
-    "GTX 1070": {"tdp": 150, "mem_clock": 1001, "graphics_clock": 1683},
-    "GTX 1060": {"tdp": 120, "mem_clock": 1002, "graphics_clock": 1708},
-    "GTX 1050 Ti": {"tdp": 75, "mem_clock": 875, "graphics_clock": 1392},
-    "GTX 1050": {"tdp": 75, "mem_clock": 875, "graphics_clock": 1455},
-    "GTX 1660 Ti": {"tdp": 120, "mem_clock": 1500, "graphics_clock": 1770},
-    "GTX 1660 SUPER": {"tdp": 125, "mem_clock": 1750, "graphics_clock": 1785},
-    "GTX 1660": {"tdp": 120, "mem_clock": 1000, "graphics_clock": 1785},
-    "GTX 1650 SUPER": {"tdp": 100, "mem_clock": 1500, "graphics_clock": 1725},
-    "GTX 1650": {"tdp": 75, "mem_clock": 1000, "graphics_clock": 1590},
-    "GTX 980 Ti": {"tdp": 250, "mem_clock": 875, "graphics_clock": 1075},
-    "GTX 980": {"tdp": 165, "mem_clock": 875, "graphics_clock": 1126},
-    "GTX 970": {"tdp": 145, "mem_clock": 875, "graphics_clock": 1050},
-    "GTX 960": {"tdp": 120, "mem_clock": 875, "graphics_clock": 1127},
-    "GTX 950": {"tdp": 90, "mem_clock": 825, "graphics_clock": 1024},
-    "GTX TITAN X": {"tdp": 250, "mem_clock": 875, "graphics_clock": 1000},
-    "GTX TITAN": {"tdp": 250, "mem_clock": 750, "graphics_clock": 837},
-    "TITAN RTX": {"tdp": 280, "mem_clock": 1750, "graphics_clock": 1770},
-    "TITAN V": {"tdp": 250, "mem_clock": 850, "graphics_clock": 1455},
-    "TITAN Xp": {"tdp": 250, "mem_clock": 1426, "graphics_clock": 1582},
-}
+from typing import TYPE_CHECKING, Callable, Iterator, Optional, Dict, Set, Tuple, List
+
+if TYPE_CHECKING:
+    import asyncio
+    import cProfile
+    import ctypes
+    from http.server import ThreadingHTTPServer
+
+__version__ = "1.0.0"
+
+
+NVIDIA_VENDOR_ID = "0x10de"
+PCI_DISPLAY_CLASS = "0x03"
+
+DATA_FILE = Path(os.environ.get(
+    "NVIDIA_STABILITY_DATA",
+    Path(__file__).resolve().parent.parent / "data" / "nvidia_stability.json",
+))
+
+
+class DataStore:
+    _data: Optional[Dict] = None
+    _gpu_power_limits: Optional[Dict[str, Dict]] = None
+    _pci_device_ids: Optional[Dict[str, str]] = None
+    _distro_lookup: Optional[Dict[str, str]] = None
+
+    @classmethod
+    def load(cls) -> Dict:
+        if cls._data is None:
+            with open(DATA_FILE, "r") as f:
+                cls._data = json.load(f)
+        return cls._data
+
+    @classmethod
+    def gpu_power_limits(cls) -> Dict[str, Dict]:
+        if cls._gpu_power_limits is None:
+            cls._gpu_power_limits = {
+                name: {"tdp": specs["tdp"], "mem_clock": specs["mem_clock"], "graphics_clock": specs["graphics_clock"]}
+                for name, specs in cls.load()["gpus"].items()
+            }
+        return cls._gpu_power_limits
+
+    @classmethod
+    def default_gpu(cls) -> Dict:
+        return cls.load()["default_gpu"]
+
+    @classmethod
+    def pci_device_ids(cls) -> Dict[str, str]:
+        if cls._pci_device_ids is None:
+            cls._pci_device_ids = {
+                device_id: name
+                for name, specs in cls.load()["gpus"].items()
+                for device_id in specs.get("pci_ids", [])
+            }
+        return cls._pci_device_ids
+
+    @classmethod
+    def distro_families(cls) -> Dict[str, List[str]]:
+        return cls.load()["distro_families"]
+
+    @classmethod
+    def distro_lookup(cls) -> Dict[str, str]:
+        if cls._distro_lookup is None:
+            cls._distro_lookup = {
+                distro: family
+                for family, distros in cls.distro_families().items()
+                for distro in distros
+            }
+        return cls._distro_lookup
+
+    @classmethod
+    def reset(cls) -> None:
+        cls._data = None
+        cls._gpu_power_limits = None
+        cls._pci_device_ids = None
+        cls._distro_lookup = None
+
+
+def __getattr__(name: str):
+    if name == "GPU_POWER_LIMITS":
+        return DataStore.gpu_power_limits()
+    if name == "PCI_DEVICE_IDS":
+        return DataStore.pci_device_ids()
+    if name == "DISTRO_FAMILIES":
+        return DataStore.distro_families()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+class Tracer:
+    def __init__(self):
+        self.spans: List[Dict] = []
+        self.origin = time.perf_counter()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def reset(self):
+        with self._lock:
+            self.spans = []
+            self.origin = time.perf_counter()
+
+    @contextmanager
+    def span(self, name: str, category: str, **attrs) -> Iterator[Dict]:
+        stack = self._local.__dict__.setdefault("stack", [])
+        record = {"name": name, "cat": category, "thread": threading.get_ident(), "depth": len(stack)}
+        record.update(attrs)
+        stack.append(record)
+        start = time.perf_counter()
+        try:
+            yield record
+        except BaseException as e:
+            record.setdefault("error", type(e).__name__)
+            raise
+        finally:
+            end = time.perf_counter()
+            stack.pop()
+            record["start_ms"] = (start - self.origin) * 1000
+            record["duration_ms"] = (end - start) * 1000
+            with self._lock:
+                self.spans.append(record)
+
+    def add(self, name: str, category: str, start: float, end: float, **attrs):
+        stack = self._local.__dict__.get("stack", [])
+        record = {"name": name, "cat": category, "thread": threading.get_ident(), "depth": len(stack)}
+        record.update(attrs)
+        record["start_ms"] = (start - self.origin) * 1000
+        record["duration_ms"] = (end - start) * 1000
+        with self._lock:
+            self.spans.append(record)
+
+    def annotate(self, **attrs):
+        stack = self._local.__dict__.get("stack")
+        if stack:
+            stack[-1].update(attrs)
+
+    def sorted_spans(self) -> List[Dict]:
+        with self._lock:
+            return sorted(self.spans, key=lambda span: (span["start_ms"], span["depth"]))
+
+    def to_jsonl(self) -> str:
+        return "".join(json.dumps(span, sort_keys=True) + "\n" for span in self.sorted_spans())
+
+    def to_chrome(self) -> Dict:
+        pid = os.getpid()
+        events = []
+        lanes: Dict[str, int] = {}
+        for span in self.sorted_spans():
+            tid = span["thread"]
+            if "lane" in span:
+                if span["lane"] not in lanes:
+                    lanes[span["lane"]] = len(lanes) + 1
+                    events.append({
+                        "name": "thread_name", "ph": "M", "pid": pid, "tid": lanes[span["lane"]],
+                        "args": {"name": span["lane"]},
+                    })
+                tid = lanes[span["lane"]]
+            args = {key: value for key, value in span.items()
+                    if key not in ("name", "cat", "thread", "lane", "depth", "start_ms", "duration_ms")}
+            events.append({
+                "name": span["name"],
+                "cat": span["cat"],
+                "ph": "X",
+                "ts": round(span["start_ms"] * 1000, 3),
+                "dur": round(span["duration_ms"] * 1000, 3),
+                "pid": pid,
+                "tid": tid,
+                "args": args,
+            })
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def write(self, path: str, fmt: str) -> bool:
+        content = self.to_jsonl() if fmt == "jsonl" else json.dumps(self.to_chrome(), indent=1) + "\n"
+        try:
+            Path(path).write_text(content)
+            return True
+        except OSError:
+            return False
 
-DISTRO_FAMILIES = {
-    "debian": ["debian", "ubuntu", "linuxmint", "pop", "elementary", "zorin", "kali", "parrot", "mx", "antiX", "deepin", "peppermint", "bodhi", "sparky", "devuan", "trisquel", "pureos"],
-    "rhel": ["fedora", "centos", "rhel", "rocky", "alma", "oracle", "scientific", "clearos", "springdale"],
-    "arch": ["arch", "manjaro", "endeavouros", "arcolinux", "garuda", "artix", "parabola", "blackarch", "archbang"],
-    "suse": ["opensuse", "suse", "opensuse-leap", "opensuse-tumbleweed", "gecko"],
-    "gentoo": ["gentoo", "funtoo", "calculate", "sabayon"],
-    "void": ["void"],
-    "alpine": ["alpine"],
-    "slackware": ["slackware", "salix", "porteus", "zenwalk"],
-    "nixos": ["nixos"],
-    "solus": ["solus"],
-    "clear": ["clear-linux-os"],
-}
+
+TRACER = Tracer()
 
 
 class DistroDetector:
     @staticmethod
-    def detect() -> Tuple[str, str, str]:
+    def detect(os_release: str = "/etc/os-release", lsb_release: str = "/etc/lsb-release") -> Tuple[str, str, str]:
         distro_id = ""
         distro_name = ""
         distro_version = ""
 
-        if os.path.exists("/etc/os-release"):
-            with open("/etc/os-release", "r") as f:
+        if os.path.exists(os_release):
+            with open(os_release, "r") as f:
                 for line in f:
                     if line.startswith("ID="):
                         distro_id = line.strip().split("=")[1].strip('"').lower()
@@ -90,8 +219,8 @@ class DistroDetector:
                     elif line.startswith("VERSION_ID="):
                         distro_version = line.strip().split("=")[1].strip('"')
 
-        if not distro_id and os.path.exists("/etc/lsb-release"):
-            with open("/etc/lsb-release", "r") as f:
+        if not distro_id and os.path.exists(lsb_release):
+            with open(lsb_release, "r") as f:
                 for line in f:
                     if line.startswith("DISTRIB_ID="):
                         distro_id = line.strip().split("=")[1].strip('"').lower()
@@ -100,15 +229,76 @@ class DistroDetector:
 
     @staticmethod
     def get_family(distro_id: str) -> str:
-        for family, distros in DISTRO_FAMILIES.items():
-            if distro_id in distros:
+        lookup = DataStore.distro_lookup()
+        if distro_id in lookup:
+            return lookup[distro_id]
+        for pattern, family in lookup.items():
+            if "*" in pattern and fnmatch.fnmatchcase(distro_id, pattern):
                 return family
         return "unknown"
 
 
 class GPUDetector:
     @staticmethod
-    def detect() -> Optional[Dict]:
+    def detect(sysfs_root: str = "/sys") -> Optional[Dict]:
+        gpus = GPUDetector.detect_all(sysfs_root)
+        return gpus[0] if gpus else None
+
+    @staticmethod
+    def detect_all(sysfs_root: str = "/sys") -> List[Dict]:
+        gpus = GPUDetector.detect_sysfs(sysfs_root)
+        if gpus:
+            return gpus
+        return GPUDetector.detect_lspci()
+
+    @staticmethod
+    def detect_sysfs(sysfs_root: str = "/sys") -> List[Dict]:
+        gpus = []
+        for device in GPUDetector.scan_sysfs(sysfs_root):
+            gpu_name = DataStore.pci_device_ids().get(device["device_id"], f"NVIDIA Device [10de:{device['device_id']}]")
+            gpu_info = GPUDetector._get_gpu_info(gpu_name)
+            gpu_info.update(device)
+            gpus.append(gpu_info)
+        return gpus
+
+    @staticmethod
+    def scan_sysfs(sysfs_root: str = "/sys") -> List[Dict]:
+        devices_dir = os.path.join(sysfs_root, "bus", "pci", "devices")
+        devices = []
+
+        try:
+            bus_ids = sorted(os.listdir(devices_dir))
+        except OSError:
+            return devices
+
+        for bus_id in bus_ids:
+            device_dir = os.path.join(devices_dir, bus_id)
+            if GPUDetector._read_sysfs_attr(device_dir, "vendor") != NVIDIA_VENDOR_ID:
+                continue
+            if not GPUDetector._read_sysfs_attr(device_dir, "class").startswith(PCI_DISPLAY_CLASS):
+                continue
+
+            devices.append({
+                "bus_id": bus_id,
+                "device_id": GPUDetector._read_sysfs_attr(device_dir, "device")[2:],
+                "subsystem_vendor_id": GPUDetector._read_sysfs_attr(device_dir, "subsystem_vendor")[2:],
+                "subsystem_device_id": GPUDetector._read_sysfs_attr(device_dir, "subsystem_device")[2:],
+            })
+
+        return devices
+
+    @staticmethod
+    def _read_sysfs_attr(device_dir: str, attr: str) -> str:
+        try:
+            with open(os.path.join(device_dir, attr), "r") as f:
+                return f.read().strip().lower()
+        except OSError:
+            return ""
+
+    @staticmethod
+    def detect_lspci() -> List[Dict]:
+        gpus = []
+
         try:
             result = subprocess.run(
                 ["lspci", "-nn"],
@@ -116,27 +306,30 @@ class GPUDetector:
                 text=True,
                 check=True
             )
-            nvidia_pattern = r"VGA.*NVIDIA.*\[([^\]]+)\]"
-            match = re.search(nvidia_pattern, result.stdout, re.IGNORECASE)
+        except (subprocess.CalledProcessError, FileNotFoundError):
+            return gpus
 
-            if not match:
-                nvidia_pattern = r"3D.*NVIDIA.*\[([^\]]+)\]"
-                match = re.search(nvidia_pattern, result.stdout, re.IGNORECASE)
+        for line in result.stdout.splitlines():
+            if "NVIDIA" not in line.upper():
+                continue
 
+            match = re.search(r"(?:VGA|3D).*NVIDIA.*\[([^\]]+)\]", line, re.IGNORECASE)
             if match:
                 gpu_name = match.group(1)
-                return GPUDetector._get_gpu_info(gpu_name)
+            else:
+                gpu_name = GPUDetector._extract_gpu_name(line)
+            if not gpu_name:
+                continue
 
-            for line in result.stdout.splitlines():
-                if "NVIDIA" in line.upper():
-                    gpu_name = GPUDetector._extract_gpu_name(line)
-                    if gpu_name:
-                        return GPUDetector._get_gpu_info(gpu_name)
+            bus_id = line.split()[0]
+            if bus_id.count(":") == 1:
+                bus_id = f"0000:{bus_id}"
 
-        except (subprocess.CalledProcessError, FileNotFoundError):
-            pass
+            gpu_info = GPUDetector._get_gpu_info(gpu_name)
+            gpu_info["bus_id"] = bus_id
+            gpus.append(gpu_info)
 
-        return None
+        return gpus
 
     @staticmethod
     def _extract_gpu_name(line: str) -> Optional[str]:
@@ -155,224 +348,667 @@ class GPUDetector:
 
     @staticmethod
     def _get_gpu_info(gpu_name: str) -> Dict:
-        gpu_name_upper = gpu_name.upper().strip()
-        gpu_name_normalized = re.sub(r'\s+', ' ', gpu_name_upper)
-
-        for known_gpu, specs in GPU_POWER_LIMITS.items():
-            known_upper = known_gpu.upper()
-            if known_upper == gpu_name_normalized or known_upper == gpu_name_upper:
-                return {
-                    "name": known_gpu,
-                    "detected_name": gpu_name,
-                    "tdp": specs["tdp"],
-                    "mem_clock": specs["mem_clock"],
-                    "graphics_clock": specs["graphics_clock"],
-                }
+        known_gpu = GPUProfileIndex.default().lookup(gpu_name)
 
-        sorted_gpus = sorted(GPU_POWER_LIMITS.keys(), key=len, reverse=True)
-
-        for known_gpu in sorted_gpus:
-            known_upper = known_gpu.upper()
-            if known_upper in gpu_name_normalized or gpu_name_normalized in known_upper:
-                specs = GPU_POWER_LIMITS[known_gpu]
-                return {
-                    "name": known_gpu,
-                    "detected_name": gpu_name,
-                    "tdp": specs["tdp"],
-                    "mem_clock": specs["mem_clock"],
-                    "graphics_clock": specs["graphics_clock"],
-                }
+        if known_gpu:
+            specs = DataStore.gpu_power_limits()[known_gpu]
+            return {
+                "name": known_gpu,
+                "detected_name": gpu_name,
+                "tdp": specs["tdp"],
+                "mem_clock": specs["mem_clock"],
+                "graphics_clock": specs["graphics_clock"],
+            }
 
+        default_gpu = DataStore.default_gpu()
         return {
             "name": gpu_name,
             "detected_name": gpu_name,
-            "tdp": 150,
-            "mem_clock": 1000,
-            "graphics_clock": 1500,
+            "tdp": default_gpu["tdp"],
+            "mem_clock": default_gpu["mem_clock"],
+            "graphics_clock": default_gpu["graphics_clock"],
         }
 
 
+class GPUProfileIndex:
+    IGNORED_TOKENS = {"NVIDIA", "GEFORCE", "CORPORATION"}
+    SERIES_TOKENS = {"RTX", "GTX"}
+
+    _default: Optional["GPUProfileIndex"] = None
+
+    def __init__(self, profiles: Dict[str, Dict], device_ids: Dict[str, str]):
+        self.by_name: Dict[str, str] = {}
+        self.by_device_id: Dict[str, str] = {}
+        self.by_token: Dict[str, List[Tuple[frozenset, str]]] = {}
+
+        for known_gpu in profiles:
+            self.by_name[self.normalize(known_gpu)] = known_gpu
+
+            tokens = self.tokenize(known_gpu)
+            if len(tokens) > 1 and tokens[0] in self.SERIES_TOKENS:
+                tokens = tokens[1:]
+            key_tokens = frozenset(tokens)
+            for token in key_tokens:
+                self.by_token.setdefault(token, []).append((key_tokens, known_gpu))
+
+        for candidates in self.by_token.values():
+            candidates.sort(key=lambda candidate: (-len(candidate[0]), candidate[1]))
+
+        for device_id, known_gpu in device_ids.items():
+            if known_gpu in profiles:
+                self.by_device_id[device_id.lower()] = known_gpu
+
+    @classmethod
+    def default(cls) -> "GPUProfileIndex":
+        if cls._default is None:
+            cls._default = cls(DataStore.gpu_power_limits(), DataStore.pci_device_ids())
+        return cls._default
+
+    @classmethod
+    def tokenize(cls, name: str) -> List[str]:
+        tokens = re.findall(r"[A-Z]+|\d+", name.upper())
+        return [token for token in tokens if token not in cls.IGNORED_TOKENS]
+
+    @classmethod
+    def normalize(cls, name: str) -> str:
+        return " ".join(cls.tokenize(name))
+
+    def lookup(self, gpu_name: str) -> Optional[str]:
+        known_gpu = self.by_name.get(self.normalize(gpu_name))
+        if known_gpu:
+            return known_gpu
+
+        match = re.search(r"10de:([0-9a-f]{4})", gpu_name, re.IGNORECASE)
+        if match:
+            known_gpu = self.by_device_id.get(match.group(1).lower())
+            if known_gpu:
+                return known_gpu
+
+        tokens = set(self.tokenize(gpu_name))
+        best = None
+        for token in tokens:
+            for key_tokens, candidate in self.by_token.get(token, ()):
+                if not key_tokens <= tokens:
+                    continue
+                if best is None or (-len(key_tokens), candidate) < (-len(best[0]), best[1]):
+                    best = (key_tokens, candidate)
+                break
+
+        return best[1] if best else None
+
+
+PACKAGE_MANAGERS = {
+    "apt": {
+        "refresh": "apt update",
+        "install": "apt install -y {packages}",
+        "download": "apt-get install -y --download-only {packages}",
+        "fetch": (
+            "mkdir -p {dir}/partial && apt-get install -y --download-only -o Debug::NoLocking=1"
+            " -o Dir::Cache::archives={dir} {packages}"
+        ),
+        "fetch_install": "apt install -y -o Dir::Cache::archives={dir} {packages}",
+        "bundle": (
+            "apt-get install -y --download-only -o Dir::State::status=/dev/null -o Dir::Cache::archives={dir} {packages}"
+        ),
+        "local_install": "apt-get install -y --no-download {files}",
+        "query": ["dpkg-query", "-W", "-f=${Package}\\t${db:Status-Abbrev}\\n"],
+        "query_format": "dpkg",
+    },
+    "dnf": {
+        "refresh": "",
+        "install": "dnf install -y {packages}",
+        "download": "dnf install -y --downloadonly {packages}",
+        "fetch": "",
+        "fetch_install": "",
+        "bundle": "dnf download -y --resolve --alldeps --destdir {dir} {packages}",
+        "local_install": "dnf install -y --disablerepo='*' {files}",
+        "query": ["rpm", "-q", "--qf", "%{NAME}\\n"],
+        "query_format": "rpm",
+    },
+    "yum": {
+        "refresh": "",
+        "install": "yum install -y {packages} || dnf install -y {packages}",
+        "download": "yum install -y --downloadonly {packages} || dnf install -y --downloadonly {packages}",
+        "fetch": "",
+        "fetch_install": "",
+        "bundle": (
+            "yumdownloader --resolve --alldeps --destdir {dir} {packages}"
+            " || dnf download -y --resolve --alldeps --destdir {dir} {packages}"
+        ),
+        "local_install": "yum install -y --disablerepo='*' {files} || dnf install -y --disablerepo='*' {files}",
+        "query": ["rpm", "-q", "--qf", "%{NAME}\\n"],
+        "query_format": "rpm",
+    },
+    "pacman": {
+        "refresh": "",
+        "install": "pacman -Sy --noconfirm --needed {packages}",
+        "download": "pacman -Syw --noconfirm --needed {packages}",
+        "fetch": "",
+        "fetch_install": "",
+        "bundle": "pacman -Syw --noconfirm --cachedir {dir} {packages}",
+        "local_install": "pacman -U --noconfirm --needed {files}",
+        "query": ["pacman", "-Q"],
+        "query_format": "pacman",
+    },
+    "zypper": {
+        "refresh": "zypper --gpg-auto-import-keys refresh",
+        "install": "zypper install -y {packages}",
+        "download": "zypper --non-interactive install --download-only {packages}",
+        "fetch": "",
+        "fetch_install": "",
+        "bundle": "zypper --non-interactive --pkg-cache-dir {dir} install --download-only --force {packages}",
+        "local_install": "zypper --non-interactive --no-refresh install -y {files}",
+        "query": ["rpm", "-q", "--qf", "%{NAME}\\n"],
+        "query_format": "rpm",
+    },
+    "emerge": {
+        "refresh": "emerge --sync",
+        "install": "emerge {packages}",
+        "download": "emerge --fetchonly {packages}",
+        "fetch": "",
+        "fetch_install": "",
+        "bundle": "",
+        "local_install": "",
+        "query": [],
+        "query_format": "",
+    },
+    "xbps": {
+        "refresh": "",
+        "install": "xbps-install -Sy {packages}",
+        "download": "xbps-install -SyD {packages}",
+        "fetch": "",
+        "fetch_install": "",
+        "bundle": "",
+        "local_install": "",
+        "query": ["xbps-query", "-l"],
+        "query_format": "xbps",
+    },
+    "apk": {
+        "refresh": "",
+        "install": "apk add --no-cache {packages}",
+        "download": "",
+        "fetch": "",
+        "fetch_install": "",
+        "bundle": "",
+        "local_install": "",
+        "query": ["apk", "info", "-e"],
+        "query_format": "apk",
+    },
+    "sbopkg": {
+        "refresh": "",
+        "install": "sbopkg -i {packages}",
+        "download": "",
+        "fetch": "",
+        "fetch_install": "",
+        "bundle": "",
+        "local_install": "",
+        "query": [],
+        "query_format": "",
+    },
+    "eopkg": {
+        "refresh": "",
+        "install": "eopkg install -y {packages}",
+        "download": "eopkg fetch {packages}",
+        "fetch": "",
+        "fetch_install": "",
+        "bundle": "",
+        "local_install": "",
+        "query": [],
+        "query_format": "",
+    },
+    "swupd": {
+        "refresh": "",
+        "install": "swupd bundle-add {packages}",
+        "download": "",
+        "fetch": "",
+        "fetch_install": "",
+        "bundle": "",
+        "local_install": "",
+        "query": ["swupd", "bundle-list"],
+        "query_format": "swupd",
+    },
+}
+
+
+class PackageQuery:
+    LIST_ALL_FORMATS = {"xbps", "swupd"}
+
+    @staticmethod
+    def expand(package: str) -> str:
+        return package.replace("$(uname -r)", platform.release())
+
+    @staticmethod
+    def installed(manager: str, packages: List[str]) -> Optional[Set[str]]:
+        spec = PACKAGE_MANAGERS.get(manager)
+        if not spec or not spec["query"] or not packages:
+            return None
+
+        query_format = spec["query_format"]
+        argv = list(spec["query"])
+        if query_format not in PackageQuery.LIST_ALL_FORMATS:
+            argv.extend(PackageQuery.expand(package) for package in packages)
+
+        with TRACER.span(argv[0], "query", packages=len(packages)) as span:
+            try:
+                result = subprocess.run(argv, capture_output=True, text=True, timeout=60)
+            except (OSError, subprocess.TimeoutExpired):
+                span["exit_code"] = None
+                return None
+            span["exit_code"] = result.returncode
+            span["output_bytes"] = len(result.stdout) + len(result.stderr)
+
+        parser = getattr(PackageQuery, f"_parse_{query_format}")
+        return parser(result.stdout)
+
+    @staticmethod
+    def _parse_dpkg(output: str) -> Set[str]:
+        installed = set()
+        for line in output.splitlines():
+            name, _, status = line.partition("\t")
+            if status.startswith("ii"):
+                installed.add(name)
+        return installed
+
+    @staticmethod
+    def _parse_rpm(output: str) -> Set[str]:
+        return {line.strip() for line in output.splitlines() if line.strip() and " " not in line.strip()}
+
+    @staticmethod
+    def _parse_pacman(output: str) -> Set[str]:
+        return {line.split()[0] for line in output.splitlines() if line.strip()}
+
+    @staticmethod
+    def _parse_apk(output: str) -> Set[str]:
+        return {line.strip() for line in output.splitlines() if line.strip()}
+
+    @staticmethod
+    def _parse_xbps(output: str) -> Set[str]:
+        installed = set()
+        for line in output.splitlines():
+            fields = line.split()
+            if len(fields) >= 2 and fields[0] == "ii":
+                installed.add(fields[1].rsplit("-", 1)[0])
+        return installed
+
+    @staticmethod
+    def _parse_swupd(output: str) -> Set[str]:
+        return {line.split()[0] for line in output.splitlines() if line.strip() and ":" not in line}
+
+
 class PackageManager:
+    BUILD_PACKAGES = ("linux-headers", "build-essential", "dkms", "kernel-devel", "kernel-headers")
+
     def __init__(self, distro_family: str, distro_id: str, distro_version: str):
         self.family = distro_family
         self.distro_id = distro_id
         self.version = distro_version
 
     def get_install_commands(self) -> List[str]:
-        commands = []
-
-        if self.family == "debian":
-            commands = self._get_debian_commands()
-        elif self.family == "rhel":
-            commands = self._get_rhel_commands()
-        elif self.family == "arch":
-            commands = self._get_arch_commands()
-        elif self.family == "suse":
-            commands = self._get_suse_commands()
-        elif self.family == "gentoo":
-            commands = self._get_gentoo_commands()
-        elif self.family == "void":
-            commands = self._get_void_commands()
-        elif self.family == "alpine":
-            commands = self._get_alpine_commands()
-        elif self.family == "slackware":
-            commands = self._get_slackware_commands()
-        elif self.family == "nixos":
-            commands = self._get_nixos_commands()
-        elif self.family == "solus":
-            commands = self._get_solus_commands()
-        elif self.family == "clear":
-            commands = self._get_clear_commands()
-
-        return commands
-
-    def _get_debian_commands(self) -> List[str]:
-        commands = [
-            "apt update",
-            "apt install -y linux-headers-$(uname -r)",
-            "apt install -y build-essential dkms",
-        ]
+        return self.render_plan(self.get_plan())
+
+    def get_pending_plan(self) -> Dict:
+        return self.pending_plan(self.get_plan())
+
+    @staticmethod
+    def pending_plan(plan: Dict) -> Dict:
+        candidates = plan["packages"] + [pkg for alt in plan["alternatives"] for pkg in alt] + plan["provides"]
+        installed = PackageQuery.installed(plan["manager"], candidates)
+        if installed is None:
+            return plan
+        return PackageManager.prune_plan(plan, installed)
+
+    @staticmethod
+    def prune_plan(plan: Dict, installed: Set[str]) -> Dict:
+        pending = dict(plan)
+        pending["packages"] = [pkg for pkg in plan["packages"] if PackageQuery.expand(pkg) not in installed]
+
+        alternatives_satisfied = any(
+            all(PackageQuery.expand(pkg) in installed for pkg in alt) for alt in plan["alternatives"]
+        ) or any(fnmatch.filter(installed, pattern) for pattern in plan["provides"])
+        if alternatives_satisfied:
+            pending["alternatives"] = []
+            pending["driver_tool"] = ""
+
+        if not pending["packages"] and not pending["alternatives"] and not pending["driver_tool"]:
+            pending["repos"] = []
+            pending["refresh"] = False
+            pending["post"] = []
+
+        return pending
+
+    def get_plan(self) -> Dict:
+        builders = {
+            "debian": self._get_debian_plan,
+            "rhel": self._get_rhel_plan,
+            "arch": self._get_arch_plan,
+            "suse": self._get_suse_plan,
+            "gentoo": self._get_gentoo_plan,
+            "void": self._get_void_plan,
+            "alpine": self._get_alpine_plan,
+            "slackware": self._get_slackware_plan,
+            "nixos": self._get_nixos_plan,
+            "solus": self._get_solus_plan,
+            "clear": self._get_clear_plan,
+        }
+        builder = builders.get(self.family)
+        return builder() if builder else self._new_plan("")
+
+    @staticmethod
+    def _new_plan(manager: str, packages: Optional[List[str]] = None) -> Dict:
+        return {
+            "manager": manager,
+            "repos": [],
+            "refresh": False,
+            "packages": list(packages or []),
+            "alternatives": [],
+            "driver_tool": "",
+            "provides": [],
+            "post": [],
+        }
+
+    @staticmethod
+    def render_plan(plan: Dict) -> List[str]:
+        return [command for _, command in PackageManager.render_phases(plan)]
+
+    @staticmethod
+    def render_phases(plan: Dict) -> List[Tuple[str, str]]:
+        phases = [("repos", cmd) for cmd in plan["repos"]]
+        manager = PACKAGE_MANAGERS.get(plan["manager"])
+
+        if manager:
+            if plan["refresh"] and manager["refresh"]:
+                phases.append(("refresh", manager["refresh"]))
+
+            install = manager["install"]
+            packages = plan["packages"]
+            alternatives = plan["alternatives"]
+
+            build, driver = PackageManager.split_build_packages(plan)
+            prefetch = PackageManager.prefetch_packages(plan)
+            if plan.get("prefetch") and manager["fetch"] and build and (driver or alternatives):
+                fetch_dir = shlex.quote(str(get_cache_dir() / "packages"))
+                fetch = " ".join(driver + (alternatives[0] if alternatives else []))
+                phases.append(("prefetch", f"{manager['fetch'].format(dir=fetch_dir, packages=fetch)} || true"))
+                phases.append(("build", install.format(packages=" ".join(build))))
+                install = manager["fetch_install"].replace("{dir}", fetch_dir)
+                packages = driver
+            elif prefetch and plan.get("prefetch") and manager["download"]:
+                phases.append(("prefetch", f"{manager['download'].format(packages=' '.join(prefetch))} || true"))
+
+            if plan["driver_tool"]:
+                if packages:
+                    phases.append(("install", install.format(packages=" ".join(packages))))
+                steps = [plan["driver_tool"]] + [install.format(packages=" ".join(alt)) for alt in alternatives]
+                phases.append(("install", " || ".join(steps)))
+            elif alternatives:
+                phases.append(
+                    ("install", " || ".join(install.format(packages=" ".join(packages + alt)) for alt in alternatives))
+                )
+            elif packages:
+                phases.append(("install", install.format(packages=" ".join(packages))))
+
+        phases.extend(("post", cmd) for cmd in plan["post"])
+        return phases
+
+    @staticmethod
+    def split_build_packages(plan: Dict) -> Tuple[List[str], List[str]]:
+        if plan["driver_tool"]:
+            return [], list(plan["packages"])
+        build = [package for package in plan["packages"] if package.startswith(PackageManager.BUILD_PACKAGES)]
+        return build, [package for package in plan["packages"] if package not in build]
+
+    @staticmethod
+    def prefetch_packages(plan: Dict) -> List[str]:
+        if plan["driver_tool"] or not plan["alternatives"]:
+            return list(plan["packages"])
+        return plan["packages"] + plan["alternatives"][0]
+
+    def _get_debian_plan(self) -> Dict:
+        plan = self._new_plan("apt", ["linux-headers-$(uname -r)", "build-essential", "dkms"])
+        plan["refresh"] = True
 
         if self.distro_id == "debian":
-            commands.extend([
-                "apt install -y nvidia-driver firmware-misc-nonfree",
-            ])
+            plan["packages"].extend(["nvidia-driver", "firmware-misc-nonfree"])
             if self.version and self.version.startswith("12"):
-                commands.extend([
+                plan["post"].extend([
                     "apt -t bookworm-backports install -y nvidia-driver || true",
                     "apt -t bookworm-backports install -y linux-image-amd64 || true",
                 ])
             elif self.version and self.version.startswith("11"):
-                commands.extend([
-                    "apt -t bullseye-backports install -y nvidia-driver || true",
-                ])
+                plan["post"].append("apt -t bullseye-backports install -y nvidia-driver || true")
         elif self.distro_id in ["ubuntu", "pop", "linuxmint", "elementary", "zorin"]:
-            commands.extend([
-                "add-apt-repository -y ppa:graphics-drivers/ppa || true",
-                "apt update",
-                "ubuntu-drivers install nvidia || apt install -y nvidia-driver-550 || apt install -y nvidia-driver",
-            ])
+            plan["repos"].append("add-apt-repository -y -n ppa:graphics-drivers/ppa || true")
+            plan["driver_tool"] = "ubuntu-drivers install nvidia"
+            plan["alternatives"] = [["nvidia-driver-550"], ["nvidia-driver"]]
+            plan["provides"] = ["nvidia-driver-*"]
         else:
-            commands.append("apt install -y nvidia-driver")
-
-        commands.append("apt install -y cpufrequtils")
-        return commands
+            plan["packages"].append("nvidia-driver")
 
-    def _get_rhel_commands(self) -> List[str]:
-        commands = []
+        return plan
 
+    def _get_rhel_plan(self) -> Dict:
         if self.distro_id == "fedora":
-            commands = [
-                "dnf install -y kernel-devel kernel-headers",
-                "dnf install -y https://download1.rpmfusion.org/free/fedora/rpmfusion-free-release-$(rpm -E %fedora).noarch.rpm || true",
-                "dnf install -y https://download1.rpmfusion.org/nonfree/fedora/rpmfusion-nonfree-release-$(rpm -E %fedora).noarch.rpm || true",
-                "dnf install -y akmod-nvidia xorg-x11-drv-nvidia-cuda",
-                "dnf install -y kernel-tools",
-            ]
+            plan = self._new_plan("dnf", ["kernel-devel", "kernel-headers", "akmod-nvidia", "xorg-x11-drv-nvidia-cuda"])
+            plan["repos"].append(
+                "dnf install -y"
+                " https://download1.rpmfusion.org/free/fedora/rpmfusion-free-release-$(rpm -E %fedora).noarch.rpm"
+                " https://download1.rpmfusion.org/nonfree/fedora/rpmfusion-nonfree-release-$(rpm -E %fedora).noarch.rpm"
+                " || true"
+            )
         elif self.distro_id in ["centos", "rhel", "rocky", "alma", "oracle"]:
-            commands = [
-                "yum install -y epel-release || dnf install -y epel-release",
-                "yum install -y kernel-devel kernel-headers || dnf install -y kernel-devel kernel-headers",
-                "yum install -y dkms || dnf install -y dkms",
-                "yum install -y nvidia-driver nvidia-driver-cuda || dnf install -y nvidia-driver nvidia-driver-cuda",
-                "yum install -y kernel-tools || dnf install -y kernel-tools",
-            ]
+            plan = self._new_plan("yum", [
+                "kernel-devel", "kernel-headers", "dkms", "nvidia-driver", "nvidia-driver-cuda",
+            ])
+            plan["repos"].append("yum install -y epel-release || dnf install -y epel-release")
         else:
-            commands = [
-                "dnf install -y kernel-devel kernel-headers akmod-nvidia xorg-x11-drv-nvidia",
-                "dnf install -y kernel-tools",
-            ]
-
-        return commands
+            plan = self._new_plan("dnf", ["kernel-devel", "kernel-headers", "akmod-nvidia", "xorg-x11-drv-nvidia"])
 
-    def _get_arch_commands(self) -> List[str]:
-        commands = [
-            "pacman -Sy --noconfirm linux-headers",
-            "pacman -S --noconfirm nvidia nvidia-utils nvidia-settings",
-            "pacman -S --noconfirm cpupower",
-        ]
+        return plan
 
+    def _get_arch_plan(self) -> Dict:
         if self.distro_id == "manjaro":
-            commands = [
-                "mhwd -a pci nonfree 0300 || pacman -S --noconfirm nvidia nvidia-utils",
-                "pacman -S --noconfirm cpupower",
-            ]
+            plan = self._new_plan("pacman")
+            plan["driver_tool"] = "mhwd -a pci nonfree 0300"
+            plan["alternatives"] = [["nvidia", "nvidia-utils"]]
+            plan["provides"] = ["nvidia-utils"]
         elif self.distro_id == "endeavouros":
-            commands = [
-                "pacman -Sy --noconfirm linux-headers nvidia-dkms nvidia-utils nvidia-settings",
-                "pacman -S --noconfirm cpupower",
-            ]
+            plan = self._new_plan("pacman", ["linux-headers", "nvidia-dkms", "nvidia-utils", "nvidia-settings"])
+        else:
+            plan = self._new_plan("pacman", ["linux-headers", "nvidia", "nvidia-utils", "nvidia-settings"])
 
-        return commands
+        return plan
 
-    def _get_suse_commands(self) -> List[str]:
-        commands = [
-            "zypper install -y kernel-devel",
-        ]
+    def _get_suse_plan(self) -> Dict:
+        plan = self._new_plan("zypper", ["kernel-devel"])
+        plan["refresh"] = True
 
         if "tumbleweed" in self.distro_id.lower():
-            commands.extend([
-                "zypper addrepo --refresh https://download.nvidia.com/opensuse/tumbleweed NVIDIA || true",
-                "zypper --gpg-auto-import-keys refresh",
-                "zypper install -y nvidia-video-G06 nvidia-gl-G06",
-            ])
+            plan["repos"].append("zypper addrepo --refresh https://download.nvidia.com/opensuse/tumbleweed NVIDIA || true")
+            plan["packages"].extend(["nvidia-video-G06", "nvidia-gl-G06"])
         else:
-            commands.extend([
-                "zypper addrepo --refresh https://download.nvidia.com/opensuse/leap/$(. /etc/os-release && echo $VERSION_ID)/x86_64 NVIDIA || true",
-                "zypper --gpg-auto-import-keys refresh",
-                "zypper install -y nvidia-video-G06 nvidia-gl-G06 || zypper install -y nvidia-gfxG05-kmp-default",
-            ])
+            plan["repos"].append(
+                "zypper addrepo --refresh https://download.nvidia.com/opensuse/leap/$(. /etc/os-release && echo $VERSION_ID)/x86_64 NVIDIA || true"
+            )
+            plan["alternatives"] = [["nvidia-video-G06", "nvidia-gl-G06"], ["nvidia-gfxG05-kmp-default"]]
 
-        commands.append("zypper install -y cpupower")
-        return commands
+        return plan
 
-    def _get_gentoo_commands(self) -> List[str]:
-        return [
-            "emerge --sync",
-            "emerge x11-drivers/nvidia-drivers",
-            "emerge sys-power/cpupower",
-        ]
+    def _get_gentoo_plan(self) -> Dict:
+        plan = self._new_plan("emerge", ["x11-drivers/nvidia-drivers"])
+        plan["refresh"] = True
+        return plan
 
-    def _get_void_commands(self) -> List[str]:
-        return [
-            "xbps-install -Sy nvidia nvidia-libs nvidia-libs-32bit",
-            "xbps-install -Sy linux-headers",
-        ]
+    def _get_void_plan(self) -> Dict:
+        return self._new_plan("xbps", ["nvidia", "nvidia-libs", "nvidia-libs-32bit", "linux-headers"])
 
-    def _get_alpine_commands(self) -> List[str]:
-        return [
-            "apk add --no-cache linux-headers",
-            "apk add --no-cache nvidia-driver nvidia-utils",
-        ]
+    def _get_alpine_plan(self) -> Dict:
+        return self._new_plan("apk", ["linux-headers", "nvidia-driver", "nvidia-utils"])
 
-    def _get_slackware_commands(self) -> List[str]:
-        return [
-            "sbopkg -i nvidia-driver nvidia-kernel",
-        ]
+    def _get_slackware_plan(self) -> Dict:
+        return self._new_plan("sbopkg", ["nvidia-driver", "nvidia-kernel"])
 
-    def _get_nixos_commands(self) -> List[str]:
-        return [
+    def _get_nixos_plan(self) -> Dict:
+        plan = self._new_plan("")
+        plan["post"] = [
             'echo "NixOS requires manual configuration in /etc/nixos/configuration.nix"',
             'echo "Add: services.xserver.videoDrivers = [ \\"nvidia\\" ];"',
             'echo "Then run: sudo nixos-rebuild switch"',
         ]
+        return plan
 
-    def _get_solus_commands(self) -> List[str]:
-        return [
-            "eopkg install -y nvidia-glx-driver nvidia-glx-driver-32bit",
-            "eopkg install -y linux-current-headers",
-        ]
+    def _get_solus_plan(self) -> Dict:
+        return self._new_plan("eopkg", ["nvidia-glx-driver", "nvidia-glx-driver-32bit", "linux-current-headers"])
 
-    def _get_clear_commands(self) -> List[str]:
-        return [
-            "swupd bundle-add kernel-native-dkms",
-            "swupd bundle-add nvidia-driver",
-        ]
+    def _get_clear_plan(self) -> Dict:
+        return self._new_plan("swupd", ["kernel-native-dkms", "nvidia-driver"])
+
+
+class OfflineBundle:
+    PACKAGE_SUFFIXES = (".deb", ".rpm", ".pkg.tar.zst", ".pkg.tar.xz")
+    CHUNK_SIZE = 1 << 20
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.manifest_path = self.path / "manifest.json"
+
+    @staticmethod
+    def target_key(distro: Dict) -> str:
+        return f"{distro['family']}/{distro['id']}/{distro['version'] or '-'}"
+
+    @staticmethod
+    def bundle_packages(plan: Dict) -> List[str]:
+        return plan["packages"] + (plan["alternatives"][0] if plan["alternatives"] else [])
+
+    @staticmethod
+    def supported(manager: str) -> bool:
+        templates = PACKAGE_MANAGERS.get(manager)
+        return bool(templates and templates["bundle"] and templates["local_install"])
+
+    @staticmethod
+    def hash_file(path: Path) -> Tuple[str, int]:
+        digest = hashlib.sha256()
+        size = 0
+        with open(path, "rb") as f:
+            while True:
+                chunk = f.read(OfflineBundle.CHUNK_SIZE)
+                if not chunk:
+                    break
+                digest.update(chunk)
+                size += len(chunk)
+        return digest.hexdigest(), size
+
+    def blob_path(self, digest: str) -> Path:
+        return self.path / "blobs" / "sha256" / digest[:2] / digest
+
+    def load(self) -> Dict:
+        try:
+            with open(self.manifest_path, "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {"version": 1, "targets": {}}
+
+    def target(self, key: str) -> Optional[Dict]:
+        return self.load()["targets"].get(key)
+
+    def artifacts(self, download_dir: Path) -> List[Path]:
+        return sorted(
+            path for path in download_dir.rglob("*")
+            if path.is_file() and path.name.endswith(self.PACKAGE_SUFFIXES) and "partial" not in path.parts
+        )
+
+    def add(self, key: str, manager: str, packages: List[str], download_dir: Path) -> Dict:
+        stats = {"artifacts": 0, "added": 0, "deduplicated": 0, "bytes": 0}
+        artifacts = []
+        for path in self.artifacts(download_dir):
+            digest, size = self.hash_file(path)
+            blob = self.blob_path(digest)
+            if blob.exists():
+                stats["deduplicated"] += 1
+                path.unlink()
+            else:
+                blob.parent.mkdir(parents=True, exist_ok=True)
+                os.replace(path, blob)
+                stats["added"] += 1
+                stats["bytes"] += size
+            artifacts.append({"name": path.name, "sha256": digest, "size": size})
+        stats["artifacts"] = len(artifacts)
+        if not artifacts:
+            return stats
+
+        self.path.mkdir(parents=True, exist_ok=True)
+        with open(self.path / ".manifest.lock", "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            manifest = self.load()
+            manifest["targets"][key] = {
+                "manager": manager,
+                "packages": packages,
+                "kernel": platform.release(),
+                "created": int(time.time()),
+                "artifacts": artifacts,
+            }
+            tmp_path = self.manifest_path.with_suffix(".tmp")
+            with open(tmp_path, "w") as f:
+                json.dump(manifest, f, indent=2, sort_keys=True)
+            os.replace(tmp_path, self.manifest_path)
+        return stats
+
+    def verify(self, key: Optional[str] = None) -> List[Dict]:
+        targets = self.load()["targets"]
+        checked: Dict[str, str] = {}
+        problems = []
+        for name in sorted(targets) if key is None else [key]:
+            for artifact in targets.get(name, {}).get("artifacts", []):
+                digest = artifact["sha256"]
+                if digest not in checked:
+                    try:
+                        actual, _ = self.hash_file(self.blob_path(digest))
+                        checked[digest] = "" if actual == digest else "hash mismatch"
+                    except OSError:
+                        checked[digest] = "missing"
+                if checked[digest]:
+                    problems.append({"target": name, "name": artifact["name"], "sha256": digest, "error": checked[digest]})
+        return problems
+
+    def stage(self, key: str, stage_dir: Path) -> Dict:
+        entry = self.target(key)
+        if entry is None:
+            return {"success": False, "error": f"no {key} packages in {self.path}", "failed": [], "artifacts": 0}
+
+        shutil.rmtree(stage_dir, ignore_errors=True)
+        stage_dir.mkdir(parents=True)
+        failed = []
+        for artifact in entry["artifacts"]:
+            staged = stage_dir / artifact["name"]
+            try:
+                try:
+                    os.link(self.blob_path(artifact["sha256"]), staged)
+                except OSError:
+                    shutil.copyfile(self.blob_path(artifact["sha256"]), staged)
+                digest, _ = self.hash_file(staged)
+            except OSError:
+                failed.append(artifact["name"])
+                continue
+            if digest != artifact["sha256"]:
+                staged.unlink()
+                failed.append(artifact["name"])
+        return {"success": not failed, "failed": failed, "artifacts": len(entry["artifacts"]) - len(failed)}
 
 
 class NvidiaConfigurator:
-    def __init__(self, gpu_info: Dict):
+    WORKLOADS = ("graphics", "compute-throughput", "compute-latency")
+    LATENCY_CLOCK_RATIO = 0.85
+    CLOCK_STEP_MHZ = 15
+    RESETS = {
+        "application_clocks": "reset_application_clocks",
+        "locked_gpu_clocks": "reset_gpu_clocks",
+        "locked_memory_clocks": "reset_memory_clocks",
+    }
+
+    def __init__(self, gpu_info: Dict, workload: str = "graphics"):
+        if workload not in self.WORKLOADS:
+            raise ValueError(f"unknown workload {workload!r}, expected one of {', '.join(self.WORKLOADS)}")
         self.gpu_info = gpu_info
+        self.workload = workload
 
     def create_xorg_config(self) -> str:
         coolbits = self._get_coolbits()
@@ -399,22 +1035,71 @@ EndSection
         else:
             return 28
 
-    def get_nvidia_smi_commands(self) -> List[str]:
-        commands = [
-            "nvidia-smi -pm 1",
-            f"nvidia-smi -pl {self.gpu_info['tdp']}",
-        ]
-        return commands
+    def render(self, setting: Tuple) -> str:
+        return NvidiaSMIBackend.command(self.gpu_info.get("bus_id", ""), setting)
 
-    def get_clock_commands(self) -> List[str]:
+    def get_power_settings(self) -> List[Tuple]:
+        return [("persistence", 1), ("power_limit", self.gpu_info["tdp"])]
+
+    def get_latency_clock(self) -> int:
+        graphics_clock = self.gpu_info.get("graphics_clock", 1500)
+        return int(graphics_clock * self.LATENCY_CLOCK_RATIO) // self.CLOCK_STEP_MHZ * self.CLOCK_STEP_MHZ
+
+    def get_clock_lock_support(self) -> Tuple[bool, bool]:
+        gpu_name = self.gpu_info.get("name", "").upper()
+
+        if any(x in gpu_name for x in ["GTX 10", "GTX 9", "TITAN X", "GTX TITAN"]):
+            return False, False
+        elif any(x in gpu_name for x in ["RTX 20", "GTX 16", "TITAN RTX", "TITAN V"]):
+            return True, False
+        else:
+            return True, True
+
+    def get_clock_settings(self) -> List[Tuple]:
         mem_clock = self.gpu_info.get("mem_clock", 1000)
         graphics_clock = self.gpu_info.get("graphics_clock", 1500)
+        lock_gpu, lock_memory = self.get_clock_lock_support()
 
-        return [
-            f"nvidia-smi -ac {mem_clock},{graphics_clock}",
-        ]
+        if self.workload == "compute-latency":
+            clock = self.get_latency_clock()
+            settings = [("locked_gpu_clocks", clock, clock) if lock_gpu else ("application_clocks", mem_clock, clock)]
+        else:
+            settings = [("application_clocks", mem_clock, graphics_clock)]
+        if self.workload != "graphics" and lock_memory:
+            settings.append(("locked_memory_clocks", mem_clock, mem_clock))
+        return settings
+
+    def get_reset_settings(self) -> List[Tuple]:
+        return [(self.RESETS[setting[0]],) for setting in self.get_clock_settings()]
+
+    def get_all_reset_settings(self) -> List[Tuple]:
+        lock_gpu, lock_memory = self.get_clock_lock_support()
+        settings = [("reset_application_clocks",)]
+        if lock_gpu:
+            settings.append(("reset_gpu_clocks",))
+        if lock_memory:
+            settings.append(("reset_memory_clocks",))
+        return settings
+
+    def get_settings(self, previous_workload: Optional[str] = None) -> List[Tuple]:
+        settings = self.get_power_settings()
+        if previous_workload and previous_workload != self.workload:
+            settings += NvidiaConfigurator(self.gpu_info, previous_workload).get_reset_settings()
+        return settings + self.get_clock_settings()
+
+    def get_nvidia_smi_commands(self) -> List[str]:
+        return [self.render(setting) for setting in self.get_power_settings()]
+
+    def get_power_limit_command(self, watts: int) -> str:
+        return self.render(("power_limit", watts))
+
+    def get_clock_commands(self) -> List[str]:
+        return [self.render(setting) for setting in self.get_clock_settings()]
+
+    def get_reset_commands(self) -> List[str]:
+        return [self.render(setting) for setting in self.get_reset_settings()]
 
-    def get_profile_exports(self) -> str:
+    def get_profile_exports(self, shader_cache_path: Optional[str] = None) -> str:
         exports = '''
 # NVIDIA Performance Optimizations
 export __GL_THREADED_OPTIMIZATIONS=1
@@ -424,10 +1109,190 @@ export VK_ICD_FILENAMES=/usr/share/vulkan/icd.d/nvidia_icd.json
 export __GL_YIELD="USLEEP"
 export __GL_MaxFramesAllowed=1
 '''
+        if shader_cache_path:
+            exports += (
+                f'export __GL_SHADER_DISK_CACHE_PATH="{shader_cache_path}"\n'
+                'mkdir -p -m 700 "$__GL_SHADER_DISK_CACHE_PATH" 2>/dev/null\n'
+                'if [ -d "$__GL_SHADER_DISK_CACHE_PATH" ] && [ ! -L "$__GL_SHADER_DISK_CACHE_PATH" ] '
+                '&& [ -O "$__GL_SHADER_DISK_CACHE_PATH" ]; then\n'
+                '    chmod 700 "$__GL_SHADER_DISK_CACHE_PATH"\n'
+                'else\n'
+                '    unset __GL_SHADER_DISK_CACHE_PATH\n'
+                'fi\n'
+            )
         return exports
 
 
+class GPUBackend(ABC):
+    name = ""
+    MAX_WORKERS = 8
+
+    def __init__(self):
+        self.seconds = 0.0
+        self._seconds_lock = threading.Lock()
+
+    def open(self) -> bool:
+        return True
+
+    def close(self) -> None:
+        pass
+
+    @abstractmethod
+    def describe(self, bus_id: str, setting: Tuple) -> str:
+        pass
+
+    @abstractmethod
+    def apply(self, bus_id: str, setting: Tuple) -> Tuple[bool, str]:
+        pass
+
+    def apply_groups(
+        self, groups: List[Tuple[str, List[Tuple]]], category: str = "gpu",
+        max_workers: int = MAX_WORKERS,
+    ) -> List[List[Tuple[str, bool]]]:
+        from concurrent.futures import ThreadPoolExecutor
+
+        def run_group(group: Tuple[str, List[Tuple]]) -> List[Tuple[str, bool]]:
+            bus_id, settings = group
+            results = []
+            for setting in settings:
+                label = self.describe(bus_id, setting)
+                start = time.perf_counter()
+                with TRACER.span(label, category) as span:
+                    success, output = self.apply(bus_id, tuple(setting))
+                    span["success"] = success
+                    span["output_bytes"] = len(output.encode())
+                    if not success:
+                        span["output"] = output[-2000:]
+                with self._seconds_lock:
+                    self.seconds += time.perf_counter() - start
+                results.append((label, success))
+            return results
+
+        if not groups:
+            return []
+        with ThreadPoolExecutor(max_workers=min(len(groups), max_workers)) as executor:
+            return list(executor.map(run_group, groups))
+
+
+class NvidiaSMIBackend(GPUBackend):
+    name = "nvidia-smi"
+    ARGUMENTS = {
+        "persistence": "-pm {}",
+        "power_limit": "-pl {}",
+        "application_clocks": "-ac {},{}",
+        "reset_application_clocks": "-rac",
+        "locked_gpu_clocks": "--lock-gpu-clocks={},{}",
+        "reset_gpu_clocks": "--reset-gpu-clocks",
+        "locked_memory_clocks": "--lock-memory-clocks={},{}",
+        "reset_memory_clocks": "--reset-memory-clocks",
+    }
+
+    def __init__(self, run_command: Optional[Callable[[str], Tuple[bool, str]]] = None):
+        super().__init__()
+        self.run_command = run_command or SystemConfigurator.run_command
+
+    @staticmethod
+    def command(bus_id: str, setting: Tuple) -> str:
+        arguments = NvidiaSMIBackend.ARGUMENTS[setting[0]].format(*setting[1:])
+        return f"nvidia-smi -i {bus_id} {arguments}" if bus_id else f"nvidia-smi {arguments}"
+
+    def describe(self, bus_id: str, setting: Tuple) -> str:
+        return self.command(bus_id, setting)
+
+    def apply(self, bus_id: str, setting: Tuple) -> Tuple[bool, str]:
+        return self.run_command(self.command(bus_id, setting))
+
+
+class NVMLBackend(GPUBackend):
+    name = "nvml"
+    LIBRARY = "libnvidia-ml.so.1"
+    SUCCESS = 0
+    CALLS = {
+        "persistence": ("nvmlDeviceSetPersistenceMode", lambda enabled: (enabled,)),
+        "power_limit": ("nvmlDeviceSetPowerManagementLimit", lambda watts: (int(watts) * 1000,)),
+        "application_clocks": ("nvmlDeviceSetApplicationsClocks", lambda mem, graphics: (mem, graphics)),
+        "reset_application_clocks": ("nvmlDeviceResetApplicationsClocks", lambda: ()),
+        "locked_gpu_clocks": ("nvmlDeviceSetGpuLockedClocks", lambda low, high: (low, high)),
+        "reset_gpu_clocks": ("nvmlDeviceResetGpuLockedClocks", lambda: ()),
+        "locked_memory_clocks": ("nvmlDeviceSetMemoryLockedClocks", lambda low, high: (low, high)),
+        "reset_memory_clocks": ("nvmlDeviceResetMemoryLockedClocks", lambda: ()),
+    }
+
+    def __init__(self, library=None):
+        super().__init__()
+        self.library = library
+        self.handles: Dict[str, "ctypes.c_void_p"] = {}
+        self.initialized = False
+        self._lock = threading.Lock()
+
+    def open(self) -> bool:
+        import ctypes
+
+        if self.library is None:
+            try:
+                self.library = ctypes.CDLL(self.LIBRARY)
+                self.library.nvmlErrorString.restype = ctypes.c_char_p
+            except (OSError, AttributeError):
+                return False
+        try:
+            self.initialized = self.library.nvmlInit_v2() == self.SUCCESS
+        except AttributeError:
+            self.initialized = False
+        return self.initialized
+
+    def close(self) -> None:
+        if self.initialized:
+            self.library.nvmlShutdown()
+            self.initialized = False
+            self.handles.clear()
+
+    def error(self, code: int) -> str:
+        message = self.library.nvmlErrorString(code)
+        return message.decode() if isinstance(message, bytes) else str(message)
+
+    def handle(self, bus_id: str) -> Tuple[Optional["ctypes.c_void_p"], str]:
+        import ctypes
+
+        with self._lock:
+            if bus_id not in self.handles:
+                handle = ctypes.c_void_p()
+                code = self.library.nvmlDeviceGetHandleByPciBusId_v2(bus_id.encode(), ctypes.byref(handle))
+                if code != self.SUCCESS:
+                    return None, f"{bus_id}: {self.error(code)}"
+                self.handles[bus_id] = handle
+            return self.handles[bus_id], ""
+
+    def describe(self, bus_id: str, setting: Tuple) -> str:
+        values = ",".join(str(value) for value in setting[1:])
+        return f"NVML {bus_id} {setting[0]}" + (f"={values}" if values else "")
+
+    def apply(self, bus_id: str, setting: Tuple) -> Tuple[bool, str]:
+        handle, error = self.handle(bus_id)
+        if handle is None:
+            return False, error
+        function, arguments = self.CALLS[setting[0]]
+        code = getattr(self.library, function)(handle, *arguments(*setting[1:]))
+        if code != self.SUCCESS:
+            return False, f"{function}: {self.error(code)}"
+        return True, ""
+
+
+def select_backend(
+    choice: str = "auto", run_command: Optional[Callable[[str], Tuple[bool, str]]] = None,
+) -> Optional[GPUBackend]:
+    if choice in ("auto", "nvml") and (choice == "nvml" or os.geteuid() == 0):
+        backend = NVMLBackend()
+        if backend.open():
+            return backend
+        if choice == "nvml":
+            return None
+    return NvidiaSMIBackend(run_command)
+
+
 class SystemConfigurator:
+    XORG_CONFIG_PATH = Path("/etc/X11/xorg.conf.d/20-nvidia.conf")
+    PROFILE_MARKER = "# NVIDIA Performance Optimizations"
+
     @staticmethod
     def run_command(cmd: str, sudo: bool = True) -> Tuple[bool, str]:
         if sudo and os.geteuid() != 0:
@@ -441,16 +1306,18 @@ class SystemConfigurator:
                 text=True,
                 timeout=300
             )
+            TRACER.annotate(exit_code=result.returncode)
             return result.returncode == 0, result.stdout + result.stderr
         except subprocess.TimeoutExpired:
+            TRACER.annotate(exit_code=None, timed_out=True)
             return False, "Command timed out"
         except Exception as e:
             return False, str(e)
 
     @staticmethod
     def write_xorg_config(content: str) -> bool:
-        xorg_dir = Path("/etc/X11/xorg.conf.d")
-        xorg_file = xorg_dir / "20-nvidia.conf"
+        xorg_file = SystemConfigurator.xorg_config_path()
+        xorg_dir = xorg_file.parent
 
         try:
             if os.geteuid() != 0:
@@ -466,8 +1333,8 @@ class SystemConfigurator:
 
     @staticmethod
     def update_profile(exports: str) -> bool:
-        profile_path = Path.home() / ".profile"
-        marker = "# NVIDIA Performance Optimizations"
+        profile_path = SystemConfigurator.profile_path()
+        marker = SystemConfigurator.PROFILE_MARKER
 
         try:
             existing_content = ""
@@ -484,14 +1351,12 @@ class SystemConfigurator:
             return False
 
     @staticmethod
-    def set_cpu_governor(family: str) -> bool:
-        if family in ["arch", "manjaro"]:
-            cmd = "cpupower frequency-set -g performance"
-        else:
-            cmd = "cpufreq-set -g performance"
+    def xorg_config_path() -> Path:
+        return get_root() / SystemConfigurator.XORG_CONFIG_PATH.relative_to("/")
 
-        success, _ = SystemConfigurator.run_command(cmd)
-        return success
+    @staticmethod
+    def profile_path() -> Path:
+        return Path.home() / ".profile"
 
     @staticmethod
     def ask_restart() -> bool:
@@ -509,93 +1374,2762 @@ class SystemConfigurator:
             print("Please enter 'yes' or 'no'")
 
 
-def print_banner():
-    banner = """
-╔═══════════════════════════════════════════════════════════════╗
-║           NVIDIA Stability for All Linux                      ║
-║           GPU Configuration & Optimization Tool               ║
-╚═══════════════════════════════════════════════════════════════╝
-"""
-    print(banner)
+async def run_process(
+    argv: List[str],
+    timeout: Optional[float],
+    stdin: Optional[bytes] = None,
+    env: Optional[Dict[str, str]] = None,
+    on_output: Optional[Callable[[str], None]] = None,
+) -> Tuple[Optional[int], str]:
+    import asyncio
 
+    try:
+        process = await asyncio.create_subprocess_exec(
+            *argv,
+            stdin=asyncio.subprocess.PIPE if stdin is not None else asyncio.subprocess.DEVNULL,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.STDOUT,
+            env=env,
+            start_new_session=True,
+        )
+    except OSError as e:
+        return None, str(e)
 
-def print_status(message: str, success: bool = True):
-    status = "✓" if success else "✗"
-    color = "\033[92m" if success else "\033[91m"
-    reset = "\033[0m"
-    print(f"{color}[{status}]{reset} {message}")
+    chunks: List[str] = []
 
+    async def feed():
+        try:
+            process.stdin.write(stdin)
+            await process.stdin.drain()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        finally:
+            process.stdin.close()
 
-def main():
-    print_banner()
+    async def stream() -> int:
+        async for line in process.stdout:
+            text = line.decode(errors="replace")
+            chunks.append(text)
+            if on_output:
+                on_output(text)
+        return await process.wait()
 
-    if os.geteuid() != 0:
-        print("Warning: Running without root privileges. Some operations may require sudo.")
-        print()
+    async def communicate() -> int:
+        if stdin is None:
+            return await stream()
+        return (await asyncio.gather(stream(), feed()))[0]
+
+    try:
+        exit_code = await asyncio.wait_for(communicate(), timeout)
+    except asyncio.TimeoutError:
+        await kill_process_group(process)
+        return None, "".join(chunks) + "Command timed out"
+    except asyncio.CancelledError:
+        await kill_process_group(process)
+        raise
+    return exit_code, "".join(chunks)
+
+
+async def kill_process_group(process: "asyncio.subprocess.Process") -> None:
+    try:
+        os.killpg(process.pid, signal.SIGKILL)
+    except (ProcessLookupError, PermissionError):
+        pass
+    await process.wait()
+
+
+def apply_cpufreq(governor: str, epp: Optional[str], cpus: str = "") -> Dict:
+    controller = CPUFreqController()
+    outcome = controller.apply(governor, epp, cpus)
+    if outcome["previous"]:
+        CPUFreqController.save_rollback(outcome["previous"])
+    return outcome
+
+
+def pin_gpu_irqs(bus_id: str, cpus: str, gpu_count: int = 1) -> Dict:
+    outcome = TopologyTuner().pin(bus_id, cpus, gpu_count)
+    if outcome["previous"]:
+        merge_rollback(TopologyTuner.rollback_path(), outcome["previous"])
+    return outcome
+
+
+def irq_label(settings: Dict) -> str:
+    return f"Interrupts of {settings['gpu']} on CPUs {settings['cpus']}"
+
+
+def governor_label(settings: Dict) -> str:
+    epp = f", EPP {settings['epp']}" if settings.get("epp") else ""
+    return f"CPU governor {settings['governor']}{epp} on {settings.get('cpus') or 'all'} CPUs"
+
+
+class CPUFreqController:
+    ATTRIBUTES = {"governor": "scaling_governor", "epp": "energy_performance_preference"}
+    ROLLBACK_FILE = "cpufreq-rollback.json"
+
+    def __init__(self, sysfs_root: Optional[str] = None):
+        self.cpu_dir = Path(sysfs_root or get_root() / "sys") / "devices" / "system" / "cpu"
+
+    @staticmethod
+    def parse_cpu_list(text: str) -> List[int]:
+        cpus: Set[int] = set()
+        for part in text.split(","):
+            part = part.strip()
+            if not part:
+                continue
+            start, _, end = part.partition("-")
+            cpus.update(range(int(start), int(end or start) + 1))
+        return sorted(cpus)
+
+    @staticmethod
+    def format_cpu_list(cpus) -> str:
+        ranges: List[List[int]] = []
+        for cpu in sorted(set(cpus)):
+            if ranges and cpu == ranges[-1][1] + 1:
+                ranges[-1][1] = cpu
+            else:
+                ranges.append([cpu, cpu])
+        return ",".join(str(start) if start == end else f"{start}-{end}" for start, end in ranges)
+
+    def online_cpus(self) -> List[int]:
+        try:
+            names = os.listdir(self.cpu_dir)
+        except OSError:
+            return []
+        return sorted(
+            int(name[3:]) for name in names
+            if name[:3] == "cpu" and name[3:].isdigit()
+            and os.path.isfile(os.path.join(self.cpu_dir, name, "cpufreq", "scaling_governor"))
+        )
+
+    def select(self, cpus: str = "") -> List[int]:
+        online = self.online_cpus()
+        if not cpus:
+            return online
+        wanted = set(self.parse_cpu_list(cpus))
+        return [cpu for cpu in online if cpu in wanted]
+
+    def path(self, cpu: int, attribute: str) -> Path:
+        return self.cpu_dir / f"cpu{cpu}" / "cpufreq" / self.ATTRIBUTES[attribute]
+
+    def read(self, cpus: List[int]) -> Dict[int, Dict[str, str]]:
+        values = {}
+        for cpu in cpus:
+            entry = {}
+            for attribute in self.ATTRIBUTES:
+                try:
+                    entry[attribute] = self.path(cpu, attribute).read_text().strip()
+                except OSError:
+                    continue
+            values[cpu] = entry
+        return values
+
+    def is_applied(self, governor: Optional[str], epp: Optional[str], cpus: str = "") -> bool:
+        selected = self.select(cpus)
+        desired = {"governor": governor, "epp": epp}
+        return bool(selected) and all(
+            value == desired[attribute]
+            for entry in self.read(selected).values()
+            for attribute, value in entry.items()
+            if desired[attribute]
+        )
+
+    def apply(self, governor: Optional[str], epp: Optional[str], cpus: str = "") -> Dict:
+        selected = self.select(cpus)
+        outcome: Dict = {"success": False, "cpus": len(selected), "changed": 0, "failed": [], "previous": {}}
+        if not selected:
+            outcome["error"] = f"no cpufreq interface under {self.cpu_dir}"
+            return outcome
+
+        previous = self.read(selected)
+        outcome["previous"] = previous
+        for attribute, value in (("governor", governor), ("epp", epp)):
+            if not value:
+                continue
+            paths = [
+                self.path(cpu, attribute) for cpu in selected
+                if attribute in previous[cpu] and previous[cpu][attribute] != value
+            ]
+            failed = write_kernel_values(value, paths)
+            outcome["changed"] += len(paths) - len(failed)
+            outcome["failed"].extend(str(path) for path in failed)
+
+        outcome["success"] = not outcome["failed"]
+        return outcome
+
+    @staticmethod
+    def rollback_path() -> Path:
+        return get_state_dir() / CPUFreqController.ROLLBACK_FILE
+
+    @staticmethod
+    def save_rollback(previous: Dict[int, Dict[str, str]]) -> bool:
+        return merge_rollback(CPUFreqController.rollback_path(), previous)
+
+    def rollback(self) -> Optional[Dict]:
+        path = self.rollback_path()
+        try:
+            with open(path, "r") as f:
+                saved = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        outcome: Dict = {"cpus": len(saved), "changed": 0, "failed": []}
+        for attribute in self.ATTRIBUTES:
+            groups: Dict[str, List[Path]] = {}
+            for cpu, values in saved.items():
+                if attribute in values:
+                    groups.setdefault(values[attribute], []).append(self.path(int(cpu), attribute))
+            for value, paths in groups.items():
+                failed = write_kernel_values(value, paths)
+                outcome["changed"] += len(paths) - len(failed)
+                outcome["failed"].extend(str(path) for path in failed)
+
+        outcome["success"] = not outcome["failed"]
+        if outcome["success"]:
+            path.unlink(missing_ok=True)
+        return outcome
+
+
+class TopologyTuner:
+    ROLLBACK_FILE = "irq-rollback.json"
+
+    def __init__(self, sysfs_root: Optional[str] = None, proc_root: Optional[str] = None):
+        self.sysfs_root = Path(sysfs_root or get_root() / "sys")
+        self.proc_root = Path(proc_root or get_root() / "proc")
+
+    def device_dir(self, bus_id: str) -> Path:
+        return self.sysfs_root / "bus" / "pci" / "devices" / bus_id
+
+    def _read(self, path: Path) -> Optional[str]:
+        try:
+            return path.read_text().strip()
+        except OSError:
+            return None
+
+    def nvidia_irqs(self) -> Dict[int, str]:
+        irqs = {}
+        try:
+            with open(self.proc_root / "interrupts", "r") as f:
+                for line in f:
+                    number, _, rest = line.partition(":")
+                    if number.strip().isdigit() and "nvidia" in rest:
+                        irqs[int(number)] = rest.split()[-1]
+        except OSError:
+            pass
+        return irqs
+
+    def device_irqs(self, bus_id: str) -> Set[int]:
+        irqs = set()
+        try:
+            irqs.update(int(name) for name in os.listdir(self.device_dir(bus_id) / "msi_irqs") if name.isdigit())
+        except OSError:
+            pass
+        legacy = self._read(self.device_dir(bus_id) / "irq")
+        if legacy and legacy.isdigit() and legacy != "0":
+            irqs.add(int(legacy))
+        return irqs
+
+    def gpu_irqs(self, bus_id: str, gpu_count: int = 1) -> List[int]:
+        nvidia = self.nvidia_irqs()
+        irqs = self.device_irqs(bus_id) & set(nvidia)
+        if not irqs and gpu_count == 1:
+            irqs = set(nvidia)
+        return sorted(irqs)
+
+    def irq_affinity_path(self, irq: int) -> Path:
+        return self.proc_root / "irq" / str(irq) / "smp_affinity_list"
+
+    def irq_affinity(self, irq: int) -> Optional[str]:
+        return self._read(self.irq_affinity_path(irq))
+
+    def gpu_topology(self, gpus: List[Dict]) -> List[Dict]:
+        topology = []
+        for gpu_info in gpus:
+            bus_id = gpu_info.get("bus_id", "")
+            numa_node = self._read(self.device_dir(bus_id) / "numa_node")
+            local_cpus = self._read(self.device_dir(bus_id) / "local_cpulist") or ""
+            local = set(CPUFreqController.parse_cpu_list(local_cpus))
+            irqs = []
+            for irq in self.gpu_irqs(bus_id, len(gpus)):
+                affinity = self.irq_affinity(irq) or ""
+                irqs.append({
+                    "irq": irq,
+                    "affinity": affinity,
+                    "local": bool(local) and set(CPUFreqController.parse_cpu_list(affinity)) <= local,
+                })
+            topology.append({
+                "bus_id": bus_id,
+                "name": gpu_info.get("name", ""),
+                "numa_node": int(numa_node) if numa_node and numa_node.lstrip("-").isdigit() else None,
+                "local_cpus": local_cpus,
+                "irqs": irqs,
+            })
+        return topology
+
+    def local_cpus(self, gpus: List[Dict]) -> str:
+        cpus: Set[int] = set()
+        for entry in self.gpu_topology(gpus):
+            cpus.update(CPUFreqController.parse_cpu_list(entry["local_cpus"]))
+        return CPUFreqController.format_cpu_list(cpus)
+
+    def is_pinned(self, bus_id: str, cpus: str, gpu_count: int = 1) -> bool:
+        wanted = CPUFreqController.parse_cpu_list(cpus)
+        irqs = self.gpu_irqs(bus_id, gpu_count)
+        return bool(irqs) and all(
+            CPUFreqController.parse_cpu_list(self.irq_affinity(irq) or "") == wanted for irq in irqs
+        )
+
+    def pin(self, bus_id: str, cpus: str, gpu_count: int = 1) -> Dict:
+        irqs = self.gpu_irqs(bus_id, gpu_count)
+        outcome: Dict = {"success": False, "irqs": irqs, "changed": 0, "failed": [], "previous": {}}
+        if not irqs:
+            outcome["error"] = f"no nvidia interrupts found for {bus_id}"
+            return outcome
+
+        wanted = CPUFreqController.parse_cpu_list(cpus)
+        previous = {irq: self.irq_affinity(irq) or "" for irq in irqs}
+        paths = [
+            self.irq_affinity_path(irq) for irq, affinity in previous.items()
+            if CPUFreqController.parse_cpu_list(affinity) != wanted
+        ]
+        failed = write_kernel_values(cpus, paths)
+        outcome.update(
+            success=not failed, changed=len(paths) - len(failed), failed=[str(path) for path in failed],
+            previous=previous,
+        )
+        return outcome
+
+    @staticmethod
+    def rollback_path() -> Path:
+        return get_state_dir() / TopologyTuner.ROLLBACK_FILE
+
+    def rollback(self) -> Optional[Dict]:
+        path = self.rollback_path()
+        try:
+            with open(path, "r") as f:
+                saved = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        groups: Dict[str, List[Path]] = {}
+        for irq, affinity in saved.items():
+            if affinity:
+                groups.setdefault(affinity, []).append(self.irq_affinity_path(int(irq)))
+        outcome: Dict = {"irqs": len(saved), "changed": 0, "failed": []}
+        for affinity, paths in groups.items():
+            failed = write_kernel_values(affinity, paths)
+            outcome["changed"] += len(paths) - len(failed)
+            outcome["failed"].extend(str(path) for path in failed)
+
+        outcome["success"] = not outcome["failed"]
+        if outcome["success"]:
+            path.unlink(missing_ok=True)
+        return outcome
+
+
+def write_kernel_values(value: str, paths: List[Path]) -> List[Path]:
+    if not paths:
+        return []
+    if os.geteuid() != 0:
+        targets = " ".join(shlex.quote(str(path)) for path in paths)
+        success, _ = SystemConfigurator.run_command(
+            f"printf %s {shlex.quote(value)} | sudo tee {targets} > /dev/null", sudo=False,
+        )
+        return [] if success else paths
+
+    failed = []
+    for path in paths:
+        try:
+            with open(path, "w") as f:
+                f.write(value)
+        except OSError:
+            failed.append(path)
+    return failed
+
+
+ROLLBACK_LOCK = threading.Lock()
+
+
+def merge_rollback(path: Path, previous: Dict) -> bool:
+    with ROLLBACK_LOCK:
+        try:
+            with open(path, "r") as f:
+                saved = json.load(f)
+        except (OSError, ValueError):
+            saved = {}
+        for key, values in previous.items():
+            saved.setdefault(str(key), values)
+
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_suffix(".tmp")
+            with open(tmp_path, "w") as f:
+                json.dump(saved, f, indent=2, sort_keys=True)
+            os.replace(tmp_path, path)
+            return True
+        except OSError:
+            return False
+
+
+class ShaderCacheManager:
+    NETWORK_FILESYSTEMS = {"nfs", "nfs4", "cifs", "smb3", "smbfs", "ceph", "glusterfs", "lustre", "fuse.sshfs", "9p"}
+    LOCATIONS = {
+        "local": "/var/tmp/nvidia-shader-cache-$USER",
+        "tmpfs": "$XDG_RUNTIME_DIR/nvidia-shader-cache",
+    }
+    USER_CACHE_GLOBS = (("var/tmp", "nvidia-shader-cache-*"), ("run/user", "*/nvidia-shader-cache"))
+    CACHE_CONTAINERS = {"GLCache", "ComputeCache", "DXCache"}
+    SIZE_UNITS = {"": 1, "K": 1024, "M": 1024 ** 2, "G": 1024 ** 3, "T": 1024 ** 4}
+
+    def __init__(self, cache_dir: Optional[str] = None):
+        self.cache_dir = Path(cache_dir or self.default_dir())
+
+    @staticmethod
+    def default_dir() -> Path:
+        configured = os.environ.get("__GL_SHADER_DISK_CACHE_PATH")
+        if configured:
+            return Path(configured)
+        return Path(os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache") / "nvidia"
+
+    @staticmethod
+    def parse_size(text: str) -> int:
+        text = text.strip().upper().rstrip("IB")
+        unit = text[-1] if text and text[-1] in ShaderCacheManager.SIZE_UNITS else ""
+        try:
+            size = float(text[:len(text) - len(unit)])
+        except ValueError:
+            raise argparse.ArgumentTypeError(f"invalid size {text!r}, expected e.g. 512M or 2G") from None
+        if size < 0:
+            raise argparse.ArgumentTypeError(f"invalid size {text!r}, must not be negative")
+        return int(size * ShaderCacheManager.SIZE_UNITS[unit])
+
+    @staticmethod
+    def format_size(size: int) -> str:
+        for unit in ("B", "KiB", "MiB", "GiB"):
+            if size < 1024:
+                return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+            size /= 1024
+        return f"{size:.1f} TiB"
+
+    @staticmethod
+    def filesystem_type(path: str, mounts: Optional[str] = None) -> Optional[str]:
+        best, fstype = "", None
+        try:
+            with open(mounts or get_root() / "proc" / "mounts", "r") as f:
+                for line in f:
+                    fields = line.split()
+                    if len(fields) < 3:
+                        continue
+                    mount_point = fields[1].replace("\\040", " ")
+                    inside = path == mount_point or path.startswith(mount_point.rstrip("/") + "/")
+                    if inside and len(mount_point) >= len(best):
+                        best, fstype = mount_point, fields[2]
+        except OSError:
+            pass
+        return fstype
+
+    @staticmethod
+    def placement(choice: Optional[str], home: Optional[str] = None) -> Optional[str]:
+        if not choice:
+            return None
+        if choice == "auto":
+            fstype = ShaderCacheManager.filesystem_type(str(home or Path.home()))
+            return ShaderCacheManager.LOCATIONS["local"] if fstype in ShaderCacheManager.NETWORK_FILESYSTEMS else None
+        return ShaderCacheManager.LOCATIONS.get(choice, choice)
+
+    def scan(self) -> List[Dict]:
+        entries: Dict[str, Dict] = {}
+        stack: List[Tuple[str, List[str]]] = [(str(self.cache_dir), [])]
+        while stack:
+            directory, parts = stack.pop()
+            try:
+                with os.scandir(directory) as it:
+                    for entry in it:
+                        entry_parts = parts + [entry.name]
+                        if entry.is_dir(follow_symlinks=False):
+                            stack.append((entry.path, entry_parts))
+                            continue
+                        try:
+                            st = entry.stat(follow_symlinks=False)
+                        except OSError:
+                            continue
+                        depth = 2 if entry_parts[0] in self.CACHE_CONTAINERS and len(entry_parts) > 1 else 1
+                        key = os.path.join(str(self.cache_dir), *entry_parts[:depth])
+                        group = entries.setdefault(key, {"path": key, "files": 0, "bytes": 0, "last_used": 0.0})
+                        group["files"] += 1
+                        group["bytes"] += st.st_size
+                        group["last_used"] = max(group["last_used"], st.st_atime, st.st_mtime)
+            except OSError:
+                continue
+        return list(entries.values())
+
+    def usage(self) -> Dict:
+        entries = self.scan()
+        return {
+            "path": str(self.cache_dir),
+            "entries": len(entries),
+            "files": sum(entry["files"] for entry in entries),
+            "bytes": sum(entry["bytes"] for entry in entries),
+            "last_used": max((entry["last_used"] for entry in entries), default=None),
+        }
+
+    def evict(self, budget: int, dry_run: bool = False) -> Dict:
+        entries = sorted(self.scan(), key=lambda entry: entry["last_used"])
+        total = sum(entry["bytes"] for entry in entries)
+        outcome: Dict = {"path": str(self.cache_dir), "bytes": total, "removed": [], "freed": 0, "failed": []}
+
+        for entry in entries:
+            if total - outcome["freed"] <= budget:
+                break
+            if not dry_run:
+                try:
+                    if os.path.isdir(entry["path"]):
+                        shutil.rmtree(entry["path"])
+                    else:
+                        os.unlink(entry["path"])
+                except OSError:
+                    outcome["failed"].append(entry["path"])
+                    continue
+            outcome["removed"].append(entry["path"])
+            outcome["freed"] += entry["bytes"]
+
+        outcome["remaining"] = total - outcome["freed"]
+        return outcome
+
+    @staticmethod
+    def cache_owner(cache_dir: Path) -> str:
+        if cache_dir.name.startswith("nvidia-shader-cache-"):
+            return cache_dir.name[len("nvidia-shader-cache-"):]
+        import pwd
+
+        try:
+            return pwd.getpwuid(int(cache_dir.parent.name)).pw_name
+        except (KeyError, ValueError):
+            return cache_dir.parent.name
+
+    @staticmethod
+    def user_caches(root: Optional[str] = None) -> List[Dict]:
+        root = Path(root or get_root())
+        caches = []
+        try:
+            homes = sorted(path for path in (root / "home").iterdir() if path.is_dir())
+        except OSError:
+            homes = []
+        for home in homes:
+            for cache_dir in (home / ".cache" / "nvidia", home / ".nv" / "GLCache"):
+                if cache_dir.is_dir():
+                    caches.append({"user": home.name, "path": str(cache_dir)})
+
+        for parent, pattern in ShaderCacheManager.USER_CACHE_GLOBS:
+            try:
+                candidates = sorted((root / parent).glob(pattern))
+            except OSError:
+                candidates = []
+            for cache_dir in candidates:
+                if cache_dir.is_dir() and not cache_dir.is_symlink():
+                    caches.append({"user": ShaderCacheManager.cache_owner(cache_dir), "path": str(cache_dir)})
+
+        for cache in caches:
+            cache.update(ShaderCacheManager(cache["path"]).usage())
+            cache["filesystem"] = ShaderCacheManager.filesystem_type(cache["path"])
+        return caches
+
+
+def get_cache_dir() -> Path:
+    override = os.environ.get("NVIDIA_STABILITY_CACHE_DIR")
+    if override:
+        return Path(override)
+    if os.geteuid() == 0:
+        return Path("/var/cache/nvidia-stability")
+    return Path.home() / ".cache" / "nvidia-stability"
+
+
+def get_root() -> Path:
+    return Path(os.environ.get("NVIDIA_STABILITY_ROOT") or "/")
+
+
+def get_state_dir() -> Path:
+    override = os.environ.get("NVIDIA_STABILITY_STATE_DIR")
+    if override:
+        return Path(override)
+    if os.geteuid() == 0:
+        return Path("/var/lib/nvidia-stability")
+    return Path.home() / ".local" / "state" / "nvidia-stability"
+
+
+def get_process_uptime() -> Optional[float]:
+    try:
+        with open("/proc/self/stat", "r") as f:
+            start_ticks = int(f.read().rsplit(")", 1)[1].split()[19])
+        with open("/proc/uptime", "r") as f:
+            uptime = float(f.read().split()[0])
+        return uptime - start_ticks / os.sysconf("SC_CLK_TCK")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def get_boot_id() -> str:
+    try:
+        with open("/proc/sys/kernel/random/boot_id", "r") as f:
+            return f.read().strip()
+    except OSError:
+        return ""
+
+
+class Planner:
+    RUNTIME_KINDS = {"gpu"}
+    DEFAULT_CPUFREQ = {"governor": "performance", "epp": "performance", "cpus": ""}
+
+    @staticmethod
+    def fingerprint(distro: Dict, gpus: List[Dict]) -> str:
+        inputs = {
+            "distro_id": distro["id"],
+            "distro_version": distro["version"],
+            "gpus": [[gpu.get("bus_id", ""), gpu.get("device_id", ""), gpu["name"]] for gpu in gpus],
+            "kernel": platform.release(),
+            "tool_version": __version__,
+        }
+        encoded = json.dumps(inputs, sort_keys=True).encode()
+        return hashlib.sha256(encoded).hexdigest()[:16]
+
+    @staticmethod
+    def build(
+        distro: Dict, gpus: List[Dict], cpufreq: Optional[Dict] = None, irq_affinity: bool = False,
+        shader_cache: Optional[str] = None, workload: str = "graphics", prefetch: bool = True,
+        offline: Optional[str] = None, previous_workload: Optional[str] = None,
+    ) -> Dict:
+        package_plan = PackageManager(distro["family"], distro["id"], distro["version"]).get_plan()
+        package_plan["prefetch"] = prefetch
+        if offline:
+            bundle = OfflineBundle(Path(offline).resolve())
+            key = OfflineBundle.target_key(distro)
+            if not OfflineBundle.supported(package_plan["manager"]):
+                raise ValueError(f"Offline installs are not supported on {distro['name']}")
+            entry = bundle.target(key)
+            if entry is None:
+                raise ValueError(f"{bundle.path} has no packages for {key}; run 'bundle' on a {key} host first")
+            if entry.get("kernel") != platform.release():
+                raise ValueError(
+                    f"{bundle.path} holds kernel headers for {entry.get('kernel')}, but this host runs "
+                    f"{platform.release()}; run 'bundle' on a {key} host with this kernel"
+                )
+            package_plan.update(offline=str(bundle.path), bundle_target=key)
+        configurator = NvidiaConfigurator(gpus[0])
+        cpufreq = dict(Planner.DEFAULT_CPUFREQ, **(cpufreq or {}))
+        topology = TopologyTuner().gpu_topology(gpus) if irq_affinity or cpufreq["cpus"] == "local" else []
+        if cpufreq["cpus"] == "local":
+            local = set()
+            for entry in topology:
+                local.update(CPUFreqController.parse_cpu_list(entry["local_cpus"]))
+            cpufreq["cpus"] = CPUFreqController.format_cpu_list(local)
+
+        steps = Planner.package_steps(package_plan)
+        for gpu_info in gpus:
+            gpu_configurator = NvidiaConfigurator(gpu_info, workload)
+            for setting in gpu_configurator.get_settings(previous_workload):
+                step = Planner._command_step("gpu", gpu_configurator.render(setting))
+                step["gpu"] = gpu_info.get("bus_id", "")
+                step["setting"] = list(setting)
+                steps.append(step)
+        if irq_affinity:
+            steps.extend(
+                Planner.irq_step(entry["bus_id"], entry["local_cpus"], len(gpus))
+                for entry in topology if entry["local_cpus"]
+            )
+        steps.append({
+            "id": f"xorg:{SystemConfigurator.xorg_config_path()}",
+            "kind": "xorg",
+            "path": str(SystemConfigurator.xorg_config_path()),
+            "content": configurator.create_xorg_config(),
+        })
+        steps.append({
+            "id": f"profile:{SystemConfigurator.profile_path()}",
+            "kind": "profile",
+            "path": str(SystemConfigurator.profile_path()),
+            "content": configurator.get_profile_exports(ShaderCacheManager.placement(shader_cache)),
+        })
+        steps.append(Planner.governor_step(cpufreq["governor"], cpufreq["epp"], cpufreq["cpus"]))
+
+        return {
+            "version": 1,
+            "tool_version": __version__,
+            "fingerprint": Planner.fingerprint(distro, gpus),
+            "distro": distro,
+            "kernel": platform.release(),
+            "gpus": gpus,
+            "workload": workload,
+            "package_plan": package_plan,
+            "steps": steps,
+        }
+
+    @staticmethod
+    def _command_step(kind: str, command: str) -> Dict:
+        return {"id": f"{kind}:{command}", "kind": kind, "command": command}
+
+    @staticmethod
+    def package_steps(package_plan: Dict) -> List[Dict]:
+        if package_plan.get("offline"):
+            return Planner.offline_steps(package_plan)
+
+        steps = []
+        for phase, cmd in PackageManager.render_phases(package_plan):
+            step = Planner._command_step("package", cmd)
+            step["phase"] = phase
+            steps.append(step)
+        return steps
+
+    @staticmethod
+    def offline_steps(package_plan: Dict) -> List[Dict]:
+        if not package_plan["packages"] and not package_plan["alternatives"] and not package_plan["driver_tool"]:
+            return []
+
+        key = package_plan["bundle_target"]
+        entry = OfflineBundle(package_plan["offline"]).target(key) or {"artifacts": []}
+        stage_dir = get_cache_dir() / "offline" / key.replace("/", "_")
+        files = " ".join(shlex.quote(str(stage_dir / artifact["name"])) for artifact in entry["artifacts"])
+        install = Planner._command_step("package", PACKAGE_MANAGERS[package_plan["manager"]]["local_install"].format(
+            files=files,
+        ))
+        install["phase"] = "install"
+        return [
+            {
+                "id": f"package:verify:{package_plan['offline']}/{key}",
+                "kind": "package",
+                "phase": "verify",
+                "bundle": package_plan["offline"],
+                "target": key,
+                "stage": str(stage_dir),
+            },
+            install,
+        ]
+
+    @staticmethod
+    def irq_step(bus_id: str, cpus: str, gpu_count: int = 1) -> Dict:
+        return {"id": f"irq:{bus_id}/{cpus}", "kind": "irq", "gpu": bus_id, "cpus": cpus, "gpu_count": gpu_count}
+
+    @staticmethod
+    def governor_step(governor: str, epp: Optional[str], cpus: str = "") -> Dict:
+        return {
+            "id": f"governor:{governor}/{epp or '-'}/{cpus or 'all'}",
+            "kind": "governor",
+            "governor": governor,
+            "epp": epp,
+            "cpus": cpus,
+        }
+
+    @staticmethod
+    def pending_steps(plan: Dict, record: Optional[Dict]) -> List[Dict]:
+        package_steps = [step for step in plan["steps"] if step["kind"] == "package"]
+        other_steps = [step for step in plan["steps"] if step["kind"] != "package"]
+
+        pending = []
+        if not all(Planner.is_satisfied(step, record) for step in package_steps):
+            pending.extend(Planner.package_steps(PackageManager.pending_plan(plan["package_plan"])))
+
+        pending.extend(step for step in other_steps if not Planner.is_satisfied(step, record))
+        return pending
+
+    @staticmethod
+    def is_satisfied(step: Dict, record: Optional[Dict]) -> bool:
+        kind = step["kind"]
+
+        if kind == "xorg":
+            try:
+                return Path(step["path"]).read_text() == step["content"]
+            except OSError:
+                return False
+        if kind == "profile":
+            try:
+                return SystemConfigurator.PROFILE_MARKER in Path(step["path"]).read_text()
+            except OSError:
+                return False
+        if kind == "governor":
+            return CPUFreqController().is_applied(step["governor"], step["epp"], step["cpus"])
+        if kind == "irq":
+            return TopologyTuner().is_pinned(step["gpu"], step["cpus"], step["gpu_count"])
+
+        if record is None or step["id"] not in record.get("completed", []):
+            return False
+        if kind in Planner.RUNTIME_KINDS:
+            return record.get("boot_id") == get_boot_id()
+        return True
+
+
+class PlanCache:
+    def __init__(self, cache_dir: Optional[Path] = None):
+        self.cache_dir = (cache_dir or get_cache_dir()) / "plans"
+
+    def path(self, fingerprint: str) -> Path:
+        return self.cache_dir / f"{fingerprint}.json"
+
+    def load(self, fingerprint: str) -> Optional[Dict]:
+        try:
+            with open(self.path(fingerprint), "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def save(self, plan: Dict, record: Optional[Dict] = None) -> bool:
+        try:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.path(plan["fingerprint"]).with_suffix(".tmp")
+            with open(tmp_path, "w") as f:
+                json.dump({"plan": plan, "record": record}, f, indent=2)
+            os.replace(tmp_path, self.path(plan["fingerprint"]))
+            return True
+        except OSError:
+            return False
+
+
+class LaunchProfiles:
+    BUILTIN = {
+        "default": {
+            "description": "The block written to ~/.profile by apply",
+            "env": {
+                "__GL_THREADED_OPTIMIZATIONS": "1",
+                "__GL_SHADER_CACHE": "1",
+                "__GL_SHADER_CACHE_SIZE": "1000000000",
+                "VK_ICD_FILENAMES": "/usr/share/vulkan/icd.d/nvidia_icd.json",
+                "__GL_YIELD": "USLEEP",
+                "__GL_MaxFramesAllowed": "1",
+            },
+        },
+        "low-latency": {
+            "description": "Games and interactive apps: one queued frame, no threaded GL, no vsync",
+            "inherits": "default",
+            "env": {
+                "__GL_THREADED_OPTIMIZATIONS": "0",
+                "__GL_SYNC_TO_VBLANK": "0",
+                "__GL_GSYNC_ALLOWED": "1",
+                "__GL_VRR_ALLOWED": "1",
+            },
+        },
+        "throughput": {
+            "description": "Rendering and benchmarks: threaded GL, deeper frame queue, driver-default yielding",
+            "inherits": "default",
+            "env": {
+                "__GL_MaxFramesAllowed": "3",
+                "__GL_YIELD": None,
+                "__GL_SYNC_TO_VBLANK": "0",
+            },
+        },
+        "compute": {
+            "description": "CUDA and CUDA/GL interop: threaded GL off, large JIT cache, PCI device order",
+            "inherits": "default",
+            "env": {
+                "__GL_THREADED_OPTIMIZATIONS": "0",
+                "__GL_YIELD": None,
+                "__GL_MaxFramesAllowed": None,
+                "CUDA_DEVICE_ORDER": "PCI_BUS_ID",
+                "CUDA_CACHE_MAXSIZE": "4294967296",
+                "CUDA_MODULE_LOADING": "LAZY",
+            },
+        },
+    }
+
+    def __init__(self, path: Optional[Path] = None, cache_dir: Optional[Path] = None):
+        self.path = Path(path or self.user_path())
+        self.cache_path = (cache_dir or get_cache_dir()) / "profiles.json"
+
+    @staticmethod
+    def user_path() -> Path:
+        config_home = os.environ.get("XDG_CONFIG_HOME") or Path.home() / ".config"
+        return Path(config_home) / "nvidia-stability" / "profiles.json"
+
+    def source_key(self) -> str:
+        try:
+            st = os.stat(self.path)
+            user = f"{st.st_mtime_ns}:{st.st_size}"
+        except OSError:
+            user = "-"
+        return f"{__version__}:{self.path}:{user}"
+
+    def load(self) -> Dict[str, Dict]:
+        key = self.source_key()
+        try:
+            with open(self.cache_path, "r") as f:
+                cached = json.load(f)
+            if cached.get("key") == key:
+                return cached["profiles"]
+        except (OSError, ValueError, AttributeError):
+            pass
+
+        profiles = self.compile()
+        try:
+            self.cache_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.cache_path.with_suffix(".tmp")
+            with open(tmp_path, "w") as f:
+                json.dump({"key": key, "profiles": profiles}, f, indent=2)
+            os.replace(tmp_path, self.cache_path)
+        except OSError:
+            pass
+        return profiles
+
+    def compile(self) -> Dict[str, Dict]:
+        definitions = dict(self.BUILTIN)
+        try:
+            with open(self.path, "r") as f:
+                user = json.load(f)
+        except FileNotFoundError:
+            user = {}
+        if not isinstance(user, dict):
+            raise ValueError("expected a JSON object mapping profile names to definitions")
+        for name, definition in user.items():
+            self.validate(name, definition)
+        definitions.update(user)
+
+        resolved: Dict[str, Dict] = {}
+
+        def resolve(name: str, chain: Tuple[str, ...]) -> Dict:
+            if name in resolved:
+                return resolved[name]
+            if name in chain:
+                raise ValueError(f"profile inheritance cycle: {' -> '.join(chain + (name,))}")
+            if name not in definitions:
+                raise ValueError(f"unknown profile {name!r}")
+            definition = definitions[name]
+            parent = definition.get("inherits")
+            env = dict(resolve(parent, chain + (name,))["env"]) if parent else {}
+            env.update(definition.get("env", {}))
+            resolved[name] = {"description": definition.get("description", ""), "env": env}
+            return resolved[name]
+
+        for name in definitions:
+            resolve(name, ())
+        return resolved
+
+    @staticmethod
+    def validate(name: str, definition) -> None:
+        if not isinstance(definition, dict):
+            raise ValueError(f"profile {name!r} must be an object")
+        for key in ("description", "inherits"):
+            if key in definition and not isinstance(definition[key], str):
+                raise ValueError(f"profile {name!r}: {key} must be a string")
+        env = definition.get("env", {})
+        if not isinstance(env, dict):
+            raise ValueError(f"profile {name!r}: env must be an object")
+        for key, value in env.items():
+            if value is not None and not isinstance(value, (str, int, float)):
+                raise ValueError(f"profile {name!r}: env {key} must be a string, a number or null")
+
+    @staticmethod
+    def environment(profile: Dict, base: Dict[str, str]) -> Dict[str, str]:
+        env = dict(base)
+        for key, value in profile["env"].items():
+            if value is None:
+                env.pop(key, None)
+            else:
+                env[key] = str(value)
+        return env
+
+
+class PlanExecutor:
+    SECTIONS = {
+        "package": "Installing NVIDIA drivers and dependencies...",
+        "gpu": "Configuring power management and clocks...",
+        "irq": "Pinning GPU interrupts to NUMA-local CPUs...",
+        "xorg": "Creating Xorg configuration...",
+        "profile": "Updating user profile with optimizations...",
+        "governor": "Setting CPU governor to performance...",
+    }
+    STEP_TIMEOUT = 300
+
+    def __init__(
+        self,
+        run_command: Optional[Callable[[str], Tuple[bool, str]]] = None,
+        timeout: float = STEP_TIMEOUT,
+        on_output: Optional[Callable[[str, str], None]] = None,
+        gpu_backend: Optional[GPUBackend] = None,
+    ):
+        self.run_command = run_command
+        self.timeout = timeout
+        self.on_output = on_output
+        self.gpu_backend = gpu_backend
+        self.timings: Dict[str, Tuple[float, float]] = {}
+
+    def execute(self, plan: Dict, record: Optional[Dict]) -> Dict:
+        import asyncio
+
+        pending = Planner.pending_steps(plan, record)
+        pending_ids = {step["id"] for step in pending}
+        self.timings = {}
+        results = asyncio.run(self._execute_graph(plan, pending))
+
+        failed_packages = any(not results[step["id"]] for step in pending if step["kind"] == "package")
+        completed = []
+        for step in plan["steps"]:
+            if step["id"] in pending_ids:
+                if results.get(step["id"]):
+                    completed.append(step["id"])
+            elif step["kind"] != "package" or not failed_packages:
+                completed.append(step["id"])
+
+        return {
+            "fingerprint": plan["fingerprint"],
+            "boot_id": get_boot_id(),
+            "applied": all(results.values()),
+            "completed": completed,
+            "results": results,
+            "phases": self.phase_timings(pending, self.timings),
+            "prefetch_overlap_ms": self.overlap_ms(pending, self.timings, "prefetch"),
+        }
+
+    @staticmethod
+    def phase_timings(steps: List[Dict], timings: Dict[str, Tuple[float, float]]) -> Dict[str, float]:
+        phases: Dict[str, float] = {}
+        for step in steps:
+            if step["kind"] == "package" and step["id"] in timings:
+                start, end = timings[step["id"]]
+                phase = step.get("phase", "install")
+                phases[phase] = phases.get(phase, 0.0) + (end - start) * 1000
+        return phases
+
+    @staticmethod
+    def overlap_ms(steps: List[Dict], timings: Dict[str, Tuple[float, float]], phase: str) -> float:
+        windows = [timings[step["id"]] for step in steps if step.get("phase") == phase and step["id"] in timings]
+        others = [timings[step["id"]] for step in steps if step.get("phase") != phase and step["id"] in timings]
+        overlap = 0.0
+        for start, end in windows:
+            for other_start, other_end in others:
+                overlap += max(min(end, other_end) - max(start, other_start), 0.0)
+        return overlap * 1000
+
+    @staticmethod
+    def dependencies(steps: List[Dict]) -> Dict[str, List[str]]:
+        package_ids = [step["id"] for step in steps if step["kind"] == "package"]
+        deps: Dict[str, List[str]] = {}
+        tail: List[str] = []
+        fetching: List[str] = []
+        for step in steps:
+            if step["kind"] != "package":
+                continue
+            if step.get("phase") == "prefetch":
+                deps[step["id"]] = list(tail)
+                fetching.append(step["id"])
+                continue
+            if step.get("phase") == "build":
+                deps[step["id"]] = list(tail)
+            else:
+                deps[step["id"]] = tail + fetching
+                fetching = []
+            tail = [step["id"]]
+        last_per_gpu: Dict[str, str] = {}
+
+        for step in steps:
+            if step["kind"] == "package":
+                continue
+            after = package_ids[-1:] if step["kind"] in ("gpu", "irq") else []
+            if step["kind"] == "gpu":
+                gpu = step.get("gpu", "")
+                if gpu in last_per_gpu:
+                    after = [last_per_gpu[gpu]]
+                last_per_gpu[gpu] = step["id"]
+            deps[step["id"]] = after
+        return deps
+
+    async def _execute_graph(self, plan: Dict, pending: List[Dict]) -> Dict[str, bool]:
+        import asyncio
+
+        pending_ids = {step["id"] for step in pending}
+        deps = self.dependencies(pending)
+        tasks: Dict[str, "asyncio.Task"] = {}
+        for step in pending:
+            waits = [tasks[dep] for dep in deps[step["id"]]]
+            tasks[step["id"]] = asyncio.ensure_future(self._run_step(step, waits))
+
+        results: Dict[str, bool] = {}
+        try:
+            for kind, title in self.SECTIONS.items():
+                kind_steps = [step for step in pending if step["kind"] == kind]
+                skipped = [step for step in plan["steps"] if step["kind"] == kind and step["id"] not in pending_ids]
+                if not kind_steps and not skipped:
+                    continue
+
+                for step in kind_steps:
+                    results[step["id"]] = await tasks[step["id"]]
+
+                print(f"\n{title}")
+                if kind == "package":
+                    if not kind_steps:
+                        print_status("  NVIDIA drivers and dependencies already installed")
+                else:
+                    for step in skipped:
+                        print_status(f"  {self._label(step)} (already satisfied)")
+                for step in kind_steps:
+                    print_status(f"  {self._label(step)}", results[step["id"]])
+
+            phases = self.phase_timings(pending, self.timings)
+            if phases:
+                summary = ", ".join(f"{phase} {ms:.0f} ms" for phase, ms in phases.items())
+                overlap = self.overlap_ms(pending, self.timings, "prefetch")
+                if "prefetch" in phases:
+                    summary += f" (prefetch overlapped {overlap:.0f} ms of other steps)"
+                print(f"\nPackage phases: {summary}")
+        finally:
+            for task in tasks.values():
+                task.cancel()
+            await asyncio.gather(*tasks.values(), return_exceptions=True)
+        return results
+
+    async def _run_step(self, step: Dict, waits: List["asyncio.Task"]) -> bool:
+        import asyncio
+
+        if waits:
+            await asyncio.gather(*waits)
+
+        lane = f"gpu:{step.get('gpu', '')}" if step["kind"] == "gpu" else step["kind"]
+        start = time.perf_counter()
+        attrs: Dict = {"lane": lane}
+        if step["kind"] in ("xorg", "profile"):
+            writer = SystemConfigurator.write_xorg_config if step["kind"] == "xorg" else SystemConfigurator.update_profile
+            success = await asyncio.to_thread(writer, step["content"])
+            attrs["output_bytes"] = len(step["content"])
+        elif step["kind"] == "irq":
+            outcome = await asyncio.to_thread(pin_gpu_irqs, step["gpu"], step["cpus"], step["gpu_count"])
+            success = outcome["success"]
+            attrs.update(irqs=len(outcome["irqs"]), changed=outcome["changed"])
+            if not success:
+                attrs["output"] = outcome.get("error") or f"failed: {' '.join(outcome['failed'][:8])}"
+        elif step.get("phase") == "verify":
+            bundle = OfflineBundle(step["bundle"])
+            outcome = await asyncio.to_thread(bundle.stage, step["target"], Path(step["stage"]))
+            success = outcome["success"]
+            attrs["artifacts"] = outcome["artifacts"]
+            if not success:
+                attrs["output"] = outcome.get("error") or f"hash mismatch: {' '.join(outcome['failed'][:8])}"
+        elif step["kind"] == "governor":
+            outcome = await asyncio.to_thread(apply_cpufreq, step["governor"], step["epp"], step["cpus"])
+            success = outcome["success"]
+            attrs.update(cpus=outcome["cpus"], changed=outcome["changed"])
+            if not success:
+                attrs["output"] = outcome.get("error") or f"failed: {' '.join(outcome['failed'][:8])}"
+        else:
+            if self.gpu_backend and step["kind"] == "gpu" and "setting" in step:
+                success, output = await asyncio.to_thread(self.gpu_backend.apply, step["gpu"], tuple(step["setting"]))
+                attrs["backend"] = self.gpu_backend.name
+            elif self.run_command:
+                success, output = await asyncio.to_thread(self.run_command, step["command"])
+            else:
+                success, output, attrs["exit_code"] = await self._run_subprocess(step["command"])
+            attrs["output_bytes"] = len(output.encode())
+            if not success:
+                attrs["output"] = output[-2000:]
+
+        end = time.perf_counter()
+        self.timings[step["id"]] = (start, end)
+        if "phase" in step:
+            attrs["phase"] = step["phase"]
+        TRACER.add(self._label(step), step["kind"], start, end, success=success, **attrs)
+        return success
+
+    async def _run_subprocess(self, cmd: str) -> Tuple[bool, str, Optional[int]]:
+        if os.geteuid() != 0:
+            cmd = f"sudo {cmd}"
+
+        on_output = (lambda line: self.on_output(cmd, line)) if self.on_output else None
+        exit_code, output = await run_process(["/bin/sh", "-c", cmd], self.timeout, on_output=on_output)
+        return exit_code == 0, output, exit_code
+
+    def _label(self, step: Dict) -> str:
+        if self.gpu_backend and step["kind"] == "gpu" and "setting" in step:
+            return self.gpu_backend.describe(step["gpu"], tuple(step["setting"]))
+        if step["kind"] in ("xorg", "profile"):
+            return step["path"]
+        if step["kind"] == "governor":
+            return governor_label(step)
+        if step["kind"] == "irq":
+            return irq_label(step)
+        if step.get("phase") == "verify":
+            return f"Verify {step['target']} packages from {step['bundle']}"
+        return step["command"]
+
+
+class DesiredState:
+    FILENAME = "state.json"
+
+    @staticmethod
+    def path() -> Path:
+        return get_state_dir() / DesiredState.FILENAME
+
+    @staticmethod
+    def from_plan(plan: Dict) -> Dict:
+        governor_steps = [step for step in plan["steps"] if step["kind"] == "governor"]
+        return {
+            "version": 2,
+            "fingerprint": plan["fingerprint"],
+            "gpus": [
+                {
+                    "bus_id": gpu.get("bus_id", ""),
+                    "name": gpu["name"],
+                    "tdp": gpu["tdp"],
+                    "mem_clock": gpu["mem_clock"],
+                    "graphics_clock": gpu["graphics_clock"],
+                }
+                for gpu in plan["gpus"]
+            ],
+            "workload": plan.get("workload", "graphics"),
+            "cpufreq": {
+                "governor": governor_steps[0]["governor"],
+                "epp": governor_steps[0]["epp"],
+                "cpus": governor_steps[0]["cpus"],
+            } if governor_steps else None,
+            "irq_affinity": [
+                {"gpu": step["gpu"], "cpus": step["cpus"], "gpu_count": step["gpu_count"]}
+                for step in plan["steps"] if step["kind"] == "irq"
+            ],
+        }
+
+    @staticmethod
+    def save(state: Dict) -> bool:
+        path = DesiredState.path()
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_suffix(".tmp")
+            with open(tmp_path, "w") as f:
+                json.dump(state, f, indent=2)
+            os.replace(tmp_path, path)
+            return True
+        except OSError:
+            return False
+
+    @staticmethod
+    def load() -> Optional[Dict]:
+        try:
+            with open(DesiredState.path(), "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    @staticmethod
+    def get_setting_groups(state: Dict) -> List[Tuple[str, List[Tuple]]]:
+        return [
+            (gpu_info.get("bus_id", ""), NvidiaConfigurator(gpu_info, state.get("workload", "graphics")).get_settings())
+            for gpu_info in state["gpus"]
+        ]
+
+    @staticmethod
+    def reapply(
+        state: Dict,
+        run_command: Optional[Callable[[str], Tuple[bool, str]]] = None,
+        backend: Optional[GPUBackend] = None,
+    ) -> Dict:
+        backend = backend or NvidiaSMIBackend(run_command)
+        start = time.perf_counter()
+        process_uptime = get_process_uptime()
+        command_start = time.perf_counter()
+        results = backend.apply_groups(DesiredState.get_setting_groups(state), "reapply")
+        command_seconds = time.perf_counter() - command_start
+        flat_results = [result for group in results for result in group]
+
+        for settings in state.get("irq_affinity", []):
+            with TRACER.span(irq_label(settings), "reapply") as span:
+                span["success"] = pin_gpu_irqs(settings["gpu"], settings["cpus"], settings["gpu_count"])["success"]
+            flat_results.append((irq_label(settings), span["success"]))
+
+        cpufreq = state.get("cpufreq") or (Planner.DEFAULT_CPUFREQ if state.get("governor_command") else None)
+        if cpufreq:
+            with TRACER.span(governor_label(cpufreq), "reapply") as span:
+                span["success"] = apply_cpufreq(cpufreq["governor"], cpufreq["epp"], cpufreq["cpus"])["success"]
+            flat_results.append((governor_label(cpufreq), span["success"]))
+
+        elapsed = time.perf_counter() - start
+        if process_uptime is not None:
+            elapsed += process_uptime
+
+        return {
+            "results": flat_results,
+            "success": all(success for _, success in flat_results),
+            "total_ms": elapsed * 1000,
+            "command_ms": command_seconds * 1000,
+            "overhead_ms": max(elapsed - command_seconds, 0.0) * 1000,
+        }
+
+
+class DriftReconciler:
+    QUERY_FIELDS = ("persistence_mode", "power.limit", "clocks.applications.memory", "clocks.applications.graphics")
+    VERIFIABLE = ("persistence", "power_limit", "application_clocks")
+    POWER_TOLERANCE_W = 0.5
+    QUERY_TIMEOUT = 10
+
+    def __init__(self, state: Dict, nvidia_smi: str = "nvidia-smi"):
+        self.state = state
+        self.nvidia_smi = nvidia_smi
+        self.desired = self.desired_settings(state)
+        self.bus_ids = {normalize_bus_id(gpu.get("bus_id", "")): gpu.get("bus_id", "") for gpu in state["gpus"]}
+
+    def get_command(self) -> List[str]:
+        return [
+            self.nvidia_smi,
+            f"--query-gpu=pci.bus_id,{','.join(self.QUERY_FIELDS)}",
+            "--format=csv,noheader,nounits",
+        ]
+
+    @staticmethod
+    def _number(value: str) -> Optional[float]:
+        try:
+            return float(value)
+        except ValueError:
+            return None
+
+    @staticmethod
+    def parse(output: str) -> Dict[str, Dict]:
+        current = {}
+        for line in output.splitlines():
+            parts = [part.strip() for part in line.split(",")]
+            if len(parts) != len(DriftReconciler.QUERY_FIELDS) + 1:
+                continue
+            persistence = {"enabled": 1, "disabled": 0}.get(parts[1].lower())
+            mem_clock, graphics_clock = DriftReconciler._number(parts[3]), DriftReconciler._number(parts[4])
+            current[normalize_bus_id(parts[0])] = {
+                "persistence": persistence,
+                "power_limit": DriftReconciler._number(parts[2]),
+                "application_clocks": (
+                    (int(mem_clock), int(graphics_clock)) if mem_clock is not None and graphics_clock is not None else None
+                ),
+            }
+        return current
+
+    def read(self) -> Tuple[Optional[Dict[str, Dict]], str]:
+        try:
+            result = subprocess.run(self.get_command(), capture_output=True, text=True, timeout=self.QUERY_TIMEOUT)
+        except (OSError, subprocess.SubprocessError) as e:
+            return None, str(e)
+        if result.returncode != 0:
+            return None, result.stderr.strip() or f"exit code {result.returncode}"
+        return self.parse(result.stdout), ""
+
+    @staticmethod
+    def desired_settings(state: Dict) -> Dict[str, Dict[str, Tuple]]:
+        desired = {}
+        for bus_id, settings in DesiredState.get_setting_groups(state):
+            desired[normalize_bus_id(bus_id)] = {
+                setting[0]: setting for setting in settings if setting[0] in DriftReconciler.VERIFIABLE
+            }
+        return desired
+
+    @staticmethod
+    def diff(desired: Dict[str, Dict[str, Tuple]], current: Dict[str, Dict]) -> List[Dict]:
+        drift = []
+        for bus_id, settings in desired.items():
+            actual = current.get(bus_id)
+            if actual is None:
+                drift.append(
+                    {"gpu": bus_id, "field": "gpu", "expected": "present", "actual": "missing", "setting": None}
+                )
+                continue
+            for kind, setting in settings.items():
+                expected = setting[1] if len(setting) == 2 else tuple(setting[1:])
+                value = actual.get(kind)
+                if value is None:
+                    continue
+                if kind == "power_limit":
+                    matches = abs(value - expected) <= DriftReconciler.POWER_TOLERANCE_W
+                else:
+                    matches = value == expected
+                if not matches:
+                    drift.append(
+                        {"gpu": bus_id, "field": kind, "expected": expected, "actual": value, "setting": setting}
+                    )
+        return drift
+
+    def reconcile(self, backend: Optional[GPUBackend] = None, dry_run: bool = False) -> Dict:
+        start = time.perf_counter()
+        with TRACER.span("query", "verify") as span:
+            current, error = self.read()
+            span["success"] = current is not None
+        outcome: Dict = {"query_ms": (time.perf_counter() - start) * 1000, "drift": [], "applied": [], "error": error}
+        if current is None:
+            outcome["success"] = False
+            return outcome
+
+        outcome["drift"] = self.diff(self.desired, current)
+        groups: Dict[str, List[Tuple]] = {}
+        for item in outcome["drift"]:
+            if item["setting"]:
+                groups.setdefault(self.bus_ids.get(item["gpu"], item["gpu"]), []).append(item["setting"])
+        if groups and backend and not dry_run:
+            results = backend.apply_groups(list(groups.items()), "reconcile")
+            outcome["applied"] = [result for group in results for result in group]
+
+        outcome["success"] = (
+            all(success for _, success in outcome["applied"])
+            and not any(item["setting"] is None for item in outcome["drift"])
+        )
+        return outcome
+
+
+class SystemdUnit:
+    NAME = "nvidia-stability-reapply.service"
+    UNIT_DIR = Path("/etc/systemd/system")
+
+    @staticmethod
+    def render(exec_start: str, module_dir: str) -> str:
+        return f'''[Unit]
+Description=Reapply NVIDIA Stability GPU power limits, clocks and CPU governor
+After=systemd-modules-load.service nvidia-persistenced.service
+ConditionPathExists={DesiredState.path()}
+
+[Service]
+Type=oneshot
+WorkingDirectory={module_dir}
+Environment="PYTHONPATH={module_dir}"
+ExecStart={exec_start}
+RemainAfterExit=yes
+
+[Install]
+WantedBy=multi-user.target
+'''
+
+    @staticmethod
+    def install() -> bool:
+        exec_start = f"{sys.executable} -m {Path(__file__).stem} reapply"
+        unit_path = SystemdUnit.UNIT_DIR / SystemdUnit.NAME
+        try:
+            unit_path.write_text(SystemdUnit.render(exec_start, str(Path(__file__).resolve().parent)))
+        except OSError:
+            return False
+        success, _ = SystemConfigurator.run_command(f"systemctl daemon-reload && systemctl enable {SystemdUnit.NAME}")
+        return success
+
+
+class InventoryCache:
+    FILENAME = "inventory.json"
+
+    def __init__(self, cache_dir: Optional[Path] = None, os_release: str = "/etc/os-release", sysfs_root: str = "/sys"):
+        self.path = (cache_dir or get_cache_dir()) / self.FILENAME
+        self.os_release = os_release
+        self.sysfs_root = sysfs_root
+        self.hits = 0
+        self.misses = 0
+        self.last_result = ""
+
+    @staticmethod
+    def _stat_signature(path) -> Optional[List[int]]:
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        return [st.st_mtime_ns, st.st_ino, st.st_size]
+
+    def key(self) -> Dict:
+        try:
+            with open(os.path.join(self.sysfs_root, "module", "nvidia", "version"), "r") as f:
+                driver_version = f.read().strip()
+        except OSError:
+            driver_version = ""
+
+        return {
+            "os_release": self._stat_signature(self.os_release),
+            "pci_devices": self._stat_signature(os.path.join(self.sysfs_root, "bus", "pci", "devices")),
+            "kernel": platform.release(),
+            "driver_version": driver_version,
+            "data_file": self._stat_signature(DATA_FILE),
+            "tool_version": __version__,
+        }
+
+    def load(self) -> Optional[Dict]:
+        try:
+            with open(self.path, "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def save(self, entry: Dict) -> bool:
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.path.with_suffix(".tmp")
+            with open(tmp_path, "w") as f:
+                json.dump(entry, f, indent=2)
+            os.replace(tmp_path, self.path)
+            return True
+        except OSError:
+            return False
+
+    def get(self, refresh: bool = False, count_hits: bool = False) -> Tuple[Dict, List[Dict]]:
+        key = self.key()
+        entry = self.load() or {}
+        self.hits = entry.get("hits", 0)
+        self.misses = entry.get("misses", 0)
+
+        if not refresh and entry.get("key") == key:
+            self.hits += 1
+            self.last_result = "hit"
+            if count_hits:
+                entry["hits"] = self.hits
+                self.save(entry)
+            return entry["distro"], entry["gpus"]
+
+        self.misses += 1
+        self.last_result = "refresh" if refresh else "miss"
+        distro, gpus = self.detect()
+        self.save({"key": key, "distro": distro, "gpus": gpus, "hits": self.hits, "misses": self.misses})
+        return distro, gpus
+
+    def detect(self) -> Tuple[Dict, List[Dict]]:
+        distro_id, distro_name, distro_version = DistroDetector.detect(
+            self.os_release, os.path.join(os.path.dirname(self.os_release), "lsb-release"),
+        )
+        distro = {
+            "id": distro_id,
+            "name": distro_name,
+            "version": distro_version,
+            "family": DistroDetector.get_family(distro_id),
+        }
+        return distro, GPUDetector.detect_all(self.sysfs_root)
+
+
+TELEMETRY_FIELDS = (
+    "temperature.gpu",
+    "power.draw",
+    "power.limit",
+    "clocks.sm",
+    "clocks.mem",
+    "utilization.gpu",
+    "clocks_throttle_reasons.active",
+)
+
+
+def normalize_bus_id(bus_id: str) -> str:
+    bus_id = bus_id.strip().lower()
+    return bus_id[-12:] if len(bus_id) > 12 else bus_id
+
+
+class TelemetryRing:
+    __slots__ = ("capacity", "fields", "timestamps", "columns", "head", "count")
+
+    def __init__(self, capacity: int, fields: Tuple[str, ...] = TELEMETRY_FIELDS):
+        self.capacity = capacity
+        self.fields = fields
+        self.timestamps = array("d", [0.0]) * capacity
+        self.columns = [array("d", [0.0]) * capacity for _ in fields]
+        self.head = 0
+        self.count = 0
+
+    def __len__(self) -> int:
+        return self.count
+
+    def append(self, timestamp: float, values: List[float]) -> None:
+        head = self.head
+        self.timestamps[head] = timestamp
+        for column, value in zip(self.columns, values):
+            column[head] = value
+        self.head = (head + 1) % self.capacity
+        if self.count < self.capacity:
+            self.count += 1
+
+    def _order(self) -> List[int]:
+        start = (self.head - self.count) % self.capacity
+        return [(start + i) % self.capacity for i in range(self.count)]
+
+    def series(self, field: str) -> List[float]:
+        column = self.columns[self.fields.index(field)]
+        return [column[i] for i in self._order()]
+
+    def latest(self) -> Optional[Dict[str, float]]:
+        if not self.count:
+            return None
+        index = (self.head - 1) % self.capacity
+        latest = {field: column[index] for field, column in zip(self.fields, self.columns)}
+        latest["timestamp"] = self.timestamps[index]
+        return latest
+
+
+class TelemetrySampler:
+    def __init__(
+        self,
+        interval_ms: int = 1000,
+        capacity: int = 3600,
+        fields: Tuple[str, ...] = TELEMETRY_FIELDS,
+        nvidia_smi: str = "nvidia-smi",
+    ):
+        self.interval_ms = interval_ms
+        self.capacity = capacity
+        self.fields = fields
+        self.nvidia_smi = nvidia_smi
+        self.rings: Dict[str, TelemetryRing] = {}
+        self.samples = 0
+        self.errors = 0
+        self.parse_seconds = 0.0
+        self.process: Optional[subprocess.Popen] = None
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def get_command(self) -> List[str]:
+        return [
+            self.nvidia_smi,
+            f"--query-gpu=pci.bus_id,{','.join(self.fields)}",
+            "--format=csv,noheader,nounits",
+            "-lms",
+            str(self.interval_ms),
+        ]
+
+    @staticmethod
+    def _parse_value(value: str) -> float:
+        value = value.strip()
+        if value.startswith("0x"):
+            return float(int(value, 16))
+        try:
+            return float(value)
+        except ValueError:
+            return float("nan")
+
+    def feed(self, lines) -> int:
+        parsed = 0
+        expected = len(self.fields) + 1
+        start = time.perf_counter()
+
+        for line in lines:
+            parts = line.split(",")
+            if len(parts) != expected:
+                self.errors += 1
+                continue
+
+            bus_id = normalize_bus_id(parts[0])
+            values = [self._parse_value(value) for value in parts[1:]]
+            with self._lock:
+                ring = self.rings.get(bus_id)
+                if ring is None:
+                    ring = self.rings[bus_id] = TelemetryRing(self.capacity, self.fields)
+                ring.append(time.time(), values)
+            parsed += 1
+
+        self.parse_seconds += time.perf_counter() - start
+        self.samples += parsed
+        return parsed
+
+    def start(self) -> bool:
+        try:
+            self.process = subprocess.Popen(
+                self.get_command(),
+                stdout=subprocess.PIPE,
+                stderr=subprocess.DEVNULL,
+                text=True,
+                bufsize=1,
+            )
+        except OSError:
+            return False
+
+        self._thread = threading.Thread(target=self._read_stream, daemon=True)
+        self._thread.start()
+        return True
+
+    def _read_stream(self) -> None:
+        if self.process and self.process.stdout:
+            for line in self.process.stdout:
+                self.feed((line,))
+
+    def wait(self, timeout: Optional[float] = None) -> None:
+        if self._thread:
+            self._thread.join(timeout)
+
+    def stop(self) -> None:
+        if self.process and self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+        self.wait(5)
+
+    def latest(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            return {bus_id: ring.latest() for bus_id, ring in self.rings.items() if len(ring)}
+
+    def stats(self) -> Dict:
+        return {
+            "gpus": len(self.rings),
+            "samples": self.samples,
+            "errors": self.errors,
+            "parse_seconds": self.parse_seconds,
+            "samples_per_second": self.samples / self.parse_seconds if self.parse_seconds else 0.0,
+        }
+
+
+THROTTLE_SW_POWER_CAP = 0x4
+THROTTLE_HW_SLOWDOWN = 0x8
+THROTTLE_SW_THERMAL = 0x20
+THROTTLE_HW_THERMAL = 0x40
+THROTTLE_HW_POWER_BRAKE = 0x80
+THERMAL_THROTTLE_MASK = THROTTLE_HW_SLOWDOWN | THROTTLE_SW_THERMAL | THROTTLE_HW_THERMAL | THROTTLE_HW_POWER_BRAKE
+
+
+class SamplerMetricsSource:
+    def __init__(self, sampler: TelemetrySampler):
+        self.sampler = sampler
+
+    def read(self) -> Optional[Dict[str, Dict[str, float]]]:
+        if self.sampler.process is None or self.sampler.process.poll() is not None:
+            return None
+        return self.sampler.latest()
+
+
+class TraceMetricsSource:
+    def __init__(self, ticks: List[Dict[str, Dict[str, float]]]):
+        self.ticks = ticks
+        self.position = 0
+
+    @classmethod
+    def from_csv(cls, path: str, fields: Tuple[str, ...] = TELEMETRY_FIELDS) -> "TraceMetricsSource":
+        sampler = TelemetrySampler(fields=fields)
+        ticks: List[Dict[str, Dict[str, float]]] = []
+        current: Dict[str, Dict[str, float]] = {}
+
+        with open(path, "r") as f:
+            for line in f:
+                parts = line.split(",")
+                if len(parts) != len(fields) + 1:
+                    continue
+                bus_id = normalize_bus_id(parts[0])
+                if bus_id in current:
+                    ticks.append(current)
+                    current = {}
+                current[bus_id] = {
+                    field: sampler._parse_value(value) for field, value in zip(fields, parts[1:])
+                }
+        if current:
+            ticks.append(current)
+        return cls(ticks)
 
-    print("Detecting system configuration...\n")
+    def read(self) -> Optional[Dict[str, Dict[str, float]]]:
+        if self.position >= len(self.ticks):
+            return None
+        tick = self.ticks[self.position]
+        self.position += 1
+        return tick
+
+
+class PowerLimitController:
+    def __init__(
+        self,
+        gpus: List[Dict],
+        min_percent: float = 70,
+        max_percent: float = 100,
+        target_temp: float = 80,
+        hysteresis: float = 3,
+        step_watts: int = 10,
+        min_interval: float = 10,
+        smoothing: float = 0.3,
+    ):
+        self.target_temp = target_temp
+        self.hysteresis = hysteresis
+        self.step_watts = step_watts
+        self.min_interval = min_interval
+        self.smoothing = smoothing
+        self.gpus: Dict[str, Dict] = {}
+
+        for gpu_info in gpus:
+            tdp = gpu_info["tdp"]
+            bus_id = normalize_bus_id(gpu_info.get("bus_id", ""))
+            self.gpus[bus_id] = {
+                "gpu_info": gpu_info,
+                "min_watts": int(tdp * min_percent / 100),
+                "max_watts": int(tdp * max_percent / 100),
+                "limit": int(tdp * max_percent / 100),
+                "temperature": None,
+                "last_change": None,
+            }
+
+    def step(self, metrics: Dict[str, Dict[str, float]], now: float) -> Dict[str, int]:
+        changes = {}
+
+        for bus_id, sample in metrics.items():
+            state = self.gpus.get(bus_id)
+            if state is None:
+                continue
+
+            temperature = sample.get("temperature.gpu", float("nan"))
+            if temperature != temperature:
+                continue
+            if state["temperature"] is None:
+                state["temperature"] = temperature
+            else:
+                state["temperature"] += self.smoothing * (temperature - state["temperature"])
+
+            if state["last_change"] is not None and now - state["last_change"] < self.min_interval:
+                continue
+
+            reasons = sample.get("clocks_throttle_reasons.active", 0)
+            reasons = int(reasons) if reasons == reasons else 0
+            thermal_throttled = bool(reasons & THERMAL_THROTTLE_MASK)
+            power_capped = bool(reasons & THROTTLE_SW_POWER_CAP)
+
+            limit = state["limit"]
+            if thermal_throttled or state["temperature"] > self.target_temp + self.hysteresis:
+                limit = max(state["min_watts"], limit - self.step_watts)
+            elif power_capped and state["temperature"] < self.target_temp - self.hysteresis:
+                limit = min(state["max_watts"], limit + self.step_watts)
+
+            if limit != state["limit"]:
+                state["limit"] = limit
+                state["last_change"] = now
+                changes[bus_id] = limit
+
+        return changes
+
+    def get_commands(self, changes: Dict[str, int]) -> List[str]:
+        return [
+            NvidiaConfigurator(self.gpus[bus_id]["gpu_info"]).get_power_limit_command(limit)
+            for bus_id, limit in sorted(changes.items())
+        ]
+
+    def run(
+        self,
+        source,
+        run_command: Optional[Callable[[str], Tuple[bool, str]]] = None,
+        interval: float = 1.0,
+        iterations: int = 0,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep,
+    ) -> List[Tuple[float, str, bool]]:
+        decisions = []
+        count = 0
+
+        while not iterations or count < iterations:
+            metrics = source.read()
+            if metrics is None:
+                break
+
+            now = clock()
+            for cmd in self.get_commands(self.step(metrics, now)):
+                success = run_command(cmd)[0] if run_command else True
+                decisions.append((now, cmd, success))
+                print_status(f"  {cmd}", success)
+
+            count += 1
+            if interval:
+                sleep(interval)
+
+        return decisions
+
+
+class GPUScrapeCache:
+    QUERY_TIMEOUT = 10
+
+    def __init__(
+        self,
+        interval: float = 5.0,
+        nvidia_smi: str = "nvidia-smi",
+        fields: Tuple[str, ...] = TELEMETRY_FIELDS,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.interval = interval
+        self.nvidia_smi = nvidia_smi
+        self.fields = fields
+        self.clock = clock
+        self.samples: Optional[Dict[str, Dict]] = None
+        self.fetched_at = 0.0
+        self.requests = 0
+        self.hits = 0
+        self.queries = 0
+        self.errors = 0
+        self.last_seconds = 0.0
+        self.total_seconds = 0.0
+        self.up = False
+        self.last_success = 0.0
+        self._lock = threading.Lock()
+
+    def get_command(self) -> List[str]:
+        return [
+            self.nvidia_smi,
+            f"--query-gpu=pci.bus_id,name,{','.join(self.fields)}",
+            "--format=csv,noheader,nounits",
+        ]
+
+    def query(self) -> Dict[str, Dict]:
+        result = subprocess.run(self.get_command(), capture_output=True, text=True, timeout=self.QUERY_TIMEOUT)
+        if result.returncode != 0:
+            raise subprocess.SubprocessError(result.stderr.strip() or f"exit code {result.returncode}")
+
+        samples = {}
+        for line in result.stdout.splitlines():
+            parts = [part.strip() for part in line.split(",")]
+            if len(parts) != len(self.fields) + 2:
+                continue
+            sample: Dict = {"name": parts[1]}
+            sample.update(zip(self.fields, (TelemetrySampler._parse_value(value) for value in parts[2:])))
+            samples[normalize_bus_id(parts[0])] = sample
+        return samples
+
+    def get(self) -> Dict[str, Dict]:
+        with self._lock:
+            self.requests += 1
+            if self.samples is not None and self.clock() - self.fetched_at < self.interval:
+                self.hits += 1
+                return self.samples
+
+            start = time.perf_counter()
+            self.queries += 1
+            try:
+                self.samples = self.query()
+                self.up = True
+                self.last_success = time.time()
+            except (OSError, subprocess.SubprocessError):
+                self.errors += 1
+                self.samples = {}
+                self.up = False
+            self.last_seconds = time.perf_counter() - start
+            self.total_seconds += self.last_seconds
+            self.fetched_at = self.clock()
+            return self.samples
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "hits": self.hits,
+                "queries": self.queries,
+                "errors": self.errors,
+                "last_seconds": self.last_seconds,
+                "total_seconds": self.total_seconds,
+                "hit_ratio": self.hits / self.requests if self.requests else 0.0,
+                "up": self.up,
+                "last_success": self.last_success,
+            }
+
+
+class PrometheusExporter:
+    CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+    GPU_METRICS = (
+        ("temperature.gpu", "nvidia_gpu_temperature_celsius", "GPU core temperature", 1),
+        ("power.draw", "nvidia_gpu_power_draw_watts", "Current board power draw", 1),
+        ("power.limit", "nvidia_gpu_power_limit_watts", "Power limit currently enforced by the driver", 1),
+        ("clocks.sm", "nvidia_gpu_sm_clock_hertz", "Current SM clock", 1e6),
+        ("clocks.mem", "nvidia_gpu_memory_clock_hertz", "Current memory clock", 1e6),
+        ("utilization.gpu", "nvidia_gpu_utilization_ratio", "Fraction of time a kernel was running", 0.01),
+    )
+    THROTTLE_REASONS = {
+        0x1: "gpu_idle",
+        0x2: "applications_clocks_setting",
+        THROTTLE_SW_POWER_CAP: "sw_power_cap",
+        THROTTLE_HW_SLOWDOWN: "hw_slowdown",
+        0x10: "sync_boost",
+        THROTTLE_SW_THERMAL: "sw_thermal_slowdown",
+        THROTTLE_HW_THERMAL: "hw_thermal_slowdown",
+        THROTTLE_HW_POWER_BRAKE: "hw_power_brake_slowdown",
+    }
+
+    def __init__(self, cache: GPUScrapeCache):
+        self.cache = cache
+        self.server: Optional["ThreadingHTTPServer"] = None
+        self._thread: Optional[threading.Thread] = None
+
+    @staticmethod
+    def _escape(value: str) -> str:
+        return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+    @staticmethod
+    def _format(value: float) -> str:
+        return repr(float(value)) if value != int(value) else str(int(value))
+
+    def render(self) -> str:
+        samples = self.cache.get()
+        metrics: Dict[str, Tuple[str, str, List[str]]] = {}
+
+        def add(name: str, kind: str, help_text: str, labels: str, value: float):
+            if value != value:
+                return
+            metrics.setdefault(name, (kind, help_text, []))[2].append(f"{name}{{{labels}}} {self._format(value)}")
+
+        for bus_id, sample in sorted(samples.items()):
+            labels = f'gpu="{bus_id}",name="{self._escape(sample["name"])}"'
+            for field, name, help_text, scale in self.GPU_METRICS:
+                if field in sample:
+                    add(name, "gauge", help_text, labels, sample[field] * scale)
+
+            configured = GPUDetector._get_gpu_info(sample["name"])["tdp"]
+            add("nvidia_gpu_power_limit_configured_watts", "gauge", "Power limit from the GPU table", labels, configured)
+            if "power.draw" in sample:
+                add(
+                    "nvidia_gpu_power_limit_utilization_ratio", "gauge",
+                    "Power draw as a fraction of the configured limit", labels, sample["power.draw"] / configured,
+                )
+
+            reasons = sample.get("clocks_throttle_reasons.active", float("nan"))
+            if reasons == reasons:
+                for bit, reason in self.THROTTLE_REASONS.items():
+                    add(
+                        "nvidia_gpu_throttle_reason_active", "gauge", "Whether a clock throttle reason is active",
+                        f'{labels},reason="{reason}"', 1 if int(reasons) & bit else 0,
+                    )
+
+        stats = self.cache.stats()
+        exporter_metrics = (
+            ("nvidia_stability_exporter_up", "gauge", "Whether the last nvidia-smi query succeeded", int(stats["up"])),
+            ("nvidia_stability_exporter_last_success_timestamp_seconds", "gauge",
+             "Unix time of the last successful nvidia-smi query", stats["last_success"]),
+            ("nvidia_stability_exporter_scrapes_total", "counter", "Metric requests served", stats["requests"]),
+            ("nvidia_stability_exporter_cache_hits_total", "counter", "Requests served from the cache", stats["hits"]),
+            ("nvidia_stability_exporter_cache_hit_ratio", "gauge", "Fraction of requests served from the cache",
+             stats["hit_ratio"]),
+            ("nvidia_stability_exporter_queries_total", "counter", "nvidia-smi queries run", stats["queries"]),
+            ("nvidia_stability_exporter_query_errors_total", "counter", "nvidia-smi queries that failed",
+             stats["errors"]),
+            ("nvidia_stability_exporter_query_duration_seconds", "gauge", "Duration of the last nvidia-smi query",
+             stats["last_seconds"]),
+            ("nvidia_stability_exporter_query_duration_seconds_total", "counter",
+             "Time spent in nvidia-smi queries", stats["total_seconds"]),
+        )
+        lines = []
+        for name, kind, help_text, value in exporter_metrics:
+            lines.extend((f"# HELP {name} {help_text}", f"# TYPE {name} {kind}", f"{name} {self._format(value)}"))
+        for name, (kind, help_text, samples_lines) in metrics.items():
+            lines.extend((f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"))
+            lines.extend(samples_lines)
+        return "\n".join(lines) + "\n"
+
+    def write_textfile(self, path: str) -> bool:
+        target = Path(path)
+        try:
+            tmp_path = target.with_name(f".{target.name}.tmp")
+            tmp_path.write_text(self.render())
+            os.replace(tmp_path, target)
+            return True
+        except OSError:
+            return False
+
+    def serve(self, host: str = "127.0.0.1", port: int = 9835) -> Tuple[str, int]:
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        exporter = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?", 1)[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = exporter.render().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", PrometheusExporter.CONTENT_TYPE)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self.server.server_address[:2]
+
+    def stop(self) -> None:
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+
+class FleetInventory:
+    @staticmethod
+    def parse(text: str) -> List[Dict]:
+        hosts = []
+        for line in text.splitlines():
+            fields = line.split("#", 1)[0].split()
+            if not fields:
+                continue
+            options = dict(field.split("=", 1) for field in fields[1:] if "=" in field)
+            hosts.append({"name": fields[0], "options": options})
+        return hosts
+
+    @staticmethod
+    def load(path: str) -> List[Dict]:
+        with open(path, "r") as f:
+            return FleetInventory.parse(f.read())
+
+
+class Transport(ABC):
+    python = "python3"
+
+    def __init__(self, host: Dict):
+        self.host = host
+        self.python = host["options"].get("python", self.python)
+
+    async def open(self) -> None:
+        pass
 
-    distro_id, distro_name, distro_version = DistroDetector.detect()
-    distro_family = DistroDetector.get_family(distro_id)
+    @abstractmethod
+    async def run(self, script: str, timeout: Optional[float], stdin: Optional[bytes] = None) -> Tuple[Optional[int], str]:
+        pass
 
-    print_status(f"Distribution: {distro_name} ({distro_id})")
-    print_status(f"Version: {distro_version}")
-    print_status(f"Family: {distro_family}")
+    async def close(self) -> None:
+        pass
 
-    if distro_family == "unknown":
+
+class LocalTransport(Transport):
+    python = sys.executable
+
+    def env(self) -> Dict[str, str]:
+        env = dict(os.environ)
+        env.update({key: value for key, value in self.host["options"].items() if key.isupper()})
+        return env
+
+    async def run(self, script: str, timeout: Optional[float], stdin: Optional[bytes] = None) -> Tuple[Optional[int], str]:
+        return await run_process(["/bin/sh", "-c", script], timeout, stdin, self.env())
+
+
+class SSHTransport(Transport):
+    CONTROL_PERSIST = 120
+
+    def __init__(self, host: Dict, control_dir: Optional[str] = None, connect_timeout: int = 10):
+        super().__init__(host)
+        self.control_dir = control_dir or tempfile.gettempdir()
+        self.connect_timeout = connect_timeout
+
+    def base_argv(self) -> List[str]:
+        options = self.host["options"]
+        argv = [
+            "ssh",
+            "-o", "BatchMode=yes",
+            "-o", f"ConnectTimeout={self.connect_timeout}",
+            "-o", "ControlMaster=auto",
+            "-o", f"ControlPath={os.path.join(self.control_dir, '%C')}",
+            "-o", f"ControlPersist={self.CONTROL_PERSIST}",
+        ]
+        if "port" in options:
+            argv += ["-p", options["port"]]
+        if "user" in options:
+            argv += ["-l", options["user"]]
+        if "identity" in options:
+            argv += ["-i", options["identity"]]
+        return argv + [options.get("address", self.host["name"])]
+
+    def argv(self, script: str) -> List[str]:
+        return self.base_argv() + ["--", f"sh -c {shlex.quote(script)}"]
+
+    async def run(self, script: str, timeout: Optional[float], stdin: Optional[bytes] = None) -> Tuple[Optional[int], str]:
+        return await run_process(self.argv(script), timeout, stdin)
+
+    async def close(self) -> None:
+        argv = self.base_argv()
+        await run_process(argv[:-1] + ["-O", "exit", argv[-1]], self.connect_timeout)
+
+
+class FleetRunner:
+    COMMANDS = ("apply", "plan", "reapply")
+    TRACE_MARKER = "--- nvidia-stability trace ---"
+    MAX_PARALLEL = 32
+
+    def __init__(
+        self,
+        hosts: List[Dict],
+        transport_factory: Callable[[Dict], Transport],
+        parallel: int = MAX_PARALLEL,
+        timeout: Optional[float] = 1800,
+        command: str = "apply",
+        extra_args: Optional[List[str]] = None,
+    ):
+        self.hosts = hosts
+        self.transport_factory = transport_factory
+        self.parallel = max(1, parallel)
+        self.timeout = timeout
+        self.command = command
+        self.extra_args = extra_args or []
+        self.digest, self.archive = self.payload()
+
+    @staticmethod
+    def payload() -> Tuple[str, bytes]:
+        import tarfile
+
+        buffer = io.BytesIO()
+        with tarfile.open(fileobj=buffer, mode="w:gz") as tar:
+            for path, name in ((Path(__file__).resolve(), "src/nvidia_stability.py"), (DATA_FILE, f"data/{DATA_FILE.name}")):
+                content = Path(path).read_bytes()
+                info = tarfile.TarInfo(name)
+                info.size = len(content)
+                info.mode = 0o755
+                tar.addfile(info, io.BytesIO(content))
+        archive = buffer.getvalue()
+        digest = hashlib.sha256(archive).hexdigest()[:16]
+        return digest, archive
+
+    def check_script(self) -> str:
+        return f'[ -f "$HOME/.cache/nvidia-stability/fleet/{self.digest}/.complete" ]'
+
+    def upload_script(self, python: str) -> str:
+        extract = (
+            "import io, os, sys, tarfile; "
+            "tarfile.open(fileobj=io.BytesIO(sys.stdin.buffer.read())).extractall(sys.argv[1]); "
+            "open(os.path.join(sys.argv[1], '.complete'), 'w').close()"
+        )
+        return (
+            f'dir="$HOME/.cache/nvidia-stability/fleet/{self.digest}"; '
+            f'[ -f "$dir/.complete" ] && exit 0; '
+            f'{shlex.quote(python)} -c {shlex.quote(extract)} "$dir"'
+        )
+
+    def run_script(self, python: str) -> str:
+        args = " ".join(shlex.quote(arg) for arg in [self.command] + self.extra_args)
+        return (
+            f'dir="$HOME/.cache/nvidia-stability/fleet/{self.digest}"; '
+            f'{shlex.quote(python)} "$dir/src/nvidia_stability.py" --trace-jsonl "$dir/trace.jsonl" {args}; '
+            f'rc=$?; echo {shlex.quote(self.TRACE_MARKER)}; '
+            f'while IFS= read -r line; do printf "%s\\n" "$line"; done < "$dir/trace.jsonl"; exit $rc'
+        )
+
+    @staticmethod
+    def parse_trace(text: str) -> List[Dict]:
+        spans = []
+        for line in text.splitlines():
+            try:
+                spans.append(json.loads(line))
+            except ValueError:
+                continue
+        return spans
+
+    async def run_host(self, host: Dict, semaphore: "asyncio.Semaphore") -> Dict:
+        result = {
+            "host": host["name"], "ok": False, "exit_code": None, "uploaded": False, "upload_ms": 0.0, "run_ms": 0.0,
+            "steps": [],
+        }
+        async with semaphore:
+            start = time.perf_counter()
+            transport = self.transport_factory(host)
+            try:
+                await transport.open()
+                exit_code, output = await transport.run(self.check_script(), self.timeout)
+                if exit_code != 0:
+                    result["uploaded"] = True
+                    exit_code, output = await transport.run(
+                        self.upload_script(transport.python), self.timeout, self.archive,
+                    )
+                result["upload_ms"] = (time.perf_counter() - start) * 1000
+                if exit_code != 0:
+                    result["error"] = f"upload failed: {output.strip()[-500:]}"
+                    return result
+
+                run_start = time.perf_counter()
+                exit_code, output = await transport.run(self.run_script(transport.python), self.timeout)
+                result["run_ms"] = (time.perf_counter() - run_start) * 1000
+                output, _, trace = output.partition(self.TRACE_MARKER)
+                result["exit_code"] = exit_code
+                result["ok"] = exit_code == 0
+                result["output"] = output[-4000:]
+                result["steps"] = [
+                    span for span in self.parse_trace(trace) if span.get("cat") in PlanExecutor.SECTIONS
+                ]
+                if exit_code is None:
+                    result["error"] = "timed out"
+            finally:
+                await transport.close()
+                result["total_ms"] = (time.perf_counter() - start) * 1000
+                TRACER.add(host["name"], "fleet", start, time.perf_counter(), lane=host["name"], success=result["ok"])
+        return result
+
+    async def run_async(self, on_result: Optional[Callable[[Dict], None]] = None) -> List[Dict]:
+        import asyncio
+
+        semaphore = asyncio.Semaphore(min(self.parallel, self.MAX_PARALLEL))
+
+        async def run_and_report(host: Dict) -> Dict:
+            result = await self.run_host(host, semaphore)
+            if on_result:
+                on_result(result)
+            return result
+
+        return list(await asyncio.gather(*(run_and_report(host) for host in self.hosts)))
+
+    def run(self, on_result: Optional[Callable[[Dict], None]] = None) -> List[Dict]:
+        import asyncio
+
+        return asyncio.run(self.run_async(on_result))
+
+
+def print_banner():
+    banner = """
+╔═══════════════════════════════════════════════════════════════╗
+║           NVIDIA Stability for All Linux                      ║
+║           GPU Configuration & Optimization Tool               ║
+╚═══════════════════════════════════════════════════════════════╝
+"""
+    print(banner)
+
+
+def print_status(message: str, success: bool = True):
+    status = "✓" if success else "✗"
+    color = "\033[92m" if success else "\033[91m"
+    reset = "\033[0m"
+    print(f"{color}[{status}]{reset} {message}")
+
+
+def detect_system(refresh: bool = False, debug: bool = False) -> Tuple[Dict, List[Dict]]:
+    root = get_root()
+    cache = InventoryCache(os_release=str(root / "etc" / "os-release"), sysfs_root=str(root / "sys"))
+    with TRACER.span("detect", "detect") as span:
+        distro, gpus = cache.get(refresh=refresh, count_hits=debug)
+        span.update(cache=cache.last_result, distro=distro["id"], gpus=len(gpus))
+    if debug:
+        print(
+            f"[debug] inventory cache {cache.last_result} (hits={cache.hits}, misses={cache.misses})",
+            file=sys.stderr,
+        )
+    return distro, gpus
+
+
+def print_system(distro: Dict, gpus: List[Dict]):
+    print_status(f"Distribution: {distro['name']} ({distro['id']})")
+    print_status(f"Version: {distro['version']}")
+    print_status(f"Family: {distro['family']}")
+
+    if distro["family"] == "unknown":
         print("\nWarning: Unknown distribution. Will attempt generic configuration.")
 
-    gpu_info = GPUDetector.detect()
-    if not gpu_info:
-        print("\n[!] No NVIDIA GPU detected. Please ensure your GPU is properly connected.")
-        sys.exit(1)
+    for gpu_info in gpus:
+        print()
+        print_status(f"GPU Detected: {gpu_info['detected_name']} ({gpu_info.get('bus_id', 'unknown bus')})")
+        print_status(f"Matched Profile: {gpu_info['name']}")
+        print_status(f"TDP Limit: {gpu_info['tdp']}W")
+        print_status(f"Memory Clock: {gpu_info['mem_clock']}MHz")
+        print_status(f"Graphics Clock: {gpu_info['graphics_clock']}MHz")
+
+
+def add_tuning_arguments(parser: argparse.ArgumentParser):
+    defaults = Planner.DEFAULT_CPUFREQ
+    parser.add_argument("--governor", default=defaults["governor"], help="CPU scaling governor to set")
+    parser.add_argument(
+        "--epp", default=defaults["epp"], help="Energy performance preference to set (empty to leave unchanged)",
+    )
+    parser.add_argument(
+        "--cpus", default=defaults["cpus"],
+        help="CPUs to configure, e.g. 0-63,128, or 'local' for the GPUs' NUMA-local CPUs (default: all)",
+    )
+    parser.add_argument(
+        "--irq-affinity", action="store_true", help="Pin each GPU's interrupts to its NUMA-local CPUs",
+    )
+    parser.add_argument(
+        "--workload", choices=NvidiaConfigurator.WORKLOADS, default="graphics",
+        help="Clock strategy: application clocks (graphics), plus a locked memory clock (compute-throughput), "
+        "or GPU and memory clocks locked below boost for stable latency (compute-latency)",
+    )
+    parser.add_argument(
+        "--shader-cache", metavar="PLACEMENT",
+        help="Shader cache location: auto (local disk if home is on a network filesystem), local, tmpfs or a path",
+    )
+    parser.add_argument(
+        "--no-prefetch", dest="prefetch", action="store_false",
+        help="Do not download driver packages ahead of installing them",
+    )
+    parser.add_argument(
+        "--offline", metavar="BUNDLE",
+        help="Install driver packages only from this bundle directory (see the bundle command), without network access",
+    )
+
+
+def add_backend_argument(parser: argparse.ArgumentParser):
+    parser.add_argument(
+        "--backend", choices=["auto", "nvml", "nvidia-smi"], default="auto",
+        help="How GPU settings are applied: in-process through NVML, or one nvidia-smi process per setting "
+        "(default: NVML when running as root and the library loads)",
+    )
+
+
+def cpufreq_settings(args: argparse.Namespace) -> Dict:
+    return {"governor": args.governor, "epp": args.epp or None, "cpus": args.cpus}
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="nvidia-stability",
+        description="NVIDIA GPU configuration and optimization tool for all Linux distributions",
+    )
+    parser.add_argument("--version", action="version", version=f"%(prog)s {__version__}")
+    parser.add_argument("--refresh", action="store_true", help="Ignore the inventory cache and re-detect the system")
+    parser.add_argument("--debug", action="store_true", help="Print debug information such as cache statistics")
+    parser.add_argument("--trace-jsonl", metavar="PATH", help="Write per-step timing spans as JSON lines")
+    parser.add_argument("--trace-chrome", metavar="PATH", help="Write per-step timing spans as a Chrome trace file")
+    parser.add_argument("--profile", metavar="PATH", help="Write a cProfile dump of the run (view with pstats)")
+    subparsers = parser.add_subparsers(dest="command")
+
+    plan_parser = subparsers.add_parser("plan", help="Print the planned actions as JSON without applying them")
+    plan_parser.add_argument("-o", "--output", help="Write the plan to a file instead of stdout")
+    add_tuning_arguments(plan_parser)
+
+    apply_parser = subparsers.add_parser("apply", help="Apply the plan non-interactively, skipping satisfied steps")
+    apply_parser.add_argument("--force", action="store_true", help="Ignore the plan cache and run every step")
+    add_tuning_arguments(apply_parser)
+    apply_parser.add_argument(
+        "--step-timeout", type=float, default=PlanExecutor.STEP_TIMEOUT, help="Seconds before a step is killed",
+    )
+    add_backend_argument(apply_parser)
+
+    reapply_parser = subparsers.add_parser(
+        "reapply", help="Restore persisted GPU power limits, clocks and CPU governor (for boot)",
+    )
+    reapply_parser.add_argument(
+        "--install-unit", action="store_true", help=f"Install and enable the {SystemdUnit.NAME} systemd unit",
+    )
+    add_backend_argument(reapply_parser)
+
+    subparsers.add_parser(
+        "rollback", help="Restore the CPU governor, EPP and IRQ affinity values saved before the first apply",
+    )
+
+    reset_parser = subparsers.add_parser("reset-clocks", help="Undo application clocks and locked clocks")
+    reset_parser.add_argument(
+        "--workload", choices=NvidiaConfigurator.WORKLOADS,
+        help="Only undo the settings of this workload mode (default: every reset the GPU supports)",
+    )
+    add_backend_argument(reset_parser)
+
+    verify_parser = subparsers.add_parser(
+        "verify", help="Read back power limit, application clocks and persistence mode and report drift",
+    )
+    verify_parser.add_argument("--json", action="store_true", help="Print the drift report as JSON")
+    verify_parser.add_argument("--nvidia-smi", default="nvidia-smi", help="nvidia-smi binary used for the query")
+
+    reconcile_parser = subparsers.add_parser(
+        "reconcile", help="Re-apply only the GPU settings that drifted from the desired state",
+    )
+    reconcile_parser.add_argument("--interval", type=float, default=0, help="Repeat every N seconds (0 = run once)")
+    reconcile_parser.add_argument("--iterations", type=int, default=0, help="Stop after N runs (0 = forever)")
+    reconcile_parser.add_argument("--dry-run", action="store_true", help="Report drift without re-applying")
+    reconcile_parser.add_argument("--nvidia-smi", default="nvidia-smi", help="nvidia-smi binary used for the query")
+    add_backend_argument(reconcile_parser)
+
+    topology_parser = subparsers.add_parser("topology", help="Show each GPU's NUMA node, local CPUs and IRQ affinity")
+    topology_parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+
+    shader_parser = subparsers.add_parser(
+        "shader-cache", help="Report shader cache sizes and evict least recently used entries down to a budget",
+    )
+    shader_parser.add_argument("--path", help="Cache directory (default: this user's cache)")
+    shader_parser.add_argument("--all-users", action="store_true", help="Cover every user's cache on this machine")
+    shader_parser.add_argument(
+        "--budget", type=ShaderCacheManager.parse_size,
+        help="Evict least recently used entries until under this size, e.g. 2G",
+    )
+    shader_parser.add_argument("--dry-run", action="store_true", help="Show what would be evicted")
+    shader_parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+
+    bundle_parser = subparsers.add_parser(
+        "bundle", help="Download this distribution's driver packages into a content-addressed offline bundle",
+    )
+    bundle_parser.add_argument("path", help="Bundle directory, shared by every distribution and version")
+    bundle_parser.add_argument("--verify", action="store_true", help="Check the hash of every artifact in the bundle")
+
+    run_parser = subparsers.add_parser(
+        "run", help="Launch a command with a named environment profile, e.g. run --profile compute -- ./train",
+    )
+    run_parser.add_argument(
+        "--profile", dest="launch_profile", default="default", help="Launch profile to use (default: default)",
+    )
+    run_parser.add_argument("--list", action="store_true", help="List the available launch profiles")
+    run_parser.add_argument("argv", nargs=argparse.REMAINDER, help="Command to run, after --")
+
+    monitor_parser = subparsers.add_parser("monitor", help="Stream GPU telemetry from a single nvidia-smi process")
+    monitor_parser.add_argument("--interval", type=int, default=1000, help="Sampling interval in milliseconds")
+    monitor_parser.add_argument("--capacity", type=int, default=3600, help="Samples kept per GPU in the ring buffer")
+    monitor_parser.add_argument("--duration", type=float, default=0, help="Stop after this many seconds (0 = forever)")
+    monitor_parser.add_argument("--report-every", type=float, default=5, help="Seconds between summary lines")
+    monitor_parser.add_argument("--nvidia-smi", default="nvidia-smi", help="nvidia-smi binary to run")
+
+    export_parser = subparsers.add_parser(
+        "export", help="Serve GPU metrics for Prometheus over HTTP and/or as a node_exporter textfile",
+    )
+    export_parser.add_argument(
+        "--listen", default="127.0.0.1:9835", help="HOST:PORT to serve /metrics on (empty to disable)",
+    )
+    export_parser.add_argument("--textfile", help="Also write the metrics to this .prom file every interval")
+    export_parser.add_argument("--interval", type=float, default=5, help="Seconds a GPU query is reused for")
+    export_parser.add_argument("--duration", type=float, default=0, help="Stop after this many seconds (0 = forever)")
+    export_parser.add_argument("--nvidia-smi", default="nvidia-smi", help="nvidia-smi binary to query")
+
+    control_parser = subparsers.add_parser(
+        "control", help="Adjust power limits from live temperature, power and throttle telemetry",
+    )
+    control_parser.add_argument("--min-percent", type=float, default=70, help="Lowest power limit, as %% of TDP")
+    control_parser.add_argument("--max-percent", type=float, default=100, help="Highest power limit, as %% of TDP")
+    control_parser.add_argument("--target-temp", type=float, default=80, help="Target GPU temperature in C")
+    control_parser.add_argument("--hysteresis", type=float, default=3, help="Temperature dead band in C")
+    control_parser.add_argument("--step", type=int, default=10, help="Power limit change per adjustment in W")
+    control_parser.add_argument("--min-interval", type=float, default=10, help="Minimum seconds between changes")
+    control_parser.add_argument("--interval", type=float, default=1, help="Seconds between control iterations")
+    control_parser.add_argument("--iterations", type=int, default=0, help="Stop after N iterations (0 = forever)")
+    control_parser.add_argument("--trace", help="Replay telemetry from a CSV trace instead of nvidia-smi")
+    control_parser.add_argument("--dry-run", action="store_true", help="Print decisions without applying them")
+    control_parser.add_argument("--nvidia-smi", default="nvidia-smi", help="nvidia-smi binary used for telemetry")
+
+    fleet_parser = subparsers.add_parser("fleet", help="Run a command on every host of an inventory concurrently")
+    fleet_parser.add_argument("inventory", help="Inventory file: one host per line, with optional key=value options")
+    fleet_parser.add_argument(
+        "--command", dest="remote_command", choices=FleetRunner.COMMANDS, default="apply", help="Command run on each host",
+    )
+    fleet_parser.add_argument("--transport", choices=["ssh", "local"], default="ssh", help="How hosts are reached")
+    fleet_parser.add_argument("--parallel", type=int, default=16, help="Maximum hosts handled at once")
+    fleet_parser.add_argument("--timeout", type=float, default=1800, help="Seconds allowed per host and phase")
+    fleet_parser.add_argument("--force", action="store_true", help="Pass --force to apply on every host")
+    fleet_parser.add_argument(
+        "--offline", metavar="BUNDLE", help="Pass --offline BUNDLE to apply/plan; the path must exist on every host",
+    )
+    fleet_parser.add_argument("-o", "--output", help="Write per-host results and timings as JSON")
+
+    return parser
+
+
+def build_plan(args: argparse.Namespace, distro: Dict, gpus: List[Dict]) -> Optional[Dict]:
+    try:
+        return Planner.build(
+            distro, gpus, cpufreq_settings(args), args.irq_affinity, args.shader_cache, args.workload, args.prefetch,
+            args.offline, (DesiredState.load() or {}).get("workload"),
+        )
+    except ValueError as e:
+        print(f"[!] {e}", file=sys.stderr)
+        return None
+
+
+def cmd_plan(args: argparse.Namespace) -> int:
+    distro, gpus = detect_system(args.refresh, args.debug)
+    if not gpus:
+        print("No NVIDIA GPU detected.", file=sys.stderr)
+        return 1
+
+    plan = build_plan(args, distro, gpus)
+    if plan is None:
+        return 1
+    cached = PlanCache().load(plan["fingerprint"])
+    record = cached["record"] if cached else None
+    plan["pending"] = [step["id"] for step in Planner.pending_steps(plan, record)]
+
+    output = json.dumps(plan, indent=2)
+    if args.output:
+        Path(args.output).write_text(output + "\n")
+    else:
+        print(output)
+    return 0
+
+
+def print_command_output(cmd: str, line: str):
+    print(f"[debug] {cmd}: {line.rstrip()}", file=sys.stderr)
+
+
+def open_backend(choice: str) -> Optional[GPUBackend]:
+    backend = select_backend(choice)
+    if backend is None:
+        print(f"NVML ({NVMLBackend.LIBRARY}) could not be loaded or initialized.", file=sys.stderr)
+    return backend
+
+
+def run_plan(
+    plan: Dict, force: bool = False, timeout: float = PlanExecutor.STEP_TIMEOUT, debug: bool = False,
+    gpu_backend: Optional[GPUBackend] = None,
+) -> Dict:
+    cache = PlanCache()
+    cached = None if force else cache.load(plan["fingerprint"])
+    executor = PlanExecutor(
+        timeout=timeout, on_output=print_command_output if debug else None,
+        gpu_backend=gpu_backend if isinstance(gpu_backend, NVMLBackend) else None,
+    )
+    record = executor.execute(plan, cached["record"] if cached else None)
+    cache.save(plan, record)
+    DesiredState.save(DesiredState.from_plan(plan))
+    return record
+
+
+def cmd_apply(args: argparse.Namespace) -> int:
+    distro, gpus = detect_system(args.refresh, args.debug)
+    if not gpus:
+        print("[!] No NVIDIA GPU detected. Please ensure your GPU is properly connected.")
+        return 1
+
+    plan = build_plan(args, distro, gpus)
+    if plan is None:
+        return 1
+    backend = open_backend(args.backend)
+    if backend is None:
+        return 1
+    try:
+        record = run_plan(plan, force=args.force, timeout=args.step_timeout, debug=args.debug, gpu_backend=backend)
+    finally:
+        backend.close()
 
     print()
-    print_status(f"GPU Detected: {gpu_info['detected_name']}")
-    print_status(f"Matched Profile: {gpu_info['name']}")
-    print_status(f"TDP Limit: {gpu_info['tdp']}W")
-    print_status(f"Memory Clock: {gpu_info['mem_clock']}MHz")
-    print_status(f"Graphics Clock: {gpu_info['graphics_clock']}MHz")
+    print_status(f"Plan {plan['fingerprint']} applied", record["applied"])
+    return 0 if record["applied"] else 1
 
-    print("\n" + "=" * 60)
-    print("Starting installation and configuration...")
-    print("=" * 60 + "\n")
 
-    pkg_manager = PackageManager(distro_family, distro_id, distro_version)
-    install_commands = pkg_manager.get_install_commands()
+def cmd_reapply(args: argparse.Namespace) -> int:
+    if args.install_unit:
+        success = SystemdUnit.install()
+        print_status(f"Installed and enabled {SystemdUnit.NAME}", success)
+        return 0 if success else 1
 
-    if install_commands:
-        print("Installing NVIDIA drivers and dependencies...\n")
-        for cmd in install_commands:
-            print(f"  Running: {cmd}")
-            success, output = SystemConfigurator.run_command(cmd)
-            print_status(f"  {cmd[:50]}...", success)
+    state = DesiredState.load()
+    if state is None:
+        print(f"No desired state at {DesiredState.path()}; run 'apply' first.", file=sys.stderr)
+        return 1
+
+    backend = open_backend(args.backend)
+    if backend is None:
+        return 1
+    try:
+        outcome = DesiredState.reapply(state, backend=backend)
+    finally:
+        backend.close()
+    for cmd, success in outcome["results"]:
+        print_status(cmd, success)
+    print(
+        f"Reapplied {len(outcome['results'])} settings in {outcome['total_ms']:.1f} ms "
+        f"(tool overhead {outcome['overhead_ms']:.1f} ms, commands {outcome['command_ms']:.1f} ms)"
+    )
+    return 0 if outcome["success"] else 1
+
+
+def print_telemetry(latest: Dict[str, Dict[str, float]]):
+    for bus_id, sample in sorted(latest.items()):
+        reasons = sample["clocks_throttle_reasons.active"]
+        print(
+            f"  {bus_id}: {sample['temperature.gpu']:.0f}C {sample['power.draw']:.1f}/{sample['power.limit']:.0f}W "
+            f"sm {sample['clocks.sm']:.0f}MHz mem {sample['clocks.mem']:.0f}MHz "
+            f"util {sample['utilization.gpu']:.0f}% throttle {f'0x{int(reasons):x}' if reasons == reasons else 'n/a'}"
+        )
+
+
+def cmd_monitor(args: argparse.Namespace) -> int:
+    sampler = TelemetrySampler(args.interval, args.capacity, nvidia_smi=args.nvidia_smi)
+    if not sampler.start():
+        print(f"Could not start {args.nvidia_smi}", file=sys.stderr)
+        return 1
+
+    deadline = time.monotonic() + args.duration if args.duration else None
+    try:
+        while sampler.process.poll() is None:
+            sleep_for = args.report_every
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                sleep_for = min(sleep_for, remaining)
+            time.sleep(sleep_for)
+            print_telemetry(sampler.latest())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        sampler.stop()
+
+    print_telemetry(sampler.latest())
+    stats = sampler.stats()
+    print(
+        f"Parsed {stats['samples']} samples from {stats['gpus']} GPU(s) "
+        f"({stats['errors']} malformed), {stats['samples_per_second']:.0f} samples/s"
+    )
+    return 0
+
+
+def cmd_export(args: argparse.Namespace) -> int:
+    if not args.listen and not args.textfile:
+        print("Nothing to do: give --listen and/or --textfile.", file=sys.stderr)
+        return 2
+
+    exporter = PrometheusExporter(GPUScrapeCache(args.interval, args.nvidia_smi))
+    if args.listen:
+        host, _, port = args.listen.rpartition(":")
+        try:
+            host, port = exporter.serve(host or "127.0.0.1", int(port))
+        except (OSError, ValueError) as e:
+            print(f"Cannot listen on {args.listen}: {e}", file=sys.stderr)
+            return 1
+        print(f"Serving metrics on http://{host}:{port}/metrics")
+
+    deadline = time.monotonic() + args.duration if args.duration else None
+    success = True
+    try:
+        while deadline is None or time.monotonic() < deadline:
+            if args.textfile:
+                success = exporter.write_textfile(args.textfile)
+                if not success:
+                    print(f"Cannot write {args.textfile}", file=sys.stderr)
+            sleep_for = args.interval
+            if deadline is not None:
+                sleep_for = max(min(sleep_for, deadline - time.monotonic()), 0)
+            time.sleep(sleep_for)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        exporter.stop()
+
+    stats = exporter.cache.stats()
+    print(
+        f"Served {stats['requests']} scrapes with {stats['queries']} nvidia-smi queries "
+        f"({stats['hit_ratio']:.0%} cache hits)"
+    )
+    return 0 if success else 1
 
-    configurator = NvidiaConfigurator(gpu_info)
 
-    print("\nConfiguring NVIDIA power management...")
-    for cmd in configurator.get_nvidia_smi_commands():
-        success, _ = SystemConfigurator.run_command(cmd)
-        print_status(f"  {cmd}", success)
+def cmd_control(args: argparse.Namespace) -> int:
+    state = DesiredState.load()
+    if state is not None:
+        gpus = state["gpus"]
+    else:
+        _, gpus = detect_system(args.refresh, args.debug)
+    if not gpus:
+        print("No NVIDIA GPU detected.", file=sys.stderr)
+        return 1
+
+    controller = PowerLimitController(
+        gpus,
+        min_percent=args.min_percent,
+        max_percent=args.max_percent,
+        target_temp=args.target_temp,
+        hysteresis=args.hysteresis,
+        step_watts=args.step,
+        min_interval=args.min_interval,
+    )
+
+    sampler = None
+    if args.trace:
+        source = TraceMetricsSource.from_csv(args.trace)
+        interval = 0.0
+    else:
+        sampler = TelemetrySampler(int(args.interval * 1000), capacity=60, nvidia_smi=args.nvidia_smi)
+        if not sampler.start():
+            print(f"Could not start {args.nvidia_smi}", file=sys.stderr)
+            return 1
+        source = SamplerMetricsSource(sampler)
+        interval = args.interval
+
+    print("Adjusting power limits...")
+    try:
+        controller.run(
+            source,
+            None if args.dry_run else SystemConfigurator.run_command,
+            interval=interval,
+            iterations=args.iterations,
+            clock=(lambda: float(source.position) * args.interval) if args.trace else time.monotonic,
+        )
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if sampler:
+            sampler.stop()
+
+    for bus_id, state in sorted(controller.gpus.items()):
+        print_status(f"  {bus_id}: {state['limit']}W ({state['min_watts']}-{state['max_watts']}W)")
+    return 0
+
+
+def run_interactive(args: argparse.Namespace) -> int:
+    print_banner()
+
+    if os.geteuid() != 0:
+        print("Warning: Running without root privileges. Some operations may require sudo.")
+        print()
+
+    print("Detecting system configuration...\n")
 
-    print("\nSetting GPU clocks...")
-    for cmd in configurator.get_clock_commands():
-        success, _ = SystemConfigurator.run_command(cmd)
-        print_status(f"  {cmd}", success)
+    distro, gpus = detect_system(args.refresh, args.debug)
+    if not gpus:
+        print_system(distro, gpus)
+        print("\n[!] No NVIDIA GPU detected. Please ensure your GPU is properly connected.")
+        return 1
 
-    print("\nCreating Xorg configuration...")
-    xorg_config = configurator.create_xorg_config()
-    success = SystemConfigurator.write_xorg_config(xorg_config)
-    print_status("  /etc/X11/xorg.conf.d/20-nvidia.conf", success)
+    print_system(distro, gpus)
 
-    print("\nUpdating user profile with optimizations...")
-    exports = configurator.get_profile_exports()
-    success = SystemConfigurator.update_profile(exports)
-    print_status("  ~/.profile updated", success)
+    print("\n" + "=" * 60)
+    print("Starting installation and configuration...")
+    print("=" * 60)
 
-    print("\nSetting CPU governor to performance...")
-    success = SystemConfigurator.set_cpu_governor(distro_family)
-    print_status("  CPU governor set to performance", success)
+    run_plan(
+        Planner.build(distro, gpus, previous_workload=(DesiredState.load() or {}).get("workload")), debug=args.debug,
+    )
 
     if SystemConfigurator.ask_restart():
         print("\nRestarting system in 5 seconds...")
@@ -603,6 +4137,369 @@ def main():
     else:
         print("\nPlease restart your system manually to apply all changes.")
         print("Command: sudo reboot")
+    return 0
+
+
+def print_fleet_result(result: Dict):
+    failed = sum(1 for step in result["steps"] if step.get("success") is False)
+    detail = result.get("error") or f"exit {result['exit_code']}"
+    print_status(
+        f"{result['host']}: {detail}, {'upload' if result['uploaded'] else 'cached'} {result['upload_ms']:.0f} ms, "
+        f"run {result['run_ms']:.0f} ms, "
+        f"{len(result['steps'])} steps ({failed} failed)",
+        result["ok"],
+    )
+
+
+def cmd_fleet(args: argparse.Namespace) -> int:
+    try:
+        hosts = FleetInventory.load(args.inventory)
+    except OSError as e:
+        print(f"Cannot read inventory {args.inventory}: {e}", file=sys.stderr)
+        return 1
+    if not hosts:
+        print(f"No hosts in {args.inventory}", file=sys.stderr)
+        return 1
+
+    control_dir = tempfile.mkdtemp(prefix="nvs-ssh-")
+    if args.transport == "local":
+        factory: Callable[[Dict], Transport] = LocalTransport
+    else:
+        def factory(host: Dict) -> Transport:
+            return SSHTransport(host, control_dir)
+
+    extra_args = ["--force"] if args.force and args.remote_command == "apply" else []
+    if args.offline and args.remote_command in ("apply", "plan"):
+        extra_args += ["--offline", args.offline]
+    runner = FleetRunner(hosts, factory, args.parallel, args.timeout, args.remote_command, extra_args)
+
+    print(f"Running '{args.remote_command}' on {len(hosts)} hosts ({runner.parallel} at a time)...")
+    start = time.perf_counter()
+    results = runner.run(print_fleet_result)
+    elapsed = time.perf_counter() - start
+    try:
+        os.rmdir(control_dir)
+    except OSError:
+        pass
+
+    succeeded = sum(1 for result in results if result["ok"])
+    print(f"\n{succeeded}/{len(results)} hosts succeeded in {elapsed:.1f} s")
+    if args.output:
+        Path(args.output).write_text(json.dumps({"elapsed_s": elapsed, "hosts": results}, indent=2) + "\n")
+    return 0 if succeeded == len(results) else 1
+
+
+def cmd_rollback(args: argparse.Namespace) -> int:
+    cpufreq = CPUFreqController().rollback()
+    irqs = TopologyTuner().rollback()
+    if cpufreq is None and irqs is None:
+        print(
+            f"Nothing to roll back: neither {CPUFreqController.rollback_path()} "
+            f"nor {TopologyTuner.rollback_path()} exists.",
+            file=sys.stderr,
+        )
+        return 1
+
+    success = True
+    if cpufreq is not None:
+        print_status(
+            f"Restored CPU governor/EPP on {cpufreq['cpus']} CPUs ({cpufreq['changed']} values)", cpufreq["success"],
+        )
+        success = success and cpufreq["success"]
+    if irqs is not None:
+        print_status(f"Restored affinity of {irqs['irqs']} interrupts ({irqs['changed']} values)", irqs["success"])
+        success = success and irqs["success"]
+    for outcome in (cpufreq, irqs):
+        for path in (outcome or {}).get("failed", []):
+            print_status(f"  {path}", False)
+    return 0 if success else 1
+
+
+def cmd_reset_clocks(args: argparse.Namespace) -> int:
+    state = DesiredState.load()
+    if state:
+        gpus = state["gpus"]
+    else:
+        _, gpus = detect_system(args.refresh, args.debug)
+    if not gpus:
+        print("No NVIDIA GPU detected.", file=sys.stderr)
+        return 1
+
+    groups = [
+        (
+            gpu_info.get("bus_id", ""),
+            NvidiaConfigurator(gpu_info, args.workload).get_reset_settings() if args.workload
+            else NvidiaConfigurator(gpu_info).get_all_reset_settings(),
+        )
+        for gpu_info in gpus
+    ]
+    backend = open_backend(args.backend)
+    if backend is None:
+        return 1
+    try:
+        results = backend.apply_groups(groups, "reset")
+    finally:
+        backend.close()
+    for group in results:
+        for cmd, success in group:
+            print_status(cmd, success)
+    return 0 if all(success for group in results for _, success in group) else 1
+
+
+def print_drift(drift: List[Dict]):
+    for item in drift:
+        print_status(f"{item['gpu']} {item['field']}: expected {item['expected']}, found {item['actual']}", False)
+
+
+def load_reconciler(args: argparse.Namespace) -> Optional[DriftReconciler]:
+    state = DesiredState.load()
+    if state is None:
+        print(f"No desired state at {DesiredState.path()}; run 'apply' first.", file=sys.stderr)
+        return None
+    return DriftReconciler(state, args.nvidia_smi)
+
+
+def cmd_verify(args: argparse.Namespace) -> int:
+    reconciler = load_reconciler(args)
+    if reconciler is None:
+        return 1
+
+    outcome = reconciler.reconcile(dry_run=True)
+    if outcome["error"]:
+        print(f"GPU query failed: {outcome['error']}", file=sys.stderr)
+        return 1
+    if args.json:
+        print(json.dumps({"drift": outcome["drift"], "query_ms": outcome["query_ms"]}, indent=2))
+    elif outcome["drift"]:
+        print_drift(outcome["drift"])
+    else:
+        print_status(f"All {len(reconciler.desired)} GPU(s) match the desired state ({outcome['query_ms']:.1f} ms)")
+    return 1 if outcome["drift"] else 0
+
+
+def cmd_reconcile(args: argparse.Namespace) -> int:
+    reconciler = load_reconciler(args)
+    if reconciler is None:
+        return 1
+    backend = None if args.dry_run else open_backend(args.backend)
+    if backend is None and not args.dry_run:
+        return 1
+
+    success = True
+    iteration = 0
+    try:
+        while True:
+            iteration += 1
+            outcome = reconciler.reconcile(backend, args.dry_run)
+            success = outcome["success"]
+            if outcome["error"]:
+                print(f"GPU query failed: {outcome['error']}", file=sys.stderr)
+            print_drift(outcome["drift"])
+            for label, applied in outcome["applied"]:
+                print_status(f"  {label}", applied)
+            if outcome["drift"] or args.debug:
+                print(f"{len(outcome['drift'])} drifted setting(s), query {outcome['query_ms']:.1f} ms")
+
+            if not args.interval or (args.iterations and iteration >= args.iterations):
+                break
+            time.sleep(args.interval)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if backend:
+            backend.close()
+    return 0 if success else 1
+
+
+def cmd_topology(args: argparse.Namespace) -> int:
+    _, gpus = detect_system(args.refresh, args.debug)
+    if not gpus:
+        print("No NVIDIA GPU detected.", file=sys.stderr)
+        return 1
+
+    topology = TopologyTuner().gpu_topology(gpus)
+    if args.json:
+        print(json.dumps(topology, indent=2))
+        return 0
+
+    for entry in topology:
+        numa_node = "unknown" if entry["numa_node"] is None or entry["numa_node"] < 0 else entry["numa_node"]
+        print(f"{entry['bus_id']} {entry['name']}")
+        print(f"  NUMA node:  {numa_node}")
+        print(f"  Local CPUs: {entry['local_cpus'] or 'unknown'}")
+        if not entry["irqs"]:
+            print("  IRQs:       none found in /proc/interrupts")
+        for irq in entry["irqs"]:
+            placement = "local" if irq["local"] else "includes remote CPUs"
+            print_status(f"  IRQ {irq['irq']}: CPUs {irq['affinity'] or 'unknown'} ({placement})", irq["local"])
+    return 0
+
+
+def cmd_shader_cache(args: argparse.Namespace) -> int:
+    if args.all_users:
+        caches = ShaderCacheManager.user_caches()
+    else:
+        manager = ShaderCacheManager(args.path)
+        filesystem = ShaderCacheManager.filesystem_type(str(manager.cache_dir))
+        caches = [dict(manager.usage(), user=os.environ.get("USER", ""), filesystem=filesystem)]
+
+    success = True
+    if args.budget is not None:
+        for cache in caches:
+            outcome = ShaderCacheManager(cache["path"]).evict(args.budget, args.dry_run)
+            cache.update(evicted=len(outcome["removed"]), freed=outcome["freed"], bytes=outcome["remaining"])
+            success = success and not outcome["failed"]
+
+    if args.json:
+        print(json.dumps(caches, indent=2))
+        return 0 if success else 1
+
+    if not caches:
+        print("No shader caches found.")
+    for cache in caches:
+        line = f"{cache['user'] or '-':<16} {ShaderCacheManager.format_size(cache['bytes']):>10}  {cache['path']}"
+        if cache["filesystem"] in ShaderCacheManager.NETWORK_FILESYSTEMS:
+            line += f" ({cache['filesystem']})"
+        print(line)
+        if "evicted" in cache:
+            verb = "Would evict" if args.dry_run else "Evicted"
+            print(f"  {verb} {cache['evicted']} entries, {ShaderCacheManager.format_size(cache['freed'])}")
+    return 0 if success else 1
+
+
+def cmd_bundle(args: argparse.Namespace) -> int:
+    bundle = OfflineBundle(args.path)
+    if args.verify:
+        targets = bundle.load()["targets"]
+        problems = bundle.verify()
+        for problem in problems:
+            print_status(f"{problem['target']}: {problem['name']} ({problem['error']})", False)
+        artifacts = sum(len(entry["artifacts"]) for entry in targets.values())
+        print_status(f"{artifacts} artifacts for {len(targets)} targets checked in {bundle.path}", not problems)
+        return 0 if targets and not problems else 1
+
+    distro, _ = detect_system(args.refresh, args.debug)
+    plan = PackageManager(distro["family"], distro["id"], distro["version"]).get_plan()
+    if not OfflineBundle.supported(plan["manager"]):
+        print(f"[!] Offline bundles are not supported on {distro['name']}", file=sys.stderr)
+        return 1
+
+    templates = PACKAGE_MANAGERS[plan["manager"]]
+    commands = list(plan["repos"])
+    if plan["refresh"] and templates["refresh"]:
+        commands.append(templates["refresh"])
+    for cmd in commands:
+        with TRACER.span(cmd, "bundle"):
+            success, output = SystemConfigurator.run_command(cmd)
+        print_status(cmd, success)
+        if not success:
+            print(output.strip()[-2000:], file=sys.stderr)
+            return 1
+
+    key = OfflineBundle.target_key(distro)
+    packages = OfflineBundle.bundle_packages(plan)
+    bundle.path.mkdir(parents=True, exist_ok=True)
+    download_dir = Path(tempfile.mkdtemp(prefix="download-", dir=bundle.path))
+    try:
+        (download_dir / "partial").mkdir()
+        cmd = templates["bundle"].format(dir=shlex.quote(str(download_dir)), packages=" ".join(packages))
+        with TRACER.span(cmd, "bundle"):
+            success, output = SystemConfigurator.run_command(cmd)
+        print_status(cmd, success)
+        if not success:
+            print(output.strip()[-2000:], file=sys.stderr)
+            return 1
+        stats = bundle.add(key, plan["manager"], packages, download_dir)
+    finally:
+        shutil.rmtree(download_dir, ignore_errors=True)
+
+    print_status(
+        f"{key}: {stats['artifacts']} artifacts, {stats['added']} added "
+        f"({ShaderCacheManager.format_size(stats['bytes'])}), {stats['deduplicated']} already in the bundle",
+        stats["artifacts"] > 0,
+    )
+    return 0 if stats["artifacts"] else 1
+
+
+def cmd_run(args: argparse.Namespace) -> int:
+    store = LaunchProfiles()
+    try:
+        profiles = store.load()
+    except ValueError as e:
+        print(f"Invalid launch profiles in {store.path}: {e}", file=sys.stderr)
+        return 2
+
+    if args.list:
+        for name, profile in profiles.items():
+            print(f"{name:<14} {profile['description']}")
+        return 0
+
+    argv = args.argv[1:] if args.argv[:1] == ["--"] else args.argv
+    if not argv:
+        print("No command given: nvidia-stability run --profile NAME -- COMMAND [ARGS...]", file=sys.stderr)
+        return 2
+    if args.launch_profile not in profiles:
+        print(f"Unknown launch profile {args.launch_profile!r}; choose from: {', '.join(profiles)}", file=sys.stderr)
+        return 2
+
+    env = LaunchProfiles.environment(profiles[args.launch_profile], os.environ)
+    try:
+        os.execvpe(argv[0], argv, env)
+    except OSError as e:
+        print(f"Cannot run {argv[0]}: {e}", file=sys.stderr)
+        return 127
+    return 0
+
+
+COMMANDS = {
+    "plan": cmd_plan,
+    "apply": cmd_apply,
+    "reapply": cmd_reapply,
+    "rollback": cmd_rollback,
+    "topology": cmd_topology,
+    "verify": cmd_verify,
+    "reconcile": cmd_reconcile,
+    "export": cmd_export,
+    "reset-clocks": cmd_reset_clocks,
+    "shader-cache": cmd_shader_cache,
+    "bundle": cmd_bundle,
+    "run": cmd_run,
+    "monitor": cmd_monitor,
+    "control": cmd_control,
+    "fleet": cmd_fleet,
+}
+
+
+def write_diagnostics(args: argparse.Namespace, profiler: Optional["cProfile.Profile"]):
+    if profiler:
+        profiler.disable()
+        profiler.dump_stats(args.profile)
+        print(f"cProfile written to {args.profile}", file=sys.stderr)
+    for path, fmt in ((args.trace_jsonl, "jsonl"), (args.trace_chrome, "chrome")):
+        if path:
+            if TRACER.write(path, fmt):
+                print(f"Trace written to {path}", file=sys.stderr)
+            else:
+                print(f"Failed to write trace to {path}", file=sys.stderr)
+
+
+def main(argv: Optional[List[str]] = None):
+    args = build_parser().parse_args(argv)
+    command = COMMANDS.get(args.command, run_interactive)
+
+    TRACER.reset()
+    profiler = None
+    if args.profile:
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
+    try:
+        with TRACER.span(args.command or "interactive", "run") as span:
+            exit_code = command(args)
+            span["exit_code"] = exit_code
+    finally:
+        write_diagnostics(args, profiler)
+    sys.exit(exit_code)
 
 
 if __name__ == "__main__":
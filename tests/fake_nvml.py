@@ -0,0 +1,113 @@
+import threading
+import time
+from typing import Dict, List, Optional
+
+from nvidia_stability import normalize_bus_id
+
+
+class FakeNVML:
+    ERRORS = {
+        0: "Success",
+        2: "Invalid Argument",
+        3: "Not Supported",
+        4: "Insufficient Permissions",
+        6: "Not Found",
+        1: "Uninitialized",
+    }
+
+    def __init__(self, gpus: List[Dict], latency: float = 0.0):
+        self.latency = latency
+        self.devices = []
+        self.by_bus_id = {}
+        for gpu_info in gpus:
+            tdp_mw = gpu_info["tdp"] * 1000
+            device = {
+                "bus_id": gpu_info["bus_id"],
+                "persistence": 0,
+                "power_limit": tdp_mw,
+                "power_limit_range": (tdp_mw // 2, tdp_mw * 6 // 5),
+                "application_clocks": None,
+                "locked_gpu_clocks": None,
+                "locked_memory_clocks": None,
+            }
+            self.by_bus_id[normalize_bus_id(gpu_info["bus_id"])] = len(self.devices)
+            self.devices.append(device)
+        self.inits = 0
+        self.calls = 0
+        self.initialized = False
+        self._lock = threading.Lock()
+
+    def _call(self) -> Optional[int]:
+        with self._lock:
+            self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        return None if self.initialized else 1
+
+    def _device(self, handle) -> Dict:
+        return self.devices[handle.value - 1]
+
+    def nvmlInit_v2(self) -> int:
+        self.inits += 1
+        self.initialized = True
+        return 0
+
+    def nvmlShutdown(self) -> int:
+        self.initialized = False
+        return 0
+
+    def nvmlErrorString(self, code: int) -> bytes:
+        return self.ERRORS.get(code, "Unknown Error").encode()
+
+    def nvmlDeviceGetHandleByPciBusId_v2(self, bus_id: bytes, handle_ref) -> int:
+        error = self._call()
+        if error:
+            return error
+        index = self.by_bus_id.get(normalize_bus_id(bus_id.decode()))
+        if index is None:
+            return 6
+        handle_ref._obj.value = index + 1
+        return 0
+
+    def nvmlDeviceSetPersistenceMode(self, handle, enabled: int) -> int:
+        error = self._call()
+        if error:
+            return error
+        self._device(handle)["persistence"] = enabled
+        return 0
+
+    def nvmlDeviceSetPowerManagementLimit(self, handle, milliwatts: int) -> int:
+        error = self._call()
+        if error:
+            return error
+        device = self._device(handle)
+        low, high = device["power_limit_range"]
+        if not low <= milliwatts <= high:
+            return 2
+        device["power_limit"] = milliwatts
+        return 0
+
+    def _set(self, handle, key: str, value) -> int:
+        error = self._call()
+        if error:
+            return error
+        self._device(handle)[key] = value
+        return 0
+
+    def nvmlDeviceSetApplicationsClocks(self, handle, mem: int, graphics: int) -> int:
+        return self._set(handle, "application_clocks", (mem, graphics))
+
+    def nvmlDeviceResetApplicationsClocks(self, handle) -> int:
+        return self._set(handle, "application_clocks", None)
+
+    def nvmlDeviceSetGpuLockedClocks(self, handle, low: int, high: int) -> int:
+        return self._set(handle, "locked_gpu_clocks", (low, high))
+
+    def nvmlDeviceResetGpuLockedClocks(self, handle) -> int:
+        return self._set(handle, "locked_gpu_clocks", None)
+
+    def nvmlDeviceSetMemoryLockedClocks(self, handle, low: int, high: int) -> int:
+        return self._set(handle, "locked_memory_clocks", (low, high))
+
+    def nvmlDeviceResetMemoryLockedClocks(self, handle) -> int:
+        return self._set(handle, "locked_memory_clocks", None)
@@ -129,6 +129,43 @@ test_get_gpu_specs_gtx_1660_super() {
     assert_equals "1785" "$graphics_clock" "GTX 1660 SUPER graphics_clock is 1785"
 }
 
+test_get_gpu_specs_lspci_device_id() {
+    echo "Testing get_gpu_specs for an lspci line with a PCI device ID..."
+    local result
+    result=$(get_gpu_specs "01:00.0 VGA compatible controller [0300]: NVIDIA Corporation GA102 [10de:2206] (rev a1)")
+
+    IFS='|' read -r tdp mem_clock graphics_clock <<< "$result"
+
+    assert_equals "320" "$tdp" "10de:2206 (RTX 3080) TDP is 320W"
+    assert_equals "1710" "$graphics_clock" "10de:2206 (RTX 3080) graphics_clock is 1710"
+}
+
+test_get_gpu_specs_titan_xp() {
+    echo "Testing get_gpu_specs for TITAN Xp..."
+    local result
+    result=$(get_gpu_specs "NVIDIA TITAN Xp")
+
+    IFS='|' read -r tdp mem_clock graphics_clock <<< "$result"
+
+    assert_equals "1426" "$mem_clock" "TITAN Xp mem_clock is 1426"
+}
+
+test_distro_families_table() {
+    echo "Testing distro family lookup table..."
+    local family
+    family=$(awk -F'\t' '$1 == "manjaro" { print $2; exit }' "$DISTRO_FAMILIES_FILE")
+
+    assert_equals "arch" "$family" "manjaro maps to the arch family"
+}
+
+test_get_distro_family_globs() {
+    echo "Testing get_distro_family for glob entries..."
+
+    assert_equals "suse" "$(get_distro_family "opensuse-leap")" "opensuse-leap maps to the suse family"
+    assert_equals "suse" "$(get_distro_family "opensuse-slowroll")" "opensuse-slowroll matches the opensuse* entry"
+    assert_equals "unknown" "$(get_distro_family "plan9")" "plan9 has no family"
+}
+
 test_get_gpu_specs_unknown() {
     echo "Testing get_gpu_specs for unknown GPU..."
     local result
@@ -176,6 +213,18 @@ run_all_tests() {
     test_get_gpu_specs_gtx_1660_super
     echo ""
 
+    test_get_gpu_specs_lspci_device_id
+    echo ""
+
+    test_get_gpu_specs_titan_xp
+    echo ""
+
+    test_distro_families_table
+    echo ""
+
+    test_get_distro_family_globs
+    echo ""
+
     test_get_gpu_specs_unknown
     echo ""
 
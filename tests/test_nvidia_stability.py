@@ -1,8 +1,17 @@
 #!/usr/bin/env python3
 
+import argparse
 import pytest
+import json
 import sys
 import os
+import pstats
+import shutil
+import subprocess
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
 
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
 
@@ -13,7 +22,65 @@ from nvidia_stability import (  # noqa: E402
     NvidiaConfigurator,
     GPU_POWER_LIMITS,
     DISTRO_FAMILIES,
+    PCI_DEVICE_IDS,
+    GPUProfileIndex,
+    DataStore,
+    DATA_FILE,
+    PackageQuery,
+    Planner,
+    PlanCache,
+    PlanExecutor,
+    SystemConfigurator,
+    DesiredState,
+    SystemdUnit,
+    InventoryCache,
+    TelemetryRing,
+    TelemetrySampler,
+    TELEMETRY_FIELDS,
+    PowerLimitController,
+    TraceMetricsSource,
+    Tracer,
+    FleetInventory,
+    FleetRunner,
+    LocalTransport,
+    Transport,
+    SSHTransport,
+    CPUFreqController,
+    TopologyTuner,
+    ShaderCacheManager,
+    LaunchProfiles,
+    GPUScrapeCache,
+    PrometheusExporter,
+    GPUBackend,
+    NVMLBackend,
+    NvidiaSMIBackend,
+    DriftReconciler,
+    OfflineBundle,
 )
+import nvidia_stability  # noqa: E402
+from tests.fake_nvml import FakeNVML  # noqa: E402
+
+SLEEP = shutil.which("sleep")
+DEBIAN_12 = {"id": "debian", "name": "Debian GNU/Linux", "version": "12", "family": "debian"}
+
+
+def make_pci_device(sysfs_root, bus_id, vendor, device, pci_class, subsystem_vendor="0x1043", subsystem_device="0x87b3"):
+    device_dir = sysfs_root / "bus" / "pci" / "devices" / bus_id
+    device_dir.mkdir(parents=True)
+    (device_dir / "vendor").write_text(f"{vendor}\n")
+    (device_dir / "device").write_text(f"{device}\n")
+    (device_dir / "class").write_text(f"{pci_class}\n")
+    (device_dir / "subsystem_vendor").write_text(f"{subsystem_vendor}\n")
+    (device_dir / "subsystem_device").write_text(f"{subsystem_device}\n")
+    return device_dir
+
+
+def make_fake_bin(bin_dir, name, script):
+    bin_dir.mkdir(parents=True, exist_ok=True)
+    path = bin_dir / name
+    path.write_text("#!/bin/sh\n" + script)
+    path.chmod(0o755)
+    return path
 
 
 class TestDistroDetector:
@@ -23,6 +90,11 @@ class TestDistroDetector:
         assert DistroDetector.get_family("linuxmint") == "debian"
         assert DistroDetector.get_family("pop") == "debian"
 
+    def test_get_family_glob(self):
+        assert DistroDetector.get_family("opensuse-slowroll") == "suse"
+        assert DistroDetector.get_family("opensuse-leap") == "suse"
+        assert DistroDetector.get_family("plan9") == "unknown"
+
     def test_get_family_rhel(self):
         assert DistroDetector.get_family("fedora") == "rhel"
         assert DistroDetector.get_family("centos") == "rhel"
@@ -95,6 +167,161 @@ class TestGPUDetector:
         assert "GTX 1080 Ti" in result or "GeForce" in result
 
 
+class TestGPUProfileIndex:
+    def test_every_profile_is_an_exact_hit(self):
+        index = GPUProfileIndex.default()
+        for known_gpu in GPU_POWER_LIMITS:
+            assert index.by_name[GPUProfileIndex.normalize(known_gpu)] == known_gpu
+            assert index.lookup(known_gpu) == known_gpu
+
+    def test_marketing_name_variants(self):
+        index = GPUProfileIndex.default()
+        assert index.lookup("NVIDIA GeForce RTX 4070 Ti SUPER") == "RTX 4070 Ti SUPER"
+        assert index.lookup("geforce rtx 4070 super") == "RTX 4070 SUPER"
+        assert index.lookup("RTX4060Ti") == "RTX 4060 Ti"
+        assert index.lookup("NVIDIA TITAN RTX") == "TITAN RTX"
+        assert index.lookup("GeForce GTX TITAN X") == "GTX TITAN X"
+
+    def test_partial_names_use_token_fallback(self):
+        index = GPUProfileIndex.default()
+        assert index.lookup("GA102 [GeForce RTX 3080 Lite Hash Rate]") == "RTX 3080"
+        assert index.lookup("TU116 [GeForce GTX 1660 SUPER]") == "GTX 1660 SUPER"
+        assert index.lookup("GA104 [GeForce RTX 3060 Ti GDDR6X]") == "RTX 3060 Ti"
+
+    def test_model_number_must_match_whole_token(self):
+        index = GPUProfileIndex.default()
+        assert index.lookup("RTX 40700") is None
+        assert index.lookup("RTX A4000") is None
+
+    def test_pci_device_id_lookup(self):
+        index = GPUProfileIndex.default()
+        assert index.lookup("10de:2206") == "RTX 3080"
+        assert index.lookup("NVIDIA Corporation Device [10DE:2684]") == "RTX 4090"
+        assert index.lookup("10de:ffff") is None
+
+    def test_custom_tables(self):
+        index = GPUProfileIndex({"RTX 5090": {}}, {"2b85": "RTX 5090", "0000": "RTX 9999"})
+        assert index.lookup("GeForce RTX 5090") == "RTX 5090"
+        assert index.lookup("10de:2b85") == "RTX 5090"
+        assert index.lookup("10de:0000") is None
+
+
+class TestGPUSysfsDetection:
+    def test_scan_sysfs_keeps_only_nvidia_display_devices(self, tmp_path):
+        make_pci_device(tmp_path, "0000:00:02.0", "0x8086", "0x4680", "0x030000")
+        make_pci_device(tmp_path, "0000:01:00.0", "0x10de", "0x2206", "0x030000")
+        make_pci_device(tmp_path, "0000:01:00.1", "0x10de", "0x1aef", "0x040300")
+        devices = GPUDetector.scan_sysfs(str(tmp_path))
+        assert devices == [{
+            "bus_id": "0000:01:00.0",
+            "device_id": "2206",
+            "subsystem_vendor_id": "1043",
+            "subsystem_device_id": "87b3",
+        }]
+
+    def test_scan_sysfs_accepts_3d_controller(self, tmp_path):
+        make_pci_device(tmp_path, "0000:3b:00.0", "0x10de", "0x2204", "0x030200")
+        devices = GPUDetector.scan_sysfs(str(tmp_path))
+        assert [d["bus_id"] for d in devices] == ["0000:3b:00.0"]
+
+    def test_scan_sysfs_missing_root(self, tmp_path):
+        assert GPUDetector.scan_sysfs(str(tmp_path / "missing")) == []
+
+    def test_detect_sysfs_matches_profile_by_device_id(self, tmp_path):
+        make_pci_device(tmp_path, "0000:01:00.0", "0x10de", "0x2684", "0x030000")
+        result = GPUDetector.detect(str(tmp_path))
+        assert result["name"] == "RTX 4090"
+        assert result["tdp"] == 450
+        assert result["bus_id"] == "0000:01:00.0"
+        assert result["device_id"] == "2684"
+
+    def test_detect_sysfs_unknown_device_id_uses_defaults(self, tmp_path):
+        make_pci_device(tmp_path, "0000:01:00.0", "0x10de", "0xffff", "0x030000")
+        result = GPUDetector.detect_sysfs(str(tmp_path))[0]
+        assert result["tdp"] == 150
+        assert "10de:ffff" in result["detected_name"]
+
+    def test_detect_falls_back_to_lspci(self, tmp_path, monkeypatch):
+        make_fake_bin(
+            tmp_path / "bin", "lspci",
+            'echo "01:00.0 VGA compatible controller [0300]: NVIDIA Corporation GeForce GTX 1080 [GTX 1080]"\n',
+        )
+        monkeypatch.setenv("PATH", str(tmp_path / "bin"))
+        result = GPUDetector.detect(str(tmp_path / "sys"))
+        assert result["name"] == "GTX 1080"
+        assert result["bus_id"] == "0000:01:00.0"
+
+    def test_pci_device_ids_map_to_known_profiles(self):
+        for device_id, gpu_name in PCI_DEVICE_IDS.items():
+            assert gpu_name in GPU_POWER_LIMITS, f"{device_id} maps to unknown profile {gpu_name}"
+
+
+class TestMultiGPU:
+    def test_detect_all_returns_every_gpu_by_bus_id(self, tmp_path):
+        make_pci_device(tmp_path, "0000:81:00.0", "0x10de", "0x2204", "0x030000")
+        make_pci_device(tmp_path, "0000:01:00.0", "0x10de", "0x2684", "0x030000")
+        make_pci_device(tmp_path, "0000:41:00.0", "0x10de", "0x1b06", "0x030200")
+        gpus = GPUDetector.detect_all(str(tmp_path))
+        assert [(g["bus_id"], g["name"]) for g in gpus] == [
+            ("0000:01:00.0", "RTX 4090"),
+            ("0000:41:00.0", "GTX 1080 Ti"),
+            ("0000:81:00.0", "RTX 3090"),
+        ]
+
+    def test_detect_all_lspci_fallback_lists_every_gpu(self, tmp_path, monkeypatch):
+        make_fake_bin(
+            tmp_path / "bin", "lspci",
+            'echo "01:00.0 VGA compatible controller [0300]: NVIDIA Corporation [RTX 4090]"\n'
+            'echo "01:00.1 Audio device [0403]: NVIDIA Corporation AD102 High Definition Audio Controller"\n'
+            'echo "02:00.0 3D controller [0302]: NVIDIA Corporation [RTX 3090]"\n',
+        )
+        monkeypatch.setenv("PATH", str(tmp_path / "bin"))
+        gpus = GPUDetector.detect_all(str(tmp_path / "sys"))
+        assert [(g["bus_id"], g["name"]) for g in gpus] == [
+            ("0000:01:00.0", "RTX 4090"),
+            ("0000:02:00.0", "RTX 3090"),
+        ]
+
+    def test_commands_target_bus_id(self):
+        gpu_info = {"name": "RTX 3080", "tdp": 320, "mem_clock": 1188, "graphics_clock": 1710, "bus_id": "0000:01:00.0"}
+        config = NvidiaConfigurator(gpu_info)
+        assert config.get_nvidia_smi_commands() == [
+            "nvidia-smi -i 0000:01:00.0 -pm 1",
+            "nvidia-smi -i 0000:01:00.0 -pl 320",
+        ]
+        assert config.get_clock_commands() == ["nvidia-smi -i 0000:01:00.0 -ac 1188,1710"]
+
+    def test_apply_configures_each_gpu_with_its_profile(self):
+        gpus = [
+            dict(GPUDetector._get_gpu_info("RTX 4090"), bus_id="0000:01:00.0"),
+            dict(GPUDetector._get_gpu_info("RTX 3090"), bus_id="0000:02:00.0"),
+        ]
+        executed = []
+
+        def run_command(cmd):
+            executed.append(cmd)
+            return "0000:02:00.0 -ac" not in cmd, ""
+
+        groups = [(gpu["bus_id"], NvidiaConfigurator(gpu).get_settings()) for gpu in gpus]
+        results = NvidiaSMIBackend(run_command).apply_groups(groups)
+        assert all(success for _, success in results[0])
+        assert not all(success for _, success in results[1])
+        assert "nvidia-smi -i 0000:01:00.0 -pl 450" in executed
+        assert "nvidia-smi -i 0000:02:00.0 -pl 350" in executed
+
+    def test_apply_runs_gpus_in_parallel(self):
+        gpus = [dict(GPUDetector._get_gpu_info("RTX 4090"), bus_id=f"0000:0{i}:00.0") for i in range(4)]
+
+        def run_command(cmd):
+            time.sleep(0.05)
+            return True, ""
+
+        groups = [(gpu["bus_id"], NvidiaConfigurator(gpu).get_settings()) for gpu in gpus]
+        start = time.monotonic()
+        NvidiaSMIBackend(run_command).apply_groups(groups)
+        assert time.monotonic() - start < 0.05 * 3 * 2
+
+
 class TestPackageManager:
     def test_debian_commands(self):
         pm = PackageManager("debian", "debian", "12")
@@ -158,6 +385,141 @@ class TestPackageManager:
         assert any("eopkg" in cmd for cmd in commands)
 
 
+class TestPackagePlan:
+    def test_debian_runs_one_refresh_and_one_install(self):
+        commands = PackageManager("debian", "debian", "12").get_install_commands()
+        assert commands.count("apt update") == 1
+        installs = [cmd for cmd in commands if cmd.startswith("apt install")]
+        assert installs == [
+            "apt install -y linux-headers-$(uname -r) build-essential dkms nvidia-driver firmware-misc-nonfree"
+        ]
+
+    def test_ubuntu_driver_tool_with_ordered_fallbacks(self):
+        commands = PackageManager("debian", "ubuntu", "22.04").get_install_commands()
+        assert commands[0] == "add-apt-repository -y -n ppa:graphics-drivers/ppa || true"
+        assert commands.count("apt update") == 1
+        assert commands[-1] == "ubuntu-drivers install nvidia || apt install -y nvidia-driver-550 || apt install -y nvidia-driver"
+
+    def test_fedora_single_install_transaction(self):
+        commands = PackageManager("rhel", "fedora", "39").get_install_commands()
+        assert len(commands) == 2
+        assert "rpmfusion-free" in commands[0] and "rpmfusion-nonfree" in commands[0]
+        assert commands[1] == "dnf install -y kernel-devel kernel-headers akmod-nvidia xorg-x11-drv-nvidia-cuda"
+
+    def test_suse_alternatives_share_one_transaction(self):
+        plan = PackageManager("suse", "opensuse-leap", "15.5").get_plan()
+        assert plan["alternatives"] == [["nvidia-video-G06", "nvidia-gl-G06"], ["nvidia-gfxG05-kmp-default"]]
+        commands = PackageManager.render_plan(plan)
+        assert commands[-1] == (
+            "zypper install -y kernel-devel nvidia-video-G06 nvidia-gl-G06"
+            " || zypper install -y kernel-devel nvidia-gfxG05-kmp-default"
+        )
+
+    def test_prefetch_downloads_driver_while_build_dependencies_install(self, monkeypatch):
+        monkeypatch.setenv("NVIDIA_STABILITY_CACHE_DIR", "/cache")
+        plan = dict(PackageManager("debian", "debian", "12").get_plan(), prefetch=True)
+        phases = PackageManager.render_phases(plan)
+        assert [phase for phase, _ in phases] == ["refresh", "prefetch", "build", "install", "post", "post"]
+        assert phases[1][1] == (
+            "mkdir -p /cache/packages/partial && apt-get install -y --download-only -o Debug::NoLocking=1"
+            " -o Dir::Cache::archives=/cache/packages nvidia-driver firmware-misc-nonfree || true"
+        )
+        assert phases[2][1] == "apt install -y linux-headers-$(uname -r) build-essential dkms"
+        assert phases[3][1] == (
+            "apt install -y -o Dir::Cache::archives=/cache/packages nvidia-driver firmware-misc-nonfree"
+        )
+        assert "--download-only" not in " ".join(PackageManager("debian", "debian", "12").get_install_commands())
+
+    def test_prefetch_commands_per_manager(self):
+        expected = {
+            ("rhel", "fedora", "39"): "dnf install -y --downloadonly kernel-devel",
+            ("arch", "arch", ""): "pacman -Syw --noconfirm --needed linux-headers",
+            ("suse", "opensuse-leap", "15.5"): "zypper --non-interactive install --download-only kernel-devel "
+            "nvidia-video-G06 nvidia-gl-G06 ||",
+        }
+        for (family, distro_id, version), prefix in expected.items():
+            plan = dict(PackageManager(family, distro_id, version).get_plan(), prefetch=True)
+            prefetch = [cmd for phase, cmd in PackageManager.render_phases(plan) if phase == "prefetch"]
+            assert len(prefetch) == 1 and prefetch[0].startswith(prefix)
+        alpine = dict(PackageManager("alpine", "alpine", "3.19").get_plan(), prefetch=True)
+        assert "prefetch" not in [phase for phase, _ in PackageManager.render_phases(alpine)]
+
+    def test_driver_tool_prefetches_only_fixed_packages(self):
+        plan = dict(PackageManager("debian", "ubuntu", "22.04").get_plan(), prefetch=True)
+        prefetch = [cmd for phase, cmd in PackageManager.render_phases(plan) if phase == "prefetch"]
+        assert prefetch and "nvidia-driver" not in prefetch[0]
+
+    def test_arch_folds_refresh_into_install(self):
+        commands = PackageManager("arch", "arch", "").get_install_commands()
+        assert commands == ["pacman -Sy --noconfirm --needed linux-headers nvidia nvidia-utils nvidia-settings"]
+
+    def test_unknown_family_has_empty_plan(self):
+        assert PackageManager("unknown", "foo", "").get_install_commands() == []
+
+
+class TestPackageQuery:
+    def test_dpkg_query_batches_candidates(self, tmp_path, monkeypatch):
+        make_fake_bin(
+            tmp_path / "bin", "dpkg-query",
+            'echo "$@" > "${0%/*}/args"\n'
+            'printf "build-essential\\tii \\ndkms\\trc \\nfirmware-misc-nonfree\\tii \\n"\n'
+            'echo "dpkg-query: no packages found matching nvidia-driver" >&2\n'
+            "exit 1\n",
+        )
+        monkeypatch.setenv("PATH", str(tmp_path / "bin"))
+        installed = PackageQuery.installed("apt", ["build-essential", "dkms", "firmware-misc-nonfree", "nvidia-driver"])
+        assert installed == {"build-essential", "firmware-misc-nonfree"}
+        assert (tmp_path / "bin" / "args").read_text().split()[-4:] == [
+            "build-essential", "dkms", "firmware-misc-nonfree", "nvidia-driver",
+        ]
+
+    def test_rpm_query(self, tmp_path, monkeypatch):
+        make_fake_bin(
+            tmp_path / "bin", "rpm",
+            'echo "kernel-devel"\necho "package akmod-nvidia is not installed"\nexit 1\n',
+        )
+        monkeypatch.setenv("PATH", str(tmp_path / "bin"))
+        assert PackageQuery.installed("dnf", ["kernel-devel", "akmod-nvidia"]) == {"kernel-devel"}
+
+    def test_pacman_query(self, tmp_path, monkeypatch):
+        make_fake_bin(
+            tmp_path / "bin", "pacman",
+            'echo "nvidia 550.78-1"\necho "error: package \'nvidia-settings\' was not found" >&2\nexit 1\n',
+        )
+        monkeypatch.setenv("PATH", str(tmp_path / "bin"))
+        assert PackageQuery.installed("pacman", ["nvidia", "nvidia-settings"]) == {"nvidia"}
+
+    def test_xbps_query_lists_installed_names(self):
+        output = "ii nvidia-550.78_1   NVIDIA drivers\nii linux-headers-6.6_1 Linux headers\n"
+        assert PackageQuery._parse_xbps(output) == {"nvidia", "linux-headers"}
+
+    def test_missing_query_binary_returns_none(self, tmp_path, monkeypatch):
+        monkeypatch.setenv("PATH", str(tmp_path / "empty"))
+        assert PackageQuery.installed("apk", ["nvidia-driver"]) is None
+        assert PackageQuery.installed("emerge", ["x11-drivers/nvidia-drivers"]) is None
+
+    def test_converged_host_skips_refresh(self, tmp_path, monkeypatch):
+        make_fake_bin(tmp_path / "bin", "apk", 'for p in "$@"; do [ "$p" = info ] || [ "$p" = -e ] || echo "$p"; done\n')
+        monkeypatch.setenv("PATH", str(tmp_path / "bin"))
+        plan = PackageManager("alpine", "alpine", "3.18").get_pending_plan()
+        assert PackageManager.render_plan(plan) == []
+
+    def test_partial_install_keeps_refresh_and_missing_packages(self):
+        plan = PackageManager("debian", "debian", "12").get_plan()
+        pending = PackageManager.prune_plan(plan, {"build-essential", "dkms"})
+        commands = PackageManager.render_plan(pending)
+        assert commands[0] == "apt update"
+        assert commands[1] == "apt install -y linux-headers-$(uname -r) nvidia-driver firmware-misc-nonfree"
+
+    def test_provides_satisfies_driver_tool(self):
+        plan = PackageManager("debian", "ubuntu", "22.04").get_plan()
+        installed = {
+            PackageQuery.expand("linux-headers-$(uname -r)"), "build-essential", "dkms", "nvidia-driver-535",
+        }
+        pending = PackageManager.prune_plan(plan, installed)
+        assert PackageManager.render_plan(pending) == []
+
+
 class TestNvidiaConfigurator:
     def test_xorg_config_rtx_40(self):
         gpu_info = {"name": "RTX 4090", "tdp": 450, "mem_clock": 1313, "graphics_clock": 2520}
@@ -193,6 +555,20 @@ class TestNvidiaConfigurator:
         commands = config.get_clock_commands()
         assert "nvidia-smi -ac 1188,1710" in commands
 
+    def test_latency_workload_locks_clocks(self):
+        gpu_info = {"name": "RTX 3080", "tdp": 320, "mem_clock": 1188, "graphics_clock": 1710, "bus_id": "0000:01:00.0"}
+        config = NvidiaConfigurator(gpu_info, "compute-latency")
+        assert config.get_clock_commands() == [
+            "nvidia-smi -i 0000:01:00.0 --lock-gpu-clocks=1440,1440",
+            "nvidia-smi -i 0000:01:00.0 --lock-memory-clocks=1188,1188",
+        ]
+        assert config.get_reset_commands() == [
+            "nvidia-smi -i 0000:01:00.0 --reset-gpu-clocks",
+            "nvidia-smi -i 0000:01:00.0 --reset-memory-clocks",
+        ]
+        with pytest.raises(ValueError):
+            NvidiaConfigurator(gpu_info, "mining")
+
     def test_profile_exports(self):
         gpu_info = {"name": "RTX 3080", "tdp": 320, "mem_clock": 1188, "graphics_clock": 1710}
         config = NvidiaConfigurator(gpu_info)
@@ -237,5 +613,1510 @@ class TestDistroFamilies:
         assert len(all_distros) == len(set(all_distros)), "Duplicate distros found"
 
 
+def make_cpus(sysfs_root, count, governor="powersave", epp="balance_performance"):
+    for cpu in range(count):
+        cpufreq = sysfs_root / "devices" / "system" / "cpu" / f"cpu{cpu}" / "cpufreq"
+        cpufreq.mkdir(parents=True)
+        (cpufreq / "scaling_governor").write_text(f"{governor}\n")
+        if epp:
+            (cpufreq / "energy_performance_preference").write_text(f"{epp}\n")
+    (sysfs_root / "devices" / "system" / "cpu" / "cpufreq").mkdir(exist_ok=True)
+
+
+@pytest.fixture
+def fake_root(tmp_path, monkeypatch):
+    home = tmp_path / "home"
+    home.mkdir()
+    monkeypatch.setenv("HOME", str(home))
+    monkeypatch.setenv("PATH", str(tmp_path / "bin"))
+    monkeypatch.setenv("NVIDIA_STABILITY_CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.setenv("NVIDIA_STABILITY_STATE_DIR", str(tmp_path / "state"))
+    monkeypatch.setenv("NVIDIA_STABILITY_ROOT", str(tmp_path))
+    monkeypatch.setattr(nvidia_stability.os, "geteuid", lambda: 0)
+    monkeypatch.setattr(NVMLBackend, "LIBRARY", str(tmp_path / "libnvidia-ml.so.1"))
+    make_cpus(tmp_path / "sys", 4)
+    return tmp_path
+
+
+def two_gpus():
+    return [
+        dict(GPUDetector._get_gpu_info("RTX 4090"), bus_id="0000:01:00.0", device_id="2684"),
+        dict(GPUDetector._get_gpu_info("RTX 3090"), bus_id="0000:02:00.0", device_id="2204"),
+    ]
+
+
+class RecordingRunner:
+    def __init__(self):
+        self.commands = []
+
+    def __call__(self, cmd):
+        self.commands.append(cmd)
+        return True, ""
+
+
+class TestPlanner:
+    def test_plan_lists_every_action(self, fake_root):
+        plan = Planner.build(DEBIAN_12, two_gpus())
+        kinds = [step["kind"] for step in plan["steps"]]
+        assert kinds.count("package") == 6
+        assert kinds.count("gpu") == 6
+        assert kinds[-3:] == ["xorg", "profile", "governor"]
+        assert "Coolbits" in plan["steps"][-3]["content"]
+        json.dumps(plan)
+
+    def test_xorg_path_follows_root_at_runtime(self, fake_root, monkeypatch):
+        assert str(SystemConfigurator.XORG_CONFIG_PATH) == "/etc/X11/xorg.conf.d/20-nvidia.conf"
+        assert Planner.build(DEBIAN_12, two_gpus())["steps"][-3]["path"] == str(
+            fake_root / "etc" / "X11" / "xorg.conf.d" / "20-nvidia.conf"
+        )
+        monkeypatch.delenv("NVIDIA_STABILITY_ROOT")
+        assert SystemConfigurator.xorg_config_path() == SystemConfigurator.XORG_CONFIG_PATH
+
+    def test_fingerprint_depends_on_inputs(self, monkeypatch):
+        gpus = two_gpus()
+        fingerprint = Planner.fingerprint(DEBIAN_12, gpus)
+        assert fingerprint == Planner.fingerprint(dict(DEBIAN_12), two_gpus())
+        assert fingerprint != Planner.fingerprint(dict(DEBIAN_12, version="13"), gpus)
+        assert fingerprint != Planner.fingerprint(DEBIAN_12, gpus[:1])
+        monkeypatch.setattr(nvidia_stability.platform, "release", lambda: "0.0.0-test")
+        assert fingerprint != Planner.fingerprint(DEBIAN_12, gpus)
+
+    def test_plan_cache_roundtrip(self, fake_root):
+        plan = Planner.build(DEBIAN_12, two_gpus())
+        cache = PlanCache()
+        assert cache.load(plan["fingerprint"]) is None
+        assert cache.save(plan, {"completed": []})
+        assert cache.load(plan["fingerprint"])["plan"]["steps"] == plan["steps"]
+
+    def test_apply_then_reapply_is_a_noop(self, fake_root):
+        plan = Planner.build(DEBIAN_12, two_gpus())
+        runner = RecordingRunner()
+        record = PlanExecutor(runner).execute(plan, None)
+        assert record["applied"] is True
+        assert "apt update" in runner.commands
+        assert "nvidia-smi -i 0000:02:00.0 -pl 350" in runner.commands
+        assert SystemConfigurator.xorg_config_path().read_text() == plan["steps"][-3]["content"]
+
+        second = RecordingRunner()
+        record = PlanExecutor(second).execute(plan, record)
+        assert second.commands == []
+        assert record["applied"] is True
+
+    def test_new_boot_reapplies_runtime_steps_only(self, fake_root, monkeypatch):
+        plan = Planner.build(DEBIAN_12, two_gpus())
+        record = PlanExecutor(RecordingRunner()).execute(plan, None)
+        monkeypatch.setattr(nvidia_stability, "get_boot_id", lambda: "another-boot")
+
+        runner = RecordingRunner()
+        PlanExecutor(runner).execute(plan, record)
+        assert all(cmd.startswith("nvidia-smi") for cmd in runner.commands)
+        assert len(runner.commands) == 6
+
+    def test_governor_step_is_satisfied_by_sysfs_state(self, fake_root):
+        plan = Planner.build(DEBIAN_12, two_gpus(), {"cpus": "0-1"})
+        governor = plan["steps"][-1]
+        assert governor["id"] == "governor:performance/performance/0-1"
+        assert not Planner.is_satisfied(governor, None)
+        PlanExecutor(RecordingRunner()).execute(plan, None)
+        assert Planner.is_satisfied(governor, None)
+
+    def test_failed_package_step_is_retried(self, fake_root):
+        plan = Planner.build(DEBIAN_12, two_gpus())
+        record = PlanExecutor(lambda cmd: (not cmd.startswith("apt install"), "")).execute(plan, None)
+        assert record["applied"] is False
+
+        runner = RecordingRunner()
+        PlanExecutor(runner).execute(plan, record)
+        assert runner.commands[:2] == ["apt update", plan["steps"][1]["command"]]
+
+    def test_cli_plan_outputs_json(self, fake_root, monkeypatch, capsys):
+        monkeypatch.setattr(GPUDetector, "detect_all", staticmethod(lambda sysfs_root="/sys": two_gpus()))
+        with pytest.raises(SystemExit) as exc:
+            nvidia_stability.main(["plan"])
+        assert exc.value.code == 0
+        plan = json.loads(capsys.readouterr().out)
+        assert plan["pending"]
+        assert PlanCache().load(plan["fingerprint"]) is None
+
+        cache = PlanCache()
+        record = {"completed": plan["pending"][:1], "boot_id": nvidia_stability.get_boot_id()}
+        cache.save(plan, record)
+        before = cache.path(plan["fingerprint"]).read_bytes()
+        with pytest.raises(SystemExit):
+            nvidia_stability.main(["plan"])
+        pending = json.loads(capsys.readouterr().out)["pending"]
+        assert pending == [step["id"] for step in Planner.pending_steps(plan, record)] and pending != plan["pending"]
+        assert cache.path(plan["fingerprint"]).read_bytes() == before
+
+    def test_cli_plan_against_fake_root(self, fake_root, monkeypatch, capsys):
+        (fake_root / "etc").mkdir()
+        (fake_root / "etc" / "os-release").write_text('NAME="Fedora Linux"\nID=fedora\nVERSION_ID=40\n')
+        make_pci_device(fake_root / "sys", "0000:01:00.0", "0x10de", "0x2684", "0x030000")
+        monkeypatch.setenv("NVIDIA_STABILITY_ROOT", str(fake_root))
+        with pytest.raises(SystemExit) as exc:
+            nvidia_stability.main(["plan"])
+        assert exc.value.code == 0
+        plan = json.loads(capsys.readouterr().out)
+        assert plan["distro"]["family"] == "rhel"
+        assert [gpu["name"] for gpu in plan["gpus"]] == ["RTX 4090"]
+
+
+class TestAsyncExecutor:
+    def test_dependency_graph(self):
+        steps = Planner.build(DEBIAN_12, two_gpus())["steps"]
+        deps = PlanExecutor.dependencies(steps)
+        ids = [step["id"] for step in steps]
+        assert deps[ids[0]] == [] and deps[ids[1]] == [ids[0]] and deps[ids[2]] == [ids[0]]
+        assert deps[ids[3]] == [ids[2], ids[1]] and deps[ids[4]] == [ids[3]] and deps[ids[5]] == [ids[4]]
+        assert deps["gpu:nvidia-smi -i 0000:01:00.0 -pm 1"] == [ids[5]]
+        assert deps["gpu:nvidia-smi -i 0000:01:00.0 -pl 450"] == ["gpu:nvidia-smi -i 0000:01:00.0 -pm 1"]
+        assert deps["gpu:nvidia-smi -i 0000:02:00.0 -pm 1"] == [ids[5]]
+        assert deps[ids[-3]] == [] and deps[ids[-2]] == [] and deps[ids[-1]] == []
+
+    def test_independent_steps_overlap(self, fake_root):
+        make_fake_bin(fake_root / "bin", "nvidia-smi", f"{SLEEP} 0.3\n")
+        plan = Planner.build(DEBIAN_12, two_gpus())
+        plan["steps"] = [step for step in plan["steps"] if "-pm 1" in step.get("command", "")]
+
+        start = time.perf_counter()
+        record = PlanExecutor().execute(plan, None)
+        assert record["applied"] is True
+        assert time.perf_counter() - start < 0.55
+
+    def test_output_order_is_deterministic(self, fake_root, capsys):
+        plan = Planner.build(DEBIAN_12, two_gpus())
+        runner = RecordingRunner()
+        PlanExecutor(runner).execute(plan, None)
+        out = capsys.readouterr().out
+        kinds = {step["kind"] for step in plan["steps"]}
+        positions = [out.index(title) for kind, title in PlanExecutor.SECTIONS.items() if kind in kinds]
+        assert len(positions) == len(kinds)
+        assert positions == sorted(positions)
+        gpu_lines = [line for line in out.splitlines() if "nvidia-smi" in line]
+        assert [line.split("   ", 1)[1] for line in gpu_lines] == [
+            step["command"] for step in plan["steps"] if step["kind"] == "gpu"
+        ]
+
+    def test_prefetch_overlaps_build_dependencies_and_lowers_wall_time(self, fake_root, capsys):
+        log = fake_root / "apt.log"
+        make_fake_bin(fake_root / "bin", "mkdir", "")
+        make_fake_bin(fake_root / "bin", "apt-get", f'echo "download $*" >> {log}\n{SLEEP} 0.4\n')
+        make_fake_bin(
+            fake_root / "bin", "apt",
+            f'echo "apt $1" >> {log}\ncase "$*" in *dkms*) {SLEEP} 0.3 ;; *) {SLEEP} 0.05 ;; esac\n',
+        )
+        plan = Planner.build(DEBIAN_12, two_gpus())
+        plan["steps"] = [step for step in plan["steps"] if step["kind"] == "package"]
+
+        executor = PlanExecutor()
+        start = time.perf_counter()
+        record = executor.execute(plan, None)
+        wall_ms = (time.perf_counter() - start) * 1000
+        assert record["applied"] is True
+        lines = [line.split()[:2] for line in log.read_text().splitlines()]
+        assert lines[0] == ["apt", "update"] and lines[-3:] == [["apt", "install"], ["apt", "-t"], ["apt", "-t"]]
+        assert sorted(lines[1:3]) == [["apt", "install"], ["download", "install"]]
+
+        ids = {step["phase"]: step["id"] for step in plan["steps"]}
+        assert executor.timings[ids["build"]][0] < executor.timings[ids["prefetch"]][1]
+        assert executor.timings[ids["install"]][0] >= executor.timings[ids["prefetch"]][1]
+        assert set(record["phases"]) == {"refresh", "prefetch", "build", "install", "post"}
+        assert record["prefetch_overlap_ms"] >= 250
+        assert wall_ms < sum(record["phases"].values()) - 200
+        assert "prefetch overlapped" in capsys.readouterr().out
+
+        steps = [{"id": "a", "kind": "package", "phase": "prefetch"}, {"id": "b", "kind": "xorg"}]
+        assert PlanExecutor.overlap_ms(steps, {"a": (1.0, 2.0), "b": (1.5, 3.0)}, "prefetch") == 500
+
+    def test_failed_prefetch_falls_back_to_install(self, fake_root):
+        make_fake_bin(fake_root / "bin", "apt-get", "exit 100\n")
+        make_fake_bin(fake_root / "bin", "apt", "exit 0\n")
+        plan = Planner.build(DEBIAN_12, two_gpus())
+        plan["steps"] = [step for step in plan["steps"] if step["kind"] == "package"]
+        assert PlanExecutor().execute(plan, None)["applied"] is True
+        no_prefetch = Planner.build(DEBIAN_12, two_gpus(), prefetch=False)
+        assert "prefetch" not in [step.get("phase") for step in no_prefetch["steps"]]
+
+    def test_timeout_kills_step_and_streams_output(self, fake_root):
+        make_fake_bin(fake_root / "bin", "nvidia-smi", f"echo started\nexec {SLEEP} 30\n")
+        plan = Planner.build(DEBIAN_12, two_gpus()[:1])
+        plan["steps"] = [step for step in plan["steps"] if step["kind"] == "gpu"][:1]
+        lines = []
+
+        start = time.perf_counter()
+        record = PlanExecutor(timeout=0.3, on_output=lambda cmd, line: lines.append(line)).execute(plan, None)
+        assert time.perf_counter() - start < 5
+        assert record["applied"] is False
+        assert lines == ["started\n"]
+
+
+class TestCPUFreq:
+    def read_governors(self, sysfs):
+        controller = CPUFreqController(str(sysfs))
+        return {cpu: values["governor"] for cpu, values in controller.read(controller.online_cpus()).items()}
+
+    def test_parse_cpu_list(self):
+        assert CPUFreqController.parse_cpu_list("0-3,8, 10-11,") == [0, 1, 2, 3, 8, 10, 11]
+
+    def test_applies_to_a_subset(self, tmp_path):
+        make_cpus(tmp_path, 8)
+        outcome = CPUFreqController(str(tmp_path)).apply("performance", "performance", "2-3,6")
+        assert (outcome["success"], outcome["cpus"], outcome["changed"]) == (True, 3, 6)
+        governors = self.read_governors(tmp_path)
+        assert [cpu for cpu, governor in governors.items() if governor == "performance"] == [2, 3, 6]
+
+    def test_skips_unchanged_and_missing_epp(self, tmp_path):
+        make_cpus(tmp_path, 2, governor="performance", epp=None)
+        outcome = CPUFreqController(str(tmp_path)).apply("performance", "performance")
+        assert (outcome["success"], outcome["changed"]) == (True, 0)
+        assert CPUFreqController(str(tmp_path)).is_applied("performance", "performance")
+
+    def test_no_cpufreq_interface(self, tmp_path):
+        outcome = CPUFreqController(str(tmp_path)).apply("performance", None)
+        assert outcome["success"] is False and "no cpufreq interface" in outcome["error"]
+
+    def test_non_root_uses_one_process_per_value(self, tmp_path, monkeypatch):
+        make_cpus(tmp_path, 128)
+        calls = []
+
+        def run_command(cmd, sudo=True):
+            calls.append(cmd)
+            return True, ""
+
+        monkeypatch.setattr(nvidia_stability.os, "geteuid", lambda: 1000)
+        monkeypatch.setattr(SystemConfigurator, "run_command", staticmethod(run_command))
+        outcome = CPUFreqController(str(tmp_path)).apply("performance", "performance")
+        assert outcome["changed"] == 256
+        assert len(calls) == 2
+        assert calls[0].startswith("printf %s performance | sudo tee ") and calls[0].count("scaling_governor") == 128
+
+    def test_rollback_restores_original_values(self, fake_root):
+        sysfs = fake_root / "sys"
+        nvidia_stability.apply_cpufreq("performance", "performance", "0-1")
+        nvidia_stability.apply_cpufreq("schedutil", None, "")
+        assert set(self.read_governors(sysfs).values()) == {"schedutil"}
+
+        with pytest.raises(SystemExit) as exc:
+            nvidia_stability.main(["rollback"])
+        assert exc.value.code == 0
+        assert set(self.read_governors(sysfs).values()) == {"powersave"}
+        controller = CPUFreqController(str(sysfs))
+        assert {values["epp"] for values in controller.read([0, 1, 2, 3]).values()} == {"balance_performance"}
+        assert not CPUFreqController.rollback_path().exists()
+
+
+def make_topology(root, gpus):
+    lines = ["           CPU0       CPU1\n", "   0:         44          0   IO-APIC    2-edge      timer\n"]
+    for bus_id, numa_node, local_cpus, irqs in gpus:
+        device = root / "sys" / "bus" / "pci" / "devices" / bus_id
+        (device / "msi_irqs").mkdir(parents=True)
+        (device / "numa_node").write_text(f"{numa_node}\n")
+        (device / "local_cpulist").write_text(f"{local_cpus}\n")
+        for irq in irqs:
+            (device / "msi_irqs" / str(irq)).write_text("msi\n")
+            (root / "proc" / "irq" / str(irq)).mkdir(parents=True)
+            (root / "proc" / "irq" / str(irq) / "smp_affinity_list").write_text("0-3\n")
+            lines.append(f" {irq}:     123456          0  PCI-MSI 524288-edge      nvidia\n")
+    (root / "proc").mkdir(exist_ok=True)
+    (root / "proc" / "interrupts").write_text("".join(lines))
+
+
+class TestTopology:
+    @pytest.fixture
+    def topology(self, fake_root):
+        make_topology(fake_root, [("0000:01:00.0", 0, "0-1", [130, 131]), ("0000:02:00.0", 1, "2-3", [140])])
+        return fake_root
+
+    def affinity(self, root, irq):
+        return (root / "proc" / "irq" / str(irq) / "smp_affinity_list").read_text().strip()
+
+    def test_format_cpu_list(self):
+        assert CPUFreqController.format_cpu_list([5, 0, 1, 2, 7, 6, 9]) == "0-2,5-7,9"
+        assert CPUFreqController.format_cpu_list([]) == ""
+
+    def test_reads_numa_node_and_device_irqs(self, topology):
+        report = TopologyTuner().gpu_topology(two_gpus())
+        assert [(entry["numa_node"], entry["local_cpus"]) for entry in report] == [(0, "0-1"), (1, "2-3")]
+        assert [[irq["irq"] for irq in entry["irqs"]] for entry in report] == [[130, 131], [140]]
+        assert not any(irq["local"] for entry in report for irq in entry["irqs"])
+        assert TopologyTuner().local_cpus(two_gpus()) == "0-3"
+
+    def test_single_gpu_falls_back_to_all_nvidia_irqs(self, fake_root):
+        make_topology(fake_root, [("0000:01:00.0", 0, "0-1", [130])])
+        shutil.rmtree(fake_root / "sys" / "bus" / "pci" / "devices" / "0000:01:00.0" / "msi_irqs")
+        assert TopologyTuner().gpu_irqs("0000:01:00.0") == [130]
+        assert TopologyTuner().gpu_irqs("0000:01:00.0", gpu_count=2) == []
+
+    def test_apply_pins_irqs_and_local_governor(self, topology):
+        plan = Planner.build(DEBIAN_12, two_gpus(), {"cpus": "local"}, irq_affinity=True)
+        irq_steps = [step for step in plan["steps"] if step["kind"] == "irq"]
+        assert [(step["gpu"], step["cpus"]) for step in irq_steps] == [("0000:01:00.0", "0-1"), ("0000:02:00.0", "2-3")]
+        assert [step["cpus"] for step in plan["steps"] if step["kind"] == "governor"] == ["0-3"]
+
+        PlanExecutor(RecordingRunner()).execute(plan, None)
+        assert [self.affinity(topology, irq) for irq in (130, 131, 140)] == ["0-1", "0-1", "2-3"]
+        assert all(Planner.is_satisfied(step, None) for step in irq_steps)
+        assert DesiredState.from_plan(plan)["irq_affinity"][1] == {"gpu": "0000:02:00.0", "cpus": "2-3", "gpu_count": 2}
+
+        with pytest.raises(SystemExit) as exc:
+            nvidia_stability.main(["rollback"])
+        assert exc.value.code == 0
+        assert [self.affinity(topology, irq) for irq in (130, 131, 140)] == ["0-3", "0-3", "0-3"]
+        assert not TopologyTuner.rollback_path().exists()
+
+    def test_cli_topology_report(self, topology, monkeypatch, capsys):
+        monkeypatch.setattr(nvidia_stability, "detect_system", lambda refresh, debug: (DEBIAN_12, two_gpus()))
+        with pytest.raises(SystemExit) as exc:
+            nvidia_stability.main(["topology", "--json"])
+        assert exc.value.code == 0
+        report = json.loads(capsys.readouterr().out)
+        assert report[1]["bus_id"] == "0000:02:00.0" and report[1]["irqs"] == [
+            {"irq": 140, "affinity": "0-3", "local": False}
+        ]
+
+
+def make_shader_cache(cache_dir, entries):
+    for offset, (name, size) in enumerate(entries):
+        entry = cache_dir / "GLCache" / name
+        entry.mkdir(parents=True)
+        for suffix in ("bin", "toc"):
+            path = entry / f"{name}.{suffix}"
+            path.write_bytes(b"x" * (size // 2))
+            os.utime(path, (1_000_000 + offset * 100, 1_000_000 + offset * 100))
+
+
+class TestShaderCache:
+    def test_parse_and_format_sizes(self):
+        assert ShaderCacheManager.parse_size("2G") == 2 * 1024 ** 3
+        assert ShaderCacheManager.parse_size("512MiB") == 512 * 1024 ** 2
+        assert ShaderCacheManager.parse_size("1.5k") == 1536
+        assert ShaderCacheManager.parse_size("100") == 100
+        with pytest.raises(argparse.ArgumentTypeError):
+            ShaderCacheManager.parse_size("abc")
+        assert ShaderCacheManager.format_size(3 * 1024 ** 2) == "3.0 MiB"
+
+    def test_usage_groups_files_by_directory(self, tmp_path):
+        make_shader_cache(tmp_path, [("a", 1000), ("b", 2000)])
+        (tmp_path / "loose.bin").write_bytes(b"x" * 10)
+        usage = ShaderCacheManager(str(tmp_path)).usage()
+        assert (usage["entries"], usage["files"], usage["bytes"]) == (3, 5, 3010)
+
+    def test_nested_directories_belong_to_their_top_level_entry(self, tmp_path):
+        make_shader_cache(tmp_path, [("a", 1000), ("b", 1000)])
+        nested = tmp_path / "GLCache" / "a" / "sub"
+        nested.mkdir()
+        (nested / "blob").write_bytes(b"x" * 500)
+        os.utime(nested / "blob", (2_000_000, 2_000_000))
+        manager = ShaderCacheManager(str(tmp_path))
+        assert sorted(os.path.basename(entry["path"]) for entry in manager.scan()) == ["a", "b"]
+
+        outcome = manager.evict(1500)
+        assert [os.path.basename(path) for path in outcome["removed"]] == ["b"]
+        assert (outcome["freed"], outcome["failed"]) == (1000, [])
+        assert (nested / "blob").exists()
+
+    def test_evicts_least_recently_used_to_budget(self, tmp_path):
+        make_shader_cache(tmp_path, [("old", 1000), ("middle", 1000), ("new", 1000)])
+        os.utime(tmp_path / "GLCache" / "old" / "old.toc", (1_000_500, 1_000_500))
+        manager = ShaderCacheManager(str(tmp_path))
+
+        planned = manager.evict(1500, dry_run=True)
+        assert [os.path.basename(path) for path in planned["removed"]] == ["middle", "new"]
+        assert manager.usage()["bytes"] == 3000
+
+        outcome = manager.evict(1500)
+        assert (outcome["freed"], outcome["remaining"]) == (2000, 1000)
+        assert sorted(path.name for path in (tmp_path / "GLCache").iterdir()) == ["old"]
+        assert manager.evict(1500)["removed"] == []
+
+    def test_auto_placement_moves_cache_off_network_home(self, tmp_path, monkeypatch):
+        mounts = tmp_path / "proc" / "mounts"
+        mounts.parent.mkdir()
+        mounts.write_text("/dev/sda1 / ext4 rw 0 0\nfiler:/export/home /home nfs4 rw 0 0\n")
+        monkeypatch.setenv("NVIDIA_STABILITY_ROOT", str(tmp_path))
+        assert ShaderCacheManager.filesystem_type("/home/alice") == "nfs4"
+        assert ShaderCacheManager.filesystem_type("/homework") == "ext4"
+        assert ShaderCacheManager.placement("auto", "/home/alice") == ShaderCacheManager.LOCATIONS["local"]
+        assert ShaderCacheManager.placement("auto", "/srv/alice") is None
+        assert ShaderCacheManager.placement("tmpfs") == "$XDG_RUNTIME_DIR/nvidia-shader-cache"
+
+        exports = NvidiaConfigurator(GPUDetector._get_gpu_info("RTX 4090")).get_profile_exports("/scratch/$USER")
+        assert 'export __GL_SHADER_DISK_CACHE_PATH="/scratch/$USER"' in exports
+
+    def test_profile_rejects_a_cache_directory_it_does_not_own(self, tmp_path):
+        configurator = NvidiaConfigurator(GPUDetector._get_gpu_info("RTX 4090"))
+        (tmp_path / "elsewhere").mkdir()
+        (tmp_path / "planted").symlink_to(tmp_path / "elsewhere")
+        for name, expected in (("fresh", str(tmp_path / "fresh")), ("planted", "unset")):
+            profile = tmp_path / f"{name}.sh"
+            profile.write_text(configurator.get_profile_exports(str(tmp_path / name)))
+            result = subprocess.run(
+                ["/bin/sh", "-c", f'. {profile}; echo "${{__GL_SHADER_DISK_CACHE_PATH-unset}}"'],
+                capture_output=True, text=True,
+            )
+            assert result.stdout.strip() == expected
+        assert oct((tmp_path / "fresh").stat().st_mode & 0o777) == "0o700"
+
+    def test_cli_rejects_invalid_budget(self, fake_root, capsys):
+        with pytest.raises(SystemExit) as exc:
+            nvidia_stability.main(["shader-cache", "--budget", "abc"])
+        assert exc.value.code == 2
+        assert "invalid size" in capsys.readouterr().err
+
+    def test_cli_reports_and_evicts_all_users(self, fake_root, capsys):
+        make_shader_cache(fake_root / "home" / "alice" / ".cache" / "nvidia", [("a", 4000), ("b", 4000)])
+        make_shader_cache(fake_root / "var" / "tmp" / "nvidia-shader-cache-bob", [("c", 1000)])
+        make_shader_cache(fake_root / "run" / "user" / "4242" / "nvidia-shader-cache", [("d", 100)])
+
+        with pytest.raises(SystemExit) as exc:
+            nvidia_stability.main(["shader-cache", "--all-users", "--budget", "5000", "--json"])
+        assert exc.value.code == 0
+        report = {cache["user"]: cache for cache in json.loads(capsys.readouterr().out)}
+        assert report["4242"]["bytes"] == 100
+        assert (report["alice"]["evicted"], report["alice"]["bytes"]) == (1, 4000)
+        assert (report["bob"]["evicted"], report["bob"]["bytes"]) == (0, 1000)
+
+
+class TestLaunchProfiles:
+    def test_default_profile_matches_profile_block(self):
+        exports = NvidiaConfigurator(GPUDetector._get_gpu_info("RTX 4090")).get_profile_exports()
+        block = dict(
+            line[len("export "):].replace('"', "").split("=", 1)
+            for line in exports.splitlines() if line.startswith("export ")
+        )
+        assert LaunchProfiles.BUILTIN["default"]["env"] == block
+
+    def test_inheritance_and_unset(self, tmp_path):
+        profiles = LaunchProfiles(tmp_path / "profiles.json", tmp_path / "cache").load()
+        assert set(profiles) == {"default", "low-latency", "throughput", "compute"}
+        env = LaunchProfiles.environment(profiles["compute"], {"__GL_YIELD": "USLEEP", "HOME": "/home/a"})
+        assert "__GL_YIELD" not in env and env["HOME"] == "/home/a"
+        assert env["__GL_THREADED_OPTIMIZATIONS"] == "0" and env["__GL_SHADER_CACHE"] == "1"
+
+    def test_compiled_store_is_reused_until_user_file_changes(self, tmp_path, monkeypatch):
+        user_file = tmp_path / "profiles.json"
+        user_file.write_text(json.dumps({"vr": {"inherits": "low-latency", "env": {"__GL_SYNC_TO_VBLANK": "1"}}}))
+        store = LaunchProfiles(user_file, tmp_path / "cache")
+        assert store.load()["vr"]["env"]["__GL_THREADED_OPTIMIZATIONS"] == "0"
+
+        monkeypatch.setattr(store, "compile", lambda: pytest.fail("compiled profiles were not reused"))
+        assert store.load()["vr"]["env"]["__GL_SYNC_TO_VBLANK"] == "1"
+
+        monkeypatch.undo()
+        user_file.write_text(json.dumps({"vr": {"inherits": "vr"}}))
+        with pytest.raises(ValueError, match="cycle"):
+            store.load()
+
+    def test_invalid_definitions_are_value_errors(self, tmp_path):
+        user_file = tmp_path / "profiles.json"
+        for content, message in (
+            (["vr"], "JSON object"),
+            ({"vr": "low-latency"}, "'vr' must be an object"),
+            ({"vr": {"env": ["__GL_SYNC_TO_VBLANK=1"]}}, "env must be an object"),
+            ({"vr": {"inherits": ["default"]}}, "inherits must be a string"),
+            ({"vr": {"env": {"__GL_SYNC_TO_VBLANK": {"value": 1}}}}, "string, a number or null"),
+        ):
+            user_file.write_text(json.dumps(content))
+            with pytest.raises(ValueError, match=message):
+                LaunchProfiles(user_file, tmp_path / "cache").compile()
+
+    def test_cli_reports_invalid_profiles(self, fake_root, monkeypatch, capsys):
+        monkeypatch.setenv("XDG_CONFIG_HOME", str(fake_root / "config"))
+        (fake_root / "config" / "nvidia-stability").mkdir(parents=True)
+        (fake_root / "config" / "nvidia-stability" / "profiles.json").write_text('{"vr": {"env": "x"}}')
+        with pytest.raises(SystemExit) as exc:
+            nvidia_stability.main(["run", "--list"])
+        assert exc.value.code == 2
+        assert "Invalid launch profiles" in capsys.readouterr().err
+
+    def test_cli_run_execs_with_profile_env(self, fake_root, monkeypatch):
+        calls = []
+        monkeypatch.setattr(nvidia_stability.os, "execvpe", lambda file, argv, env: calls.append((file, argv, env)))
+        with pytest.raises(SystemExit) as exc:
+            nvidia_stability.main(["run", "--profile", "throughput", "--", "glxgears", "-info"])
+        assert exc.value.code == 0
+        file, argv, env = calls[0]
+        assert (file, argv) == ("glxgears", ["glxgears", "-info"])
+        assert env["__GL_MaxFramesAllowed"] == "3" and env["HOME"] == str(fake_root / "home")
+
+        with pytest.raises(SystemExit) as exc:
+            nvidia_stability.main(["run", "--profile", "missing", "--", "true"])
+        assert exc.value.code == 2
+
+
+class TestWorkloadModes:
+    def expected(self, name, workload):
+        specs = GPU_POWER_LIMITS[name]
+        mem, graphics = specs["mem_clock"], specs["graphics_clock"]
+        lock = int(graphics * 0.85) // 15 * 15
+        lock_gpu = not any(x in name for x in ("GTX 10", "GTX 9", "TITAN X", "GTX TITAN"))
+        lock_memory = lock_gpu and not any(x in name for x in ("RTX 20", "GTX 16", "TITAN RTX", "TITAN V"))
+        memory = ([f"--lock-memory-clocks={mem},{mem}"], ["--reset-memory-clocks"]) if lock_memory else ([], [])
+        return {
+            "graphics": (
+                [f"-ac {mem},{graphics}"],
+                ["-rac"],
+            ),
+            "compute-throughput": (
+                [f"-ac {mem},{graphics}"] + memory[0],
+                ["-rac"] + memory[1],
+            ),
+            "compute-latency": (
+                [f"--lock-gpu-clocks={lock},{lock}" if lock_gpu else f"-ac {mem},{lock}"] + memory[0],
+                ["--reset-gpu-clocks" if lock_gpu else "-rac"] + memory[1],
+            ),
+        }[workload]
+
+    def test_every_sku_against_fake_nvidia_smi(self, fake_root):
+        log = fake_root / "nvidia-smi.log"
+        make_fake_bin(fake_root / "bin", "nvidia-smi", f'echo "$*" >> {log}\n')
+        gpus = [
+            dict(GPUDetector._get_gpu_info(name), bus_id=f"0000:{i:02x}:00.0") for i, name in enumerate(GPU_POWER_LIMITS)
+        ]
+
+        for workload in NvidiaConfigurator.WORKLOADS:
+            for phase in (0, 1):
+                log.write_text("")
+                groups = []
+                for gpu_info in gpus:
+                    configurator = NvidiaConfigurator(gpu_info, workload)
+                    settings = configurator.get_reset_settings() if phase else configurator.get_clock_settings()
+                    groups.append((gpu_info["bus_id"], settings))
+                results = NvidiaSMIBackend().apply_groups(groups, max_workers=16)
+                assert all(success for group in results for _, success in group)
+
+                expected = {
+                    f"-i {gpu_info['bus_id']} {args}"
+                    for gpu_info in gpus
+                    for args in self.expected(gpu_info["name"], workload)[phase]
+                }
+                lines = log.read_text().splitlines()
+                assert len(lines) == len(expected) and set(lines) == expected, workload
+
+    def test_lock_clock_stays_below_boost(self):
+        for name, specs in GPU_POWER_LIMITS.items():
+            clock = NvidiaConfigurator(dict(specs, name=name), "compute-latency").get_latency_clock()
+            assert 0 < clock < specs["graphics_clock"] and clock % 15 == 0, name
+
+    def test_workload_is_persisted_and_reset(self, fake_root, capsys):
+        plan = Planner.build(DEBIAN_12, two_gpus(), workload="compute-latency")
+        assert DesiredState.save(DesiredState.from_plan(plan))
+        bus_id, settings = DesiredState.get_setting_groups(DesiredState.load())[0]
+        assert NvidiaSMIBackend.command(bus_id, settings[-2]) == "nvidia-smi -i 0000:01:00.0 --lock-gpu-clocks=2130,2130"
+
+        make_fake_bin(fake_root / "bin", "nvidia-smi", "exit 0\n")
+        with pytest.raises(SystemExit) as exc:
+            nvidia_stability.main(["reset-clocks", "--workload", "compute-latency"])
+        assert exc.value.code == 0
+        out = capsys.readouterr().out
+        assert out.count("--reset-gpu-clocks") == 2 and "-rac" not in out
+
+        DesiredState.save(DesiredState.from_plan(Planner.build(DEBIAN_12, two_gpus())))
+        with pytest.raises(SystemExit) as exc:
+            nvidia_stability.main(["reset-clocks"])
+        assert exc.value.code == 0
+        out = capsys.readouterr().out
+        assert out.count("-rac") == out.count("--reset-gpu-clocks") == out.count("--reset-memory-clocks") == 2
+
+    def test_switching_modes_resets_the_previous_locks(self):
+        gpu = two_gpus()[0]
+        commands = [
+            step["command"] for step in Planner.build(DEBIAN_12, [gpu], previous_workload="compute-latency")["steps"]
+            if step["kind"] == "gpu"
+        ]
+        assert commands[2:] == [
+            "nvidia-smi -i 0000:01:00.0 --reset-gpu-clocks",
+            "nvidia-smi -i 0000:01:00.0 --reset-memory-clocks",
+            "nvidia-smi -i 0000:01:00.0 -ac 1313,2520",
+        ]
+        same = Planner.build(DEBIAN_12, [gpu], previous_workload="graphics")["steps"]
+        assert not any("reset" in step.get("command", "") for step in same)
+
+    def test_older_architectures_do_not_lock_clocks(self):
+        pascal = NvidiaConfigurator(dict(GPUDetector._get_gpu_info("GTX 1080"), bus_id="b"), "compute-latency")
+        assert [setting[0] for setting in pascal.get_clock_settings()] == ["application_clocks"]
+        assert pascal.get_all_reset_settings() == [("reset_application_clocks",)]
+        turing = NvidiaConfigurator(dict(GPUDetector._get_gpu_info("RTX 2080"), bus_id="b"), "compute-throughput")
+        assert [setting[0] for setting in turing.get_clock_settings()] == ["application_clocks"]
+        assert turing.get_all_reset_settings() == [("reset_application_clocks",), ("reset_gpu_clocks",)]
+
+
+def make_scrape_smi(bin_dir, calls):
+    return make_fake_bin(bin_dir, "nvidia-smi", (
+        f"echo x >> {calls}\n"
+        "echo '00000000:01:00.0, NVIDIA GeForce RTX 4090, 71, 405.5, 450.00, 2520, 10501, 98, 0x0000000000000004'\n"
+        "echo '00000000:02:00.0, NVIDIA GeForce RTX 3090, 64, [N/A], 350.00, 1695, 9751, 0, 0x0000000000000001'\n"
+    ))
+
+
+class TestPrometheusExporter:
+    def test_cache_runs_one_query_per_interval(self, fake_root):
+        calls = fake_root / "calls"
+        make_scrape_smi(fake_root / "bin", calls)
+        now = [100.0]
+        cache = GPUScrapeCache(interval=5, clock=lambda: now[0])
+
+        assert cache.get()["0000:01:00.0"]["power.draw"] == 405.5
+        for _ in range(10):
+            cache.get()
+        now[0] += 5
+        cache.get()
+        stats = cache.stats()
+        assert len(calls.read_text().split()) == stats["queries"] == 2
+        assert (stats["requests"], stats["hits"]) == (12, 10)
+
+    def test_render(self, fake_root):
+        make_scrape_smi(fake_root / "bin", fake_root / "calls")
+        text = PrometheusExporter(GPUScrapeCache()).render()
+        labels = 'gpu="0000:01:00.0",name="NVIDIA GeForce RTX 4090"'
+        assert f"nvidia_gpu_sm_clock_hertz{{{labels}}} 2520000000" in text
+        assert f"nvidia_gpu_power_limit_configured_watts{{{labels}}} 450" in text
+        assert f"nvidia_gpu_power_limit_utilization_ratio{{{labels}}} 0.9011111111111111" in text
+        assert f'nvidia_gpu_throttle_reason_active{{{labels},reason="sw_power_cap"}} 1' in text
+        assert 'nvidia_gpu_power_draw_watts{gpu="0000:02:00.0"' not in text
+        assert text.count("# TYPE nvidia_gpu_temperature_celsius gauge") == 1
+        assert "nvidia_stability_exporter_queries_total 1" in text
+
+    def test_failed_query_drops_stale_gauges(self, fake_root):
+        make_scrape_smi(fake_root / "bin", fake_root / "calls")
+        now = [100.0]
+        exporter = PrometheusExporter(GPUScrapeCache(interval=5, clock=lambda: now[0]))
+        text = exporter.render()
+        assert "nvidia_stability_exporter_up 1" in text and "nvidia_gpu_temperature_celsius{" in text
+        assert "nvidia_stability_exporter_last_success_timestamp_seconds 0" not in text
+
+        make_fake_bin(fake_root / "bin", "nvidia-smi", "exit 9\n")
+        now[0] += 5
+        text = exporter.render()
+        assert "nvidia_stability_exporter_up 0" in text
+        assert "nvidia_gpu_temperature_celsius{" not in text
+        assert "nvidia_stability_exporter_query_errors_total 1" in text
+
+    def test_concurrent_http_clients_share_one_query(self, fake_root):
+        calls = fake_root / "calls"
+        make_scrape_smi(fake_root / "bin", calls)
+        exporter = PrometheusExporter(GPUScrapeCache(interval=60))
+        host, port = exporter.serve("127.0.0.1", 0)
+        try:
+            def scrape(_):
+                with urllib.request.urlopen(f"http://{host}:{port}/metrics", timeout=10) as response:
+                    return response.status, response.read().decode()
+
+            with ThreadPoolExecutor(max_workers=8) as pool:
+                responses = list(pool.map(scrape, range(24)))
+            with pytest.raises(urllib.error.HTTPError):
+                urllib.request.urlopen(f"http://{host}:{port}/", timeout=10)
+        finally:
+            exporter.stop()
+
+        assert all(status == 200 and "nvidia_gpu_temperature_celsius" in body for status, body in responses)
+        assert len(calls.read_text().split()) == 1
+        assert exporter.cache.stats()["hits"] == 23
+
+    def test_cli_writes_textfile(self, fake_root, capsys):
+        make_scrape_smi(fake_root / "bin", fake_root / "calls")
+        textfile = fake_root / "nvidia.prom"
+        with pytest.raises(SystemExit) as exc:
+            nvidia_stability.main(["export", "--listen", "", "--textfile", str(textfile), "--duration", "0.2"])
+        assert exc.value.code == 0
+        assert "nvidia_gpu_temperature_celsius" in textfile.read_text()
+        assert "1 nvidia-smi queries" in capsys.readouterr().out
+
+
+class TestGPUBackends:
+    def open_fake(self, gpus, **kwargs):
+        fake = FakeNVML(gpus, **kwargs)
+        backend = NVMLBackend(fake)
+        assert backend.open()
+        return fake, backend
+
+    def test_nvml_applies_settings_in_process(self, fake_root):
+        gpus = two_gpus()
+        fake, backend = self.open_fake(gpus)
+        groups = [(gpu["bus_id"], NvidiaConfigurator(gpu, "compute-latency").get_settings()) for gpu in gpus]
+        results = backend.apply_groups(groups)
+        backend.close()
+
+        assert all(success for group in results for _, success in group)
+        assert results[0][1] == ("NVML 0000:01:00.0 power_limit=450", True)
+        assert fake.devices[0]["power_limit"] == 450000 and fake.devices[0]["persistence"] == 1
+        assert fake.devices[1]["locked_gpu_clocks"] == (1440, 1440)
+        assert fake.devices[1]["locked_memory_clocks"] == (1219, 1219)
+        assert (fake.inits, fake.calls) == (1, 2 + 8)
+        assert not fake.initialized
+
+    def test_nvml_reports_driver_errors(self, fake_root):
+        fake, backend = self.open_fake(two_gpus()[:1])
+        assert backend.apply("0000:01:00.0", ("power_limit", 900)) == (
+            False, "nvmlDeviceSetPowerManagementLimit: Invalid Argument",
+        )
+        assert backend.apply("0000:09:00.0", ("persistence", 1)) == (False, "0000:09:00.0: Not Found")
+        assert fake.devices[0]["power_limit"] == 450000
+
+    def test_settings_render_to_the_same_commands(self):
+        gpu = dict(two_gpus()[0])
+        for workload in NvidiaConfigurator.WORKLOADS:
+            configurator = NvidiaConfigurator(gpu, workload)
+            assert [NvidiaSMIBackend.command(gpu["bus_id"], setting) for setting in configurator.get_settings()] == (
+                configurator.get_nvidia_smi_commands() + configurator.get_clock_commands()
+            )
+
+    def test_apply_path_with_fake_nvml(self, fake_root, capsys):
+        gpus = two_gpus()
+        fake, backend = self.open_fake(gpus)
+        runner = RecordingRunner()
+        plan = Planner.build(DEBIAN_12, gpus)
+        record = PlanExecutor(runner, gpu_backend=backend).execute(plan, None)
+
+        assert record["applied"] is True
+        assert not any(cmd.startswith("nvidia-smi") for cmd in runner.commands)
+        assert [device["application_clocks"] for device in fake.devices] == [(1313, 2520), (1219, 1695)]
+        out = capsys.readouterr().out
+        assert "NVML 0000:02:00.0 power_limit=350" in out and "nvidia-smi -i" not in out
+
+        fake.devices[0]["power_limit"] = 1
+        outcome = DesiredState.reapply(DesiredState.from_plan(plan), backend=backend)
+        assert outcome["success"] is True and fake.devices[0]["power_limit"] == 450000
+
+    def test_backends_must_implement_apply_and_describe(self):
+        class Partial(GPUBackend):
+            def describe(self, bus_id, setting):
+                return bus_id
+
+        with pytest.raises(TypeError):
+            Partial()
+
+    def test_backend_selection(self, fake_root, monkeypatch):
+        assert isinstance(nvidia_stability.select_backend("auto"), NvidiaSMIBackend)
+        assert nvidia_stability.select_backend("nvml") is None
+        DesiredState.save(DesiredState.from_plan(Planner.build(DEBIAN_12, two_gpus())))
+        with pytest.raises(SystemExit) as exc:
+            nvidia_stability.main(["reapply", "--backend", "nvml"])
+        assert exc.value.code == 1
+
+        monkeypatch.setattr(NVMLBackend, "open", lambda self: True)
+        assert isinstance(nvidia_stability.select_backend("auto"), NVMLBackend)
+        monkeypatch.setattr(nvidia_stability.os, "geteuid", lambda: 1000)
+        assert isinstance(nvidia_stability.select_backend("auto"), NvidiaSMIBackend)
+
+
+QUERY_IN_SYNC = (
+    "00000000:01:00.0, Enabled, 450.00, 1313, 2520\n"
+    "00000000:02:00.0, Enabled, 350.00, 1219, 1695\n"
+)
+QUERY_DRIFTED = (
+    "00000000:01:00.0, Disabled, 400.00, 1313, 2520\n"
+    "00000000:02:00.0, Enabled, 349.70, 1219, 1395\n"
+)
+
+
+def make_query_smi(bin_dir, query_output):
+    (bin_dir.parent / "query.csv").write_text(query_output)
+    return make_fake_bin(bin_dir, "nvidia-smi", (
+        'case "$1" in --query-gpu=*) while IFS= read -r line; do echo "$line"; done < "${0%/*}/../query.csv"; exit;; esac\n'
+        'echo "$*" >> "${0%/*}/calls"\n'
+    ))
+
+
+class TestDriftReconciler:
+    def state(self, workload="graphics"):
+        return DesiredState.from_plan(Planner.build(DEBIAN_12, two_gpus(), workload=workload))
+
+    def test_parse_query_output(self):
+        current = DriftReconciler.parse(QUERY_DRIFTED + "00000000:03:00.0, Enabled, [N/A], [N/A], [N/A]\ngarbage\n")
+        assert current["0000:01:00.0"] == {"persistence": 0, "power_limit": 400.0, "application_clocks": (1313, 2520)}
+        assert current["0000:03:00.0"] == {"persistence": 1, "power_limit": None, "application_clocks": None}
+        assert len(current) == 3
+
+    def test_diff_reports_only_drifted_fields(self):
+        desired = DriftReconciler.desired_settings(self.state())
+        assert DriftReconciler.diff(desired, DriftReconciler.parse(QUERY_IN_SYNC)) == []
+
+        drift = DriftReconciler.diff(desired, DriftReconciler.parse(QUERY_DRIFTED))
+        assert [(item["gpu"], item["field"], item["actual"]) for item in drift] == [
+            ("0000:01:00.0", "persistence", 0),
+            ("0000:01:00.0", "power_limit", 400.0),
+            ("0000:02:00.0", "application_clocks", (1219, 1395)),
+        ]
+        assert drift[2]["setting"] == ("application_clocks", 1219, 1695)
+
+    def test_unreadable_and_missing_gpus(self):
+        desired = DriftReconciler.desired_settings(self.state())
+        current = DriftReconciler.parse("00000000:01:00.0, [N/A], [N/A], [N/A], [N/A]\n")
+        drift = DriftReconciler.diff(desired, current)
+        assert [(item["gpu"], item["field"], item["setting"]) for item in drift] == [("0000:02:00.0", "gpu", None)]
+
+    def test_latency_mode_verifies_power_settings_only(self):
+        desired = DriftReconciler.desired_settings(self.state("compute-latency"))
+        assert set(desired["0000:01:00.0"]) == {"persistence", "power_limit"}
+        assert DriftReconciler.diff(desired, DriftReconciler.parse(QUERY_DRIFTED.replace("1395", "900")))[-1][
+            "field"
+        ] == "power_limit"
+
+    def test_reconcile_reapplies_drift_through_backend(self, fake_root):
+        make_query_smi(fake_root / "bin", QUERY_DRIFTED)
+        fake = FakeNVML(two_gpus())
+        backend = NVMLBackend(fake)
+        backend.open()
+        outcome = DriftReconciler(self.state()).reconcile(backend)
+
+        assert outcome["success"] is True and len(outcome["drift"]) == 3
+        assert [label for label, _ in outcome["applied"]] == [
+            "NVML 0000:01:00.0 persistence=1",
+            "NVML 0000:01:00.0 power_limit=450",
+            "NVML 0000:02:00.0 application_clocks=1219,1695",
+        ]
+        assert fake.calls == 2 + 3
+
+    def test_cli_verify_and_reconcile(self, fake_root, capsys):
+        make_query_smi(fake_root / "bin", QUERY_IN_SYNC)
+        DesiredState.save(self.state())
+        with pytest.raises(SystemExit) as exc:
+            nvidia_stability.main(["verify"])
+        assert exc.value.code == 0
+        assert "All 2 GPU(s) match" in capsys.readouterr().out
+
+        make_query_smi(fake_root / "bin", QUERY_DRIFTED)
+        with pytest.raises(SystemExit) as exc:
+            nvidia_stability.main(["verify", "--json"])
+        assert exc.value.code == 1
+        assert len(json.loads(capsys.readouterr().out)["drift"]) == 3
+
+        with pytest.raises(SystemExit) as exc:
+            nvidia_stability.main(["reconcile", "--interval", "0.01", "--iterations", "2"])
+        assert exc.value.code == 0
+        assert sorted((fake_root / "bin" / "calls").read_text().splitlines()) == sorted([
+            "-i 0000:01:00.0 -pm 1", "-i 0000:01:00.0 -pl 450", "-i 0000:02:00.0 -ac 1219,1695",
+        ] * 2)
+
+
+def make_bundling_apt(bin_dir, log):
+    make_fake_bin(bin_dir, "apt", f'echo "apt $*" >> {log}\n')
+    return make_fake_bin(bin_dir, "apt-get", (
+        f'echo "apt-get $*" >> {log}\n'
+        'for arg in "$@"; do\n'
+        '  case "$arg" in Dir::Cache::archives=*) dir="${arg#Dir::Cache::archives=}" ;; esac\n'
+        'done\n'
+        '[ -n "$dir" ] || exit 0\n'
+        '. "$NVIDIA_STABILITY_ROOT/etc/os-release"\n'
+        'echo driver > "$dir/nvidia-driver_550_amd64.deb"\n'
+        'echo dkms > "$dir/dkms_3.0_all.deb"\n'
+        'echo "firmware $VERSION_ID" > "$dir/firmware-misc-nonfree_${VERSION_ID}_all.deb"\n'
+        'echo partial > "$dir/partial/nvidia-kernel-dkms_550_amd64.deb"\n'
+    ))
+
+
+def make_dummy_bundle(path, key="debian/debian/12"):
+    download = path.parent / "download"
+    download.mkdir(parents=True)
+    (download / "nvidia-driver_550_amd64.deb").write_text("driver\n")
+    (download / "dkms_3.0_all.deb").write_text("dkms\n")
+    (download / "Release").write_text("not a package\n")
+    OfflineBundle(path).add(key, "apt", ["nvidia-driver", "dkms"], download)
+    return OfflineBundle(path)
+
+
+class TestOfflineBundle:
+    def write_os_release(self, root, version):
+        (root / "etc").mkdir(exist_ok=True)
+        (root / "etc" / "os-release").write_text(f'NAME="Debian GNU/Linux"\nID=debian\nVERSION_ID="{version}"\n')
+
+    def test_bundle_deduplicates_across_versions(self, fake_root, capsys):
+        log = fake_root / "apt.log"
+        make_bundling_apt(fake_root / "bin", log)
+        bundle_dir = fake_root / "bundle"
+        self.write_os_release(fake_root, "12")
+        with pytest.raises(SystemExit) as exc:
+            nvidia_stability.main(["bundle", str(bundle_dir)])
+        assert exc.value.code == 0
+        assert "3 artifacts, 3 added" in capsys.readouterr().out
+
+        self.write_os_release(fake_root, "13")
+        with pytest.raises(SystemExit) as exc:
+            nvidia_stability.main(["--refresh", "bundle", str(bundle_dir)])
+        assert exc.value.code == 0
+        assert "3 artifacts, 1 added (12 B), 2 already in the bundle" in capsys.readouterr().out
+
+        lines = log.read_text().splitlines()
+        assert lines[0] == "apt update"
+        assert "--download-only" in lines[1] and "nvidia-driver firmware-misc-nonfree" in lines[1]
+        targets = OfflineBundle(bundle_dir).load()["targets"]
+        assert sorted(targets) == ["debian/debian/12", "debian/debian/13"]
+        assert [artifact["name"] for artifact in targets["debian/debian/12"]["artifacts"]] == [
+            "dkms_3.0_all.deb", "firmware-misc-nonfree_12_all.deb", "nvidia-driver_550_amd64.deb",
+        ]
+        blobs = [path for path in (bundle_dir / "blobs").rglob("*") if path.is_file()]
+        assert len(blobs) == 4
+        assert [path.name for path in bundle_dir.iterdir() if path.name.startswith("download-")] == []
+
+        with pytest.raises(SystemExit) as exc:
+            nvidia_stability.main(["bundle", "--verify", str(bundle_dir)])
+        assert exc.value.code == 0
+
+    def test_offline_plan_installs_verified_local_files(self, fake_root):
+        bundle = make_dummy_bundle(fake_root / "bundle")
+        plan = Planner.build(DEBIAN_12, two_gpus(), offline=str(fake_root / "bundle"))
+        package_steps = [step for step in plan["steps"] if step["kind"] == "package"]
+        assert [step["phase"] for step in package_steps] == ["verify", "install"]
+
+        runner = RecordingRunner()
+        record = PlanExecutor(runner).execute(plan, None)
+        assert record["applied"] is True
+        stage = fake_root / "cache" / "offline" / "debian_debian_12"
+        assert runner.commands[0] == (
+            f"apt-get install -y --no-download {stage}/dkms_3.0_all.deb {stage}/nvidia-driver_550_amd64.deb"
+        )
+        assert not any("apt update" in cmd or "backports" in cmd for cmd in runner.commands)
+        assert (stage / "nvidia-driver_550_amd64.deb").read_text() == "driver\n"
+        assert set(record["phases"]) == {"verify", "install"}
+        assert bundle.verify() == []
+
+    def test_corrupted_artifact_is_rejected(self, fake_root, capsys):
+        bundle = make_dummy_bundle(fake_root / "bundle")
+        driver = next(a for a in bundle.target("debian/debian/12")["artifacts"] if a["name"].startswith("nvidia"))
+        bundle.blob_path(driver["sha256"]).write_text("tampered\n")
+
+        plan = Planner.build(DEBIAN_12, two_gpus(), offline=str(fake_root / "bundle"))
+        plan["steps"] = [step for step in plan["steps"] if step["kind"] == "package"]
+        record = PlanExecutor(RecordingRunner()).execute(plan, None)
+        assert record["applied"] is False
+        assert not (fake_root / "cache" / "offline" / "debian_debian_12" / driver["name"]).exists()
+        assert [problem["error"] for problem in bundle.verify()] == ["hash mismatch"]
+
+        capsys.readouterr()
+        with pytest.raises(SystemExit) as exc:
+            nvidia_stability.main(["bundle", "--verify", str(fake_root / "bundle")])
+        assert exc.value.code == 1
+        assert "nvidia-driver_550_amd64.deb (hash mismatch)" in capsys.readouterr().out
+
+    def test_missing_target_or_manager_is_an_error(self, fake_root, monkeypatch, capsys):
+        make_dummy_bundle(fake_root / "bundle", key="debian/debian/11")
+        with pytest.raises(ValueError, match="no packages for debian/debian/12"):
+            Planner.build(DEBIAN_12, two_gpus(), offline=str(fake_root / "bundle"))
+        make_dummy_bundle(fake_root / "other" / "bundle", key="debian/debian/12")
+        with monkeypatch.context() as patch:
+            patch.setattr(nvidia_stability.platform, "release", lambda: "0.0.0-other")
+            with pytest.raises(ValueError, match="kernel headers for .*this host runs 0.0.0-other"):
+                Planner.build(DEBIAN_12, two_gpus(), offline=str(fake_root / "other" / "bundle"))
+        alpine = {"id": "alpine", "name": "Alpine Linux", "version": "3.19", "family": "alpine"}
+        with pytest.raises(ValueError, match="not supported"):
+            Planner.build(alpine, two_gpus(), offline=str(fake_root / "bundle"))
+
+        monkeypatch.setattr(GPUDetector, "detect_all", staticmethod(lambda sysfs_root="/sys": two_gpus()))
+        self.write_os_release(fake_root, "12")
+        with pytest.raises(SystemExit) as exc:
+            nvidia_stability.main(["plan", "--offline", str(fake_root / "bundle")])
+        assert exc.value.code == 1
+        assert "run 'bundle' on a debian/debian/12 host first" in capsys.readouterr().err
+
+
+class TestReapply:
+    def test_state_roundtrip(self, fake_root):
+        plan = Planner.build(DEBIAN_12, two_gpus())
+        state = DesiredState.from_plan(plan)
+        assert DesiredState.save(state)
+        assert DesiredState.path() == fake_root / "state" / "state.json"
+        assert DesiredState.load() == state
+        assert state["gpus"][1] == {
+            "bus_id": "0000:02:00.0", "name": "RTX 3090", "tdp": 350, "mem_clock": 1219, "graphics_clock": 1695,
+        }
+
+    def test_reapply_sets_only_runtime_knobs(self, fake_root):
+        state = DesiredState.from_plan(Planner.build(DEBIAN_12, two_gpus()))
+        runner = RecordingRunner()
+        outcome = DesiredState.reapply(state, runner)
+        assert outcome["success"] is True
+        assert sorted(runner.commands) == sorted([
+            "nvidia-smi -i 0000:01:00.0 -pm 1",
+            "nvidia-smi -i 0000:01:00.0 -pl 450",
+            "nvidia-smi -i 0000:01:00.0 -ac 1313,2520",
+            "nvidia-smi -i 0000:02:00.0 -pm 1",
+            "nvidia-smi -i 0000:02:00.0 -pl 350",
+            "nvidia-smi -i 0000:02:00.0 -ac 1219,1695",
+        ])
+        assert outcome["results"][-1] == ("CPU governor performance, EPP performance on all CPUs", True)
+        assert outcome["overhead_ms"] >= 0
+        assert outcome["total_ms"] >= outcome["command_ms"]
+
+    def test_command_time_is_wall_time_across_gpus(self, fake_root, monkeypatch):
+        monkeypatch.setattr(nvidia_stability, "get_process_uptime", lambda: None)
+        gpus = [dict(GPUDetector._get_gpu_info("RTX 4090"), bus_id=f"0000:0{i}:00.0") for i in range(1, 5)]
+        state = DesiredState.from_plan(Planner.build(DEBIAN_12, gpus))
+
+        def runner(cmd):
+            time.sleep(0.1)
+            return True, ""
+
+        outcome = DesiredState.reapply(state, runner)
+        assert outcome["success"] is True
+        assert 300 <= outcome["command_ms"] < 900
+        assert outcome["total_ms"] >= outcome["command_ms"]
+        assert outcome["overhead_ms"] == pytest.approx(outcome["total_ms"] - outcome["command_ms"])
+
+    def test_cli_reapply_with_fake_nvidia_smi(self, fake_root, capsys):
+        make_fake_bin(fake_root / "bin", "nvidia-smi", 'echo "$@" >> "${0%/*}/calls"\n')
+        make_fake_bin(fake_root / "bin", "cpufreq-set", "exit 0\n")
+        DesiredState.save(DesiredState.from_plan(Planner.build(DEBIAN_12, two_gpus())))
+
+        with pytest.raises(SystemExit) as exc:
+            nvidia_stability.main(["reapply"])
+        assert exc.value.code == 0
+        assert len((fake_root / "bin" / "calls").read_text().splitlines()) == 6
+        assert "tool overhead" in capsys.readouterr().out
+
+    def test_cli_reapply_without_state(self, fake_root):
+        with pytest.raises(SystemExit) as exc:
+            nvidia_stability.main(["reapply"])
+        assert exc.value.code == 1
+
+    def test_systemd_unit(self, fake_root):
+        unit = SystemdUnit.render("/usr/bin/python3 -m nvidia_stability reapply", "/opt")
+        assert "Type=oneshot" in unit
+        assert "ExecStart=/usr/bin/python3 -m nvidia_stability reapply" in unit
+        assert 'Environment="PYTHONPATH=/opt"' in unit
+        assert f"ConditionPathExists={DesiredState.path()}" in unit
+
+    def test_systemd_unit_runs_module(self, fake_root, monkeypatch):
+        monkeypatch.setattr(SystemdUnit, "UNIT_DIR", fake_root)
+        monkeypatch.setattr(SystemConfigurator, "run_command", staticmethod(lambda command, **kwargs: (True, "")))
+        assert SystemdUnit.install()
+        unit = (fake_root / SystemdUnit.NAME).read_text()
+        module_dir = os.path.dirname(os.path.realpath(nvidia_stability.__file__))
+        assert f"ExecStart={sys.executable} -m nvidia_stability reapply\n" in unit
+        assert f"WorkingDirectory={module_dir}\n" in unit
+        assert f'Environment="PYTHONPATH={module_dir}"' in unit
+
+
+class TestInventoryCache:
+    @pytest.fixture
+    def inventory(self, tmp_path):
+        os_release = tmp_path / "os-release"
+        os_release.write_text('ID=debian\nVERSION_ID="12"\n')
+        sysfs = tmp_path / "sys"
+        make_pci_device(sysfs, "0000:01:00.0", "0x10de", "0x2684", "0x030000")
+        (sysfs / "module" / "nvidia").mkdir(parents=True)
+        (sysfs / "module" / "nvidia" / "version").write_text("550.78\n")
+        return InventoryCache(tmp_path / "cache", str(os_release), str(sysfs))
+
+    def test_second_lookup_is_a_hit(self, inventory):
+        _, gpus = inventory.get()
+        assert inventory.last_result == "miss"
+        assert gpus[0]["name"] == "RTX 4090"
+
+        again = InventoryCache(inventory.path.parent, inventory.os_release, inventory.sysfs_root)
+        assert again.get()[1] == gpus
+        assert (again.last_result, again.hits, again.misses) == ("hit", 1, 1)
+
+    def test_hit_does_not_probe(self, inventory, monkeypatch):
+        inventory.get()
+        monkeypatch.setattr(InventoryCache, "detect", lambda self: pytest.fail("re-probed on a cache hit"))
+        inventory.get()
+        assert inventory.last_result == "hit"
+
+    def test_hit_does_not_rewrite_the_cache(self, inventory):
+        inventory.get()
+        stat = inventory.path.stat()
+        inventory.get()
+        assert inventory.last_result == "hit"
+        assert (inventory.path.stat().st_ino, inventory.path.stat().st_mtime_ns) == (stat.st_ino, stat.st_mtime_ns)
+        inventory.get(count_hits=True)
+        assert json.loads(inventory.path.read_text())["hits"] == 1
+
+    def test_os_release_change_invalidates(self, inventory):
+        inventory.get()
+        stat = os.stat(inventory.os_release)
+        os.utime(inventory.os_release, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+        inventory.get()
+        assert inventory.last_result == "miss"
+
+    def test_driver_version_change_invalidates(self, inventory):
+        inventory.get()
+        with open(os.path.join(inventory.sysfs_root, "module", "nvidia", "version"), "w") as f:
+            f.write("555.42\n")
+        inventory.get()
+        assert inventory.last_result == "miss"
+
+    def test_kernel_change_invalidates(self, inventory, monkeypatch):
+        inventory.get()
+        monkeypatch.setattr(nvidia_stability.platform, "release", lambda: "0.0.0-test")
+        inventory.get()
+        assert inventory.last_result == "miss"
+
+    def test_refresh_override(self, inventory):
+        inventory.get()
+        inventory.get(refresh=True)
+        assert (inventory.last_result, inventory.hits, inventory.misses) == ("refresh", 0, 2)
+
+    def test_debug_output_shows_counters(self, fake_root, monkeypatch, capsys):
+        monkeypatch.setattr(GPUDetector, "detect_all", staticmethod(lambda sysfs_root="/sys": two_gpus()))
+        for _ in range(2):
+            with pytest.raises(SystemExit):
+                nvidia_stability.main(["--debug", "plan"])
+        assert "[debug] inventory cache hit (hits=1, misses=1)" in capsys.readouterr().err
+
+
+FAKE_NVIDIA_SMI_STREAM = (
+    "i=0\n"
+    'while [ $i -lt "${SAMPLES:-500}" ]; do\n'
+    '  echo "00000000:01:00.0, $((60 + i % 10)), 300.50, 450.00, 2520, 10501, 99, 0x0000000000000004"\n'
+    '  echo "00000000:02:00.0, 70, [N/A], 350.00, 1695, 9751, 50, 0x0000000000000000"\n'
+    "  i=$((i + 1))\n"
+    "done\n"
+)
+
+
+class TestTelemetry:
+    def test_ring_buffer_is_bounded_and_ordered(self):
+        ring = TelemetryRing(4, ("a", "b"))
+        for i in range(10):
+            ring.append(float(i), [i, i * 2])
+        assert len(ring) == 4
+        assert ring.series("a") == [6.0, 7.0, 8.0, 9.0]
+        assert ring.latest() == {"a": 9.0, "b": 18.0, "timestamp": 9.0}
+
+    def test_ring_buffer_storage_is_fixed(self):
+        ring = TelemetryRing(100)
+        sizes = [column.buffer_info()[1] for column in ring.columns]
+        for i in range(1000):
+            ring.append(float(i), [float(i)] * len(TELEMETRY_FIELDS))
+        assert [column.buffer_info()[1] for column in ring.columns] == sizes
+
+    def test_feed_parses_csv(self):
+        sampler = TelemetrySampler(capacity=10)
+        parsed = sampler.feed([
+            "00000000:01:00.0, 65, 301.25, 450.00, 2520, 10501, 99, 0x0000000000000004",
+            "00000000:02:00.0, 70, [N/A], 350.00, 1695, 9751, 50, 0x0000000000000000",
+            "garbage",
+        ])
+        assert parsed == 2
+        assert sampler.errors == 1
+        latest = sampler.latest()
+        assert latest["0000:01:00.0"]["power.draw"] == 301.25
+        assert latest["0000:01:00.0"]["clocks_throttle_reasons.active"] == 4.0
+        assert latest["0000:02:00.0"]["power.draw"] != latest["0000:02:00.0"]["power.draw"]
+
+    def test_print_unsupported_fields(self, capsys):
+        sampler = TelemetrySampler(capacity=10)
+        sampler.feed(["00000000:01:00.0, 65, [N/A], 450.00, 2520, 10501, 99, [N/A]"])
+        nvidia_stability.print_telemetry(sampler.latest())
+        out = capsys.readouterr().out
+        assert "0000:01:00.0: 65C nan/450W" in out and "throttle n/a" in out
+
+    def test_command_queries_all_gpus_in_one_process(self):
+        command = TelemetrySampler(interval_ms=250).get_command()
+        assert command[1] == "--query-gpu=pci.bus_id," + ",".join(TELEMETRY_FIELDS)
+        assert command[2:] == ["--format=csv,noheader,nounits", "-lms", "250"]
+        assert "-i" not in command
+
+    def test_stream_from_fake_nvidia_smi(self, tmp_path):
+        fake = make_fake_bin(tmp_path / "bin", "nvidia-smi", FAKE_NVIDIA_SMI_STREAM)
+        sampler = TelemetrySampler(capacity=100, nvidia_smi=str(fake))
+        assert sampler.start()
+        sampler.wait(10)
+        sampler.stop()
+
+        stats = sampler.stats()
+        assert stats["samples"] == 1000
+        assert stats["gpus"] == 2
+        assert stats["samples_per_second"] > 0
+        assert len(sampler.rings["0000:01:00.0"]) == 100
+        assert sampler.rings["0000:01:00.0"].series("temperature.gpu")[-1] == 69.0
+
+    def test_cli_monitor(self, tmp_path, capsys):
+        fake = make_fake_bin(tmp_path / "bin", "nvidia-smi", FAKE_NVIDIA_SMI_STREAM)
+        with pytest.raises(SystemExit) as exc:
+            nvidia_stability.main(["monitor", "--nvidia-smi", str(fake), "--report-every", "0.05", "--duration", "5"])
+        assert exc.value.code == 0
+        out = capsys.readouterr().out
+        assert "0000:01:00.0: 69C 300.5/450W" in out
+        assert "Parsed 1000 samples from 2 GPU(s)" in out
+
+
+def telemetry_sample(temperature, power, reasons=0):
+    return {
+        "temperature.gpu": temperature, "power.draw": power, "power.limit": power,
+        "clocks.sm": 2520, "clocks.mem": 10501, "utilization.gpu": 100,
+        "clocks_throttle_reasons.active": reasons,
+    }
+
+
+class ThermalModel:
+    def __init__(self, controller, bus_id, ambient=30, degrees_per_watt=0.125, throttle_temp=83):
+        self.controller = controller
+        self.bus_id = bus_id
+        self.ambient = ambient
+        self.degrees_per_watt = degrees_per_watt
+        self.throttle_temp = throttle_temp
+        self.ticks = 0
+
+    def read(self):
+        if self.ticks >= 200:
+            return None
+        self.ticks += 1
+        limit = self.controller.gpus[self.bus_id]["limit"]
+        temperature = self.ambient + self.degrees_per_watt * limit
+        reasons = 0x20 if temperature >= self.throttle_temp else 0x4
+        return {self.bus_id: telemetry_sample(temperature, limit, reasons)}
+
+
+class TestPowerLimitController:
+    def make_controller(self, **kwargs):
+        gpus = [dict(GPUDetector._get_gpu_info("RTX 4090"), bus_id="0000:01:00.0")]
+        return PowerLimitController(gpus, **kwargs)
+
+    def test_bounds_from_tdp(self):
+        state = self.make_controller(min_percent=70, max_percent=100).gpus["0000:01:00.0"]
+        assert (state["min_watts"], state["max_watts"], state["limit"]) == (315, 450, 450)
+
+    def test_thermal_throttle_lowers_limit(self):
+        controller = self.make_controller(min_interval=0)
+        assert controller.step({"0000:01:00.0": telemetry_sample(84, 450, 0x20)}, 0) == {"0000:01:00.0": 440}
+        assert controller.get_commands({"0000:01:00.0": 440}) == ["nvidia-smi -i 0000:01:00.0 -pl 440"]
+
+    def test_dead_band_holds_limit(self):
+        controller = self.make_controller(min_interval=0, smoothing=1.0)
+        assert controller.step({"0000:01:00.0": telemetry_sample(81, 450, 0x4)}, 0) == {}
+        assert controller.step({"0000:01:00.0": telemetry_sample(78, 450, 0x4)}, 1) == {}
+
+    def test_unsupported_fields_are_ignored(self):
+        controller = self.make_controller(min_interval=0, smoothing=1.0)
+        nan = float("nan")
+        assert controller.step({"0000:01:00.0": telemetry_sample(nan, nan, nan)}, 0) == {}
+        assert controller.step({"0000:01:00.0": telemetry_sample(90, nan, nan)}, 1) == {"0000:01:00.0": 440}
+
+    def test_rate_limit(self):
+        controller = self.make_controller(min_interval=10, smoothing=1.0)
+        hot = {"0000:01:00.0": telemetry_sample(90, 450, 0x20)}
+        assert controller.step(hot, 0) == {"0000:01:00.0": 440}
+        assert controller.step(hot, 5) == {}
+        assert controller.step(hot, 10) == {"0000:01:00.0": 430}
+
+    def test_never_leaves_bounds(self):
+        controller = self.make_controller(min_interval=0, min_percent=90, smoothing=1.0)
+        for now in range(20):
+            controller.step({"0000:01:00.0": telemetry_sample(95, 450, 0x40)}, now)
+        assert controller.gpus["0000:01:00.0"]["limit"] == 405
+        for now in range(20, 60):
+            controller.step({"0000:01:00.0": telemetry_sample(50, 405, 0x4)}, now)
+        assert controller.gpus["0000:01:00.0"]["limit"] == 450
+
+    def test_converges_on_synthetic_thermal_model(self):
+        controller = self.make_controller(min_interval=5, target_temp=75, hysteresis=3)
+        model = ThermalModel(controller, "0000:01:00.0")
+        clock = iter(range(1000))
+        decisions = controller.run(model, interval=0, clock=lambda: next(clock))
+
+        limits = [int(cmd.rsplit(" ", 1)[1]) for _, cmd, _ in decisions]
+        assert limits[0] == 440
+        final_temp = model.ambient + model.degrees_per_watt * controller.gpus["0000:01:00.0"]["limit"]
+        assert final_temp < model.throttle_temp
+        assert abs(final_temp - 75) <= 3 + model.degrees_per_watt * 10
+        assert len(decisions) < 15
+
+    def test_trace_replay(self, tmp_path):
+        trace = tmp_path / "trace.csv"
+        trace.write_text(
+            "00000000:01:00.0, 86, 449.0, 450.00, 2400, 10501, 99, 0x0000000000000020\n"
+            "00000000:01:00.0, 85, 440.0, 440.00, 2450, 10501, 99, 0x0000000000000020\n"
+            "00000000:01:00.0, 79, 430.0, 430.00, 2500, 10501, 99, 0x0000000000000004\n"
+        )
+        source = TraceMetricsSource.from_csv(str(trace))
+        assert len(source.ticks) == 3
+        controller = self.make_controller(min_interval=0, smoothing=1.0)
+        runner = RecordingRunner()
+        clock = iter(range(10))
+        controller.run(source, runner, interval=0, clock=lambda: next(clock))
+        assert runner.commands == ["nvidia-smi -i 0000:01:00.0 -pl 440", "nvidia-smi -i 0000:01:00.0 -pl 430"]
+
+
+class TestTracer:
+    def test_nested_spans_and_annotate(self):
+        tracer = Tracer()
+        with tracer.span("outer", "run"):
+            with tracer.span("inner", "gpu", gpu="0000:01:00.0"):
+                tracer.annotate(exit_code=0)
+        inner, outer = tracer.spans
+        assert (outer["depth"], inner["depth"]) == (0, 1)
+        assert inner["exit_code"] == 0 and "exit_code" not in outer
+        assert outer["duration_ms"] >= inner["duration_ms"] >= 0
+
+    def test_error_is_recorded(self):
+        tracer = Tracer()
+        with pytest.raises(ValueError):
+            with tracer.span("boom", "run"):
+                raise ValueError()
+        assert tracer.spans[0]["error"] == "ValueError"
+
+    def test_chrome_and_jsonl_export(self):
+        tracer = Tracer()
+        with tracer.span("apt update", "package", exit_code=0):
+            pass
+        event = tracer.to_chrome()["traceEvents"][0]
+        assert (event["name"], event["cat"], event["ph"]) == ("apt update", "package", "X")
+        assert event["args"] == {"exit_code": 0}
+        assert json.loads(tracer.to_jsonl())["name"] == "apt update"
+
+    def test_executor_spans_every_step(self, fake_root, monkeypatch):
+        monkeypatch.setattr(nvidia_stability, "TRACER", Tracer())
+        plan = Planner.build(DEBIAN_12, two_gpus())
+        PlanExecutor(lambda cmd: (not cmd.endswith("-ac 1219,1695"), "out")).execute(plan, None)
+        spans = {span["name"]: span for span in nvidia_stability.TRACER.spans}
+        assert {span["cat"] for span in spans.values()} >= {"package", "gpu", "xorg", "profile", "governor"}
+        assert spans["nvidia-smi -i 0000:02:00.0 -pl 350"]["output_bytes"] == 3
+        failed = spans["nvidia-smi -i 0000:02:00.0 -ac 1219,1695"]
+        assert failed["success"] is False and failed["output"] == "out"
+        assert spans["CPU governor performance, EPP performance on all CPUs"]["changed"] == 8
+
+    def test_cli_writes_traces_and_profile(self, fake_root, monkeypatch):
+        make_fake_bin(fake_root / "bin", "apt", "exit 0\n")
+        make_fake_bin(fake_root / "bin", "nvidia-smi", 'echo ok\ncase "$*" in *-ac*) exit 3;; esac\n')
+        monkeypatch.setattr(GPUDetector, "detect_all", staticmethod(lambda sysfs_root="/sys": two_gpus()))
+        jsonl, chrome, profile = (fake_root / name for name in ("trace.jsonl", "trace.json", "run.prof"))
+
+        with pytest.raises(SystemExit):
+            nvidia_stability.main([
+                "--trace-jsonl", str(jsonl), "--trace-chrome", str(chrome), "--profile", str(profile), "apply",
+            ])
+
+        spans = [json.loads(line) for line in jsonl.read_text().splitlines()]
+        by_name = {span["name"]: span for span in spans}
+        assert by_name["apply"]["depth"] == 0 and by_name["detect"]["gpus"] == 2
+        assert by_name["nvidia-smi -i 0000:01:00.0 -pm 1"]["exit_code"] == 0
+        assert by_name["nvidia-smi -i 0000:01:00.0 -pm 1"]["output_bytes"] == 3
+        assert by_name["nvidia-smi -i 0000:01:00.0 -ac 1313,2520"]["exit_code"] == 3
+        events = json.loads(chrome.read_text())["traceEvents"]
+        assert len([event for event in events if event["ph"] == "X"]) == len(spans)
+        assert {event["args"]["name"] for event in events if event["ph"] == "M"} >= {"gpu:0000:01:00.0", "xorg"}
+        assert pstats.Stats(str(profile)).total_calls > 0
+
+
+def make_fleet_host(base, name, nvidia_smi="exit 0\n"):
+    root = base / name
+    (root / "etc").mkdir(parents=True)
+    (root / "etc" / "os-release").write_text('NAME="Debian GNU/Linux"\nID=debian\nVERSION_ID="12"\n')
+    (root / "home").mkdir()
+    make_pci_device(root / "sys", "0000:01:00.0", "0x10de", "0x2684", "0x030000")
+    make_cpus(root / "sys", 2)
+    for binary, script in {
+        "sudo": 'exec "$@"\n', "apt": "exit 0\n", "dpkg-query": "exit 1\n", "nvidia-smi": nvidia_smi,
+    }.items():
+        make_fake_bin(root / "bin", binary, script)
+    return (
+        f"{name} HOME={root / 'home'} PATH={root / 'bin'} NVIDIA_STABILITY_ROOT={root} "
+        f"NVIDIA_STABILITY_CACHE_DIR={root / 'cache'} NVIDIA_STABILITY_STATE_DIR={root / 'state'}"
+    )
+
+
+class TestFleet:
+    def test_inventory_parsing(self):
+        hosts = FleetInventory.parse("# nodes\ngpu01 user=root port=2222\n\ngpu02  # spare\n")
+        assert hosts == [
+            {"name": "gpu01", "options": {"user": "root", "port": "2222"}},
+            {"name": "gpu02", "options": {}},
+        ]
+
+    def test_ssh_reuses_a_control_master(self):
+        transport = SSHTransport({"name": "gpu01", "options": {"user": "root", "port": "2222"}}, "/tmp/ctl")
+        argv = transport.argv("echo 'hi'")
+        assert argv[0] == "ssh"
+        assert "ControlMaster=auto" in argv and "ControlPath=/tmp/ctl/%C" in argv
+        assert argv[argv.index("-p") + 1] == "2222" and argv[argv.index("-l") + 1] == "root"
+        assert argv[-3:] == ["gpu01", "--", "sh -c 'echo '\"'\"'hi'\"'\"''"]
+
+    def test_local_fleet_applies_every_host(self, tmp_path):
+        inventory = "\n".join(make_fleet_host(tmp_path, f"gpu0{i}") for i in range(3))
+        hosts = FleetInventory.parse(inventory)
+        results = FleetRunner(hosts, LocalTransport, parallel=2).run()
+
+        assert [result["host"] for result in results] == ["gpu00", "gpu01", "gpu02"]
+        assert all(result["ok"] for result in results)
+        for result in results:
+            root = tmp_path / result["host"]
+            assert (root / "etc" / "X11" / "xorg.conf.d" / "20-nvidia.conf").exists()
+            assert (root / "state" / "state.json").exists()
+            assert {step["cat"] for step in result["steps"]} == {"package", "gpu", "xorg", "profile", "governor"}
+            assert result["upload_ms"] > 0 and result["run_ms"] > 0
+
+    def test_failures_are_reported_per_host(self, tmp_path, capsys):
+        inventory = tmp_path / "hosts"
+        inventory.write_text(
+            make_fleet_host(tmp_path, "good") + "\n" + make_fleet_host(tmp_path, "bad", nvidia_smi="exit 9\n") + "\n"
+        )
+        output = tmp_path / "fleet.json"
+        with pytest.raises(SystemExit) as exc:
+            nvidia_stability.main(["fleet", str(inventory), "--transport", "local", "-o", str(output)])
+        assert exc.value.code == 1
+
+        results = {result["host"]: result for result in json.loads(output.read_text())["hosts"]}
+        assert results["good"]["ok"] and not results["bad"]["ok"]
+        failed = [step["name"] for step in results["bad"]["steps"] if not step["success"]]
+        assert failed == ["nvidia-smi -i 0000:01:00.0 -pm 1", "nvidia-smi -i 0000:01:00.0 -pl 450",
+                          "nvidia-smi -i 0000:01:00.0 -ac 1313,2520"]
+        assert "1/2 hosts succeeded" in capsys.readouterr().out
+
+    def test_payload_is_uploaded_once(self, tmp_path):
+        hosts = FleetInventory.parse(make_fleet_host(tmp_path, "gpu01"))
+        assert FleetRunner(hosts, LocalTransport, extra_args=["--force"]).run_script("python3").count("apply --force") == 1
+        sent = []
+
+        class RecordingTransport(LocalTransport):
+            async def run(self, script, timeout, stdin=None):
+                sent.append(len(stdin or b""))
+                return await super().run(script, timeout, stdin)
+
+        runner = FleetRunner(hosts, RecordingTransport, command="plan")
+        first = runner.run()[0]
+        assert first["ok"] and first["uploaded"] and sent == [0, len(runner.archive), 0]
+        marker = tmp_path / "gpu01" / "home" / ".cache" / "nvidia-stability" / "fleet" / runner.digest / ".complete"
+        stamp = marker.stat().st_mtime_ns
+        sent.clear()
+        second = runner.run()[0]
+        assert second["ok"] and not second["uploaded"] and sent == [0, 0]
+        assert marker.stat().st_mtime_ns == stamp
+
+    def test_transports_must_implement_run(self):
+        class Silent(Transport):
+            pass
+
+        with pytest.raises(TypeError):
+            Silent({"name": "gpu01", "options": {}})
+
+
+class TestDataStore:
+    def test_data_file_is_versioned(self):
+        assert DataStore.load()["version"] >= 1
+
+    def test_generated_tables_are_up_to_date(self):
+        sys.path.insert(0, str(DATA_FILE.parent))
+        from build_tables import build_tables
+        for filename, content in build_tables(str(DATA_FILE.parent)).items():
+            assert (DATA_FILE.parent / filename).read_text() == content, f"{filename} is stale, run data/build_tables.py"
+
+    def test_new_sku_is_a_data_change(self, tmp_path, monkeypatch):
+        data = json.loads(DATA_FILE.read_text())
+        data["gpus"]["RTX 5090"] = {"tdp": 575, "mem_clock": 1750, "graphics_clock": 2407, "pci_ids": ["2b85"]}
+        data_file = tmp_path / "nvidia_stability.json"
+        data_file.write_text(json.dumps(data))
+
+        import nvidia_stability
+        monkeypatch.setattr(nvidia_stability, "DATA_FILE", data_file)
+        monkeypatch.setattr(GPUProfileIndex, "_default", None)
+        DataStore.reset()
+        try:
+            assert GPUDetector._get_gpu_info("GeForce RTX 5090")["tdp"] == 575
+            assert GPUDetector._get_gpu_info("10de:2b85")["name"] == "RTX 5090"
+        finally:
+            DataStore.reset()
+
+    def test_import_defers_heavy_modules(self):
+        result = subprocess.run(
+            [sys.executable, "-c", "import sys, nvidia_stability; print(' '.join(sorted(sys.modules)))"],
+            capture_output=True, text=True, cwd=os.path.dirname(nvidia_stability.__file__),
+        )
+        loaded = set(result.stdout.split())
+        assert "nvidia_stability" in loaded
+        assert not loaded & {"asyncio", "cProfile", "ctypes", "tarfile", "concurrent.futures", "http.server"}
+
+
 if __name__ == "__main__":
     pytest.main([__file__, "-v"])